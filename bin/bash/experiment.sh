@@ -133,7 +133,7 @@ directory_exists $DATA_DIRECTORY
 
 
 # Run Retrieve and Rank experiment only
-SOLR_EXPERIMENT_FILE=$DATA_DIRECTORY/exp_solr_only.json
+SOLR_EXPERIMENT_FILE=$DATA_DIRECTORY/exp_solr_only.jsonl
 echo "-----------------------------------"
 echo "[unix] Running Solr experiment with cluster_id=$SOLR_CLUSTER_ID, collection_name=$SOLR_COLLECTION_NAME"
 python $TEST_SCRIPT --username=$RETRIEVE_AND_RANK_USERNAME --password=$RETRIEVE_AND_RANK_PASSWORD --url=$RETRIEVE_AND_RANK_BASE_URL \
@@ -143,7 +143,7 @@ echo "[unix] Finished running solr experiment. Experiment results saved to $SOLR
 
 
 # Run Solr experiment only
-RR_EXPERIMENT_FILE=$DATA_DIRECTORY/exp_retrieve_and_rank.json
+RR_EXPERIMENT_FILE=$DATA_DIRECTORY/exp_retrieve_and_rank.jsonl
 echo "-----------------------------------"
 echo "[unix] Running R&R experiment with cluster_id=$SOLR_CLUSTER_ID, collection_name=$SOLR_COLLECTION_NAME, ranker_id=$RANKER_ID"
 python $TEST_SCRIPT --username=$RETRIEVE_AND_RANK_USERNAME --password=$RETRIEVE_AND_RANK_PASSWORD --url=$RETRIEVE_AND_RANK_BASE_URL \
@@ -133,7 +133,7 @@ directory_exists $DATA_DIRECTORY
 
 
 # Run Retrieve and Rank experiment only
-RR_EXPERIMENT_FILE=$DATA_DIRECTORY/exp_retrieve_and_rank_scorers.json
+RR_EXPERIMENT_FILE=$DATA_DIRECTORY/exp_retrieve_and_rank_scorers.jsonl
 echo "-----------------------------------"
 echo "[unix] Running R&R experiment with cluster_id=$SOLR_CLUSTER_ID, collection_name=$SOLR_COLLECTION_NAME, ranker_id=$RANKER_ID"
 python $TEST_SCRIPT --username=$RETRIEVE_AND_RANK_USERNAME --password=$RETRIEVE_AND_RANK_PASSWORD --url=$RETRIEVE_AND_RANK_BASE_URL \
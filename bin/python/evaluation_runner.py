@@ -0,0 +1,242 @@
+#!/usr/bin/env python
+# Copyright 2016 IBM Corp. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# -*- coding=utf8 -*-
+
+
+"""
+    description: Rate limited, adaptive runner used by test.py and testproxy.py to send the queries
+        of a relevance file to Retrieve and Rank, and writers that stream the experiment to a file
+"""
+
+import json
+import time
+import random
+import logging
+import threading
+import Queue
+from requests import models
+
+logger = logging.getLogger(__name__)
+
+# HTTP status codes that signal that the upstream service is overloaded
+RETRY_STATUS_CODES = frozenset([429, 500, 502, 503, 504])
+
+
+class TokenBucket(object):
+    """ Token bucket that caps the number of requests per second """
+    def __init__(self, rate, capacity=None):
+        """
+            args:
+                rate (float): Tokens added per second. If None or <= 0, acquire never blocks
+                capacity (float): Maximum number of tokens. Defaults to max(1, rate)
+        """
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate or 0.0)
+        self.tokens = self.capacity
+        self.last = time.time()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """ Block until a token is available """
+        if not self.rate or self.rate <= 0:
+            return
+        while True:
+            with self.lock:
+                now = time.time()
+                self.tokens = min(self.capacity, self.tokens + (now - self.last) * self.rate)
+                self.last = now
+                if self.tokens >= 1.0:
+                    self.tokens -= 1.0
+                    return
+                wait = (1.0 - self.tokens) / self.rate
+            time.sleep(wait)
+# endclass TokenBucket
+
+
+class AdaptiveLimiter(object):
+    """
+        Limits the number of requests in flight. The limit grows by one after a full window of
+        successful requests and is halved when the upstream service signals overload (AIMD)
+    """
+    def __init__(self, max_limit, min_limit=1):
+        self.max_limit = max_limit
+        self.min_limit = min_limit
+        self.limit = max_limit
+        self.in_flight = 0
+        self.successes = 0
+        self.condition = threading.Condition()
+
+    def acquire(self):
+        with self.condition:
+            while self.in_flight >= self.limit:
+                self.condition.wait()
+            self.in_flight += 1
+
+    def release(self, overloaded=False):
+        with self.condition:
+            self.in_flight -= 1
+            if overloaded:
+                self.limit = max(self.min_limit, self.limit // 2)
+                self.successes = 0
+                logger.debug('Upstream overloaded. Concurrency limit set to %d' % self.limit)
+            else:
+                self.successes += 1
+                if self.successes >= self.limit and self.limit < self.max_limit:
+                    self.limit += 1
+                    self.successes = 0
+            self.condition.notify_all()
+# endclass AdaptiveLimiter
+
+
+class EvaluationRunner(object):
+    """ Run a query function over many inputs with a QPS cap, adaptive concurrency and retries """
+    def __init__(self, query_func, num_threads=10, max_qps=None, max_retries=3, backoff=1.0):
+        """
+            args:
+                query_func (callable): Called with a single input. Must return (args, response), where response \
+                    is a requests.models.Response or the exception that was raised (see SolrThread)
+                num_threads (int): Maximum number of queries in flight
+                max_qps (float): Maximum number of queries per second. None for no limit
+                max_retries (int): Number of times a query is retried after an error or an overload response
+                backoff (float): Base delay in seconds between retries. Doubles after each attempt
+        """
+        self.query_func = query_func
+        self.num_threads = num_threads
+        self.bucket = TokenBucket(max_qps)
+        self.limiter = AdaptiveLimiter(num_threads)
+        self.max_retries = max_retries
+        self.backoff = backoff
+
+    @staticmethod
+    def is_retryable(resp):
+        " Whether the result of a query should be retried "
+        if isinstance(resp, models.Response):
+            return resp.status_code in RETRY_STATUS_CODES
+        return isinstance(resp, Exception)
+
+    def run(self, inputs, callback):
+        """
+            Send all the inputs and call callback((args, response)) as each one completes. Calls to \
+                callback are serialized, so it can write to a file directly. A query whose callback \
+                raises is logged and counted as failed
+
+            return:
+                (num_succeeded, num_failed, num_retries) (tuple)
+        """
+        queue = Queue.Queue()
+        for obj in inputs:
+            queue.put((obj, 0))
+        callback_lock = threading.Lock()
+        stats = {'succeeded': 0, 'failed': 0, 'retries': 0}
+
+        def worker():
+            while True:
+                try:
+                    obj, attempt = queue.get_nowait()
+                except Queue.Empty:
+                    return
+                try:
+                    result = self._attempt(obj, attempt)
+                except Exception as e:
+                    logger.exception('Query args=%r raised' % (obj,))
+                    result = (obj, e)
+                if result is None:
+                    with callback_lock:
+                        stats['retries'] += 1
+                    queue.put((obj, attempt + 1))
+                    continue
+                with callback_lock:
+                    succeeded = isinstance(result[1], models.Response) and result[1].ok
+                    try:
+                        callback(result)
+                    except Exception:
+                        # The query is recorded as failed, and the other queries keep running
+                        logger.exception('Callback failed for args=%r' % (result[0],))
+                        succeeded = False
+                    stats['succeeded' if succeeded else 'failed'] += 1
+                    num_done = stats['succeeded'] + stats['failed']
+                    if num_done % 50 == 0:
+                        logger.debug('Num of Queries Retrieved = %d' % num_done)
+
+        threads = [threading.Thread(target=worker) for _ in range(self.num_threads)]
+        for thread in threads:
+            thread.daemon = True
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return stats['succeeded'], stats['failed'], stats['retries']
+
+    def _attempt(self, obj, attempt):
+        """ Send a single query. Return None if the query should be retried """
+        self.bucket.acquire()
+        self.limiter.acquire()
+        overloaded = False
+        try:
+            result = self.query_func(obj)
+            overloaded = self.is_retryable(result[1])
+        finally:
+            self.limiter.release(overloaded=overloaded)
+        if overloaded and attempt < self.max_retries:
+            delay = self.backoff * (2 ** attempt) * (0.5 + random.random())
+            logger.debug('Retrying args=%r in %.2fs after response=%r' % (obj, delay, result[1]))
+            time.sleep(delay)
+            return None
+        return result
+# endclass EvaluationRunner
+
+
+class JsonExperimentWriter(object):
+    """ Write an experiment object incrementally, in the same format as json.dump of
+        dict(experiment_entries=..., experiment_metadata=...) """
+    def __init__(self, outfile, experiment_metadata):
+        self.outfile = outfile
+        self.num_entries = 0
+        self.outfile.write('{"experiment_metadata": %s, "experiment_entries": [' % json.dumps(experiment_metadata))
+
+    def write(self, entry):
+        self.outfile.write((', ' if self.num_entries else '') + json.dumps(entry))
+        self.outfile.flush()
+        self.num_entries += 1
+
+    def close(self):
+        self.outfile.write(']}')
+        self.outfile.flush()
+# endclass JsonExperimentWriter
+
+
+class LineExperimentWriter(object):
+    """ Write an experiment as line-delimited JSON. The first line is {"experiment_metadata": {...}}
+        and every following line is a single experiment entry. Read by analysis_utils.RetrieveAndRankExperiment """
+    def __init__(self, outfile, experiment_metadata):
+        self.outfile = outfile
+        self.num_entries = 0
+        self.outfile.write(json.dumps({'experiment_metadata': experiment_metadata}) + '\n')
+
+    def write(self, entry):
+        self.outfile.write(json.dumps(entry) + '\n')
+        self.outfile.flush()
+        self.num_entries += 1
+
+    def close(self):
+        self.outfile.flush()
+# endclass LineExperimentWriter
+
+
+def create_experiment_writer(outfile, experiment_metadata, output_path):
+    """ Line-delimited writer for .jsonl output paths, single JSON object writer otherwise """
+    if output_path.endswith('.jsonl'):
+        return LineExperimentWriter(outfile, experiment_metadata)
+    return JsonExperimentWriter(outfile, experiment_metadata)
@@ -21,22 +21,13 @@ import json
 import csv
 import getopt
 import sys
-import re
 
 from collections import defaultdict
 from collections import OrderedDict
 
 from random import shuffle
 
-def stripSpecial(myString):
-    myString = re.sub('/', '\\/', myString)
-    myString = re.sub('<[A-Za-z\/][^>]*>', '', myString)
-    myString = myString.replace('\n', ' ').replace('"', ' ').replace('!', ' ').replace('@', ' ').replace('#', ' ') \
-        .replace('$', ' ').replace('%', ' ').replace('^', ' ').replace('&', ' ').replace('*', ' ').replace('(', ' ') \
-        .replace(')', ' ').replace('<', ' ').replace('>', ' ').replace('/', ' ').replace('\\', ' ').replace('[', ' ') \
-        .replace(']', ' ').replace('{', ' ').replace('}', ' ').replace('|', ' ').replace(':', ' ').replace(';', ' ') \
-        .replace(',', ' ').replace('-', ' ').replace('+', ' ').replace('=', ' ').replace('~', ' ').replace('_', ' ').replace(' p ', ' ')
-    return re.sub(' +', ' ', myString)
+from retrieve_and_rank_scorer.utils import strip_special
 
 INPUT_DIR = ''
 OUTPUT_DIR = ''
@@ -150,8 +141,8 @@ for post in postsXML.findall('row'):
 
 for posts in postsXML.findall('row'):
     if(int(posts.get('PostTypeId')) == 1):
-        title = stripSpecial(posts.get('Title').encode('ascii', 'ignore').decode('ascii'))
-        body = stripSpecial(posts.get('Body').encode('ascii', 'ignore').decode('ascii'))
+        title = strip_special(posts.get('Title').encode('ascii', 'ignore').decode('ascii'))
+        body = strip_special(posts.get('Body').encode('ascii', 'ignore').decode('ascii'))
         postId = posts.get('Id')
         qa_dict[postId] = defaultdict(dict)
         answerCount = int(posts.get('AnswerCount'))
@@ -203,9 +194,9 @@ for posts in postsXML.findall('row'):
                     accepted = 1
                 break
         answerScore = posts.get('Score').encode('ascii', 'ignore').decode('ascii')
-        answer = stripSpecial(posts.get('Body').encode('ascii', 'ignore').decode('ascii'))
-        subtitle = stripSpecial(subtitle.encode('ascii', 'ignore').decode('ascii'))
-        title = stripSpecial(title.encode('ascii', 'ignore').decode('ascii'))
+        answer = strip_special(posts.get('Body').encode('ascii', 'ignore').decode('ascii'))
+        subtitle = strip_special(subtitle.encode('ascii', 'ignore').decode('ascii'))
+        title = strip_special(title.encode('ascii', 'ignore').decode('ascii'))
         userId = posts.get('OwnerUserId')
         reputation, username = getUserInfo(userId)
         authorUserId = indexed_dict[parentId].get('OwnerUserId')
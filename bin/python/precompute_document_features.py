@@ -0,0 +1,125 @@
+#!/usr/bin/env python
+# Copyright 2016 IBM Corp. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# -*- coding=utf8 -*-
+
+"""
+    usage: python bin/python/precompute_document_features.py --feature-file=config/features.json \
+        --content-file=<output_dir>/solrDocuments.json --output-file=data/document_features.npz
+    description: Run all the "document" scorers of a feature file over the corpus produced by
+        extract_stackexchange_dump.py and write the results to an id-indexed array file. The server
+        uses the file (DOCUMENT_FEATURES) instead of scoring the documents at query time
+"""
+
+import sys
+import json
+import logging
+import argparse
+import multiprocessing
+import numpy as np
+from retrieve_and_rank_scorer import utils
+from retrieve_and_rank_scorer.document_features import DocumentFeatures
+
+# Loggers
+logging.basicConfig()
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+# Document scorers of the worker process. Set by init_worker
+WORKER_SCORERS = None
+
+
+def init_worker(feature_file):
+    """ Load the document scorers once per worker process """
+    global WORKER_SCORERS
+    WORKER_SCORERS = utils.load_from_file(feature_file, scorer_types=['document']).get('document', [])
+
+
+def score_documents(documents):
+    """ Score a chunk of documents. Return a float32 matrix with NaN for the failed scores """
+    values = np.empty((len(documents), len(WORKER_SCORERS)), dtype=np.float32)
+    for j, scorer in enumerate(WORKER_SCORERS):
+        if scorer.batchable:
+            try:
+                scores = scorer.score_batch(documents)
+                values[:, j] = [np.nan if score is None else score for score in scores]
+                continue
+            except Exception as e:
+                logger.debug('Scorer %s failed for a batch of %d documents, scoring them one at a time. '
+                             'Exception=%r' % (scorer.short_name, len(documents), e))
+        for i, document in enumerate(documents):
+            try:
+                score = scorer.score(document)
+                values[i, j] = np.nan if score is None else score
+            except Exception as e:
+                logger.debug('Scorer %s failed for document id=%r. Exception=%r' % (scorer.short_name,
+                                                                                    document.get('id'), e))
+                values[i, j] = np.nan
+    return values
+
+
+def parse_args():
+    """ Parse args """
+    parser = argparse.ArgumentParser(description='Precompute the document scorers of a feature file')
+    parser.add_argument('--feature-file', type=str, help='Path to the feature configuration file')
+    parser.add_argument('--content-file', type=str, help='Path to the solrDocuments.json file')
+    parser.add_argument('--output-file', type=str, help='Path to the output .npz file')
+    parser.add_argument('--num-processes', type=int, default=multiprocessing.cpu_count(),
+                        help='Number of processes to use')
+    parser.add_argument('--chunk-size', type=int, default=200, help='Number of documents per task')
+    parser.add_argument('--debug', action='store_true', default=False, help='Whether to debug or not')
+    ns = parser.parse_args()
+    return ns.feature_file, ns.content_file, ns.output_file, ns.num_processes, ns.chunk_size, ns.debug
+
+
+def main():
+    """ Main script """
+    try:
+        feature_file, content_file, output_path, num_processes, chunk_size, use_debug = parse_args()
+        if use_debug:
+            logger.setLevel(logging.DEBUG)
+
+        scorer_dict = utils.load_from_file(feature_file, scorer_types=['document'])
+        scorers = scorer_dict.get('document', [])
+        if not scorers:
+            raise ValueError('Feature file %s does not contain document scorers' % feature_file)
+        short_names = [scorer.short_name for scorer in scorers]
+        versions = [scorer_dict['versions'][short_name] for short_name in short_names]
+
+        with open(content_file, 'rt') as infile:
+            documents = json.load(infile)
+        logger.info('Scoring %d documents with scorers=%r' % (len(documents), short_names))
+        chunks = [documents[i:i + chunk_size] for i in range(0, len(documents), chunk_size)]
+        pool = multiprocessing.Pool(processes=num_processes, initializer=init_worker, initargs=(feature_file,))
+        try:
+            values = pool.map(score_documents, chunks)
+        finally:
+            pool.close()
+            pool.join()
+        values = np.vstack(values) if values else np.empty((0, len(scorers)), dtype=np.float32)
+
+        DocumentFeatures.save(output_path, [document['id'] for document in documents], short_names,
+                              versions, values)
+        logger.info('Wrote %d x %d values to output_path=%r' % (values.shape[0], values.shape[1], output_path))
+        print ('Exiting with status code 0')
+        sys.exit(0)
+    except Exception as e:
+        logging.warning('Exception %r in main thread' % e)
+        print ('Exiting with status code 1')
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,213 @@
+#!/usr/bin/env python
+# Copyright 2016 IBM Corp. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# -*- coding=utf8 -*-
+
+"""
+    usage: python bin/python/simulate.py --train-file=data/trainingdata.csv --test-file=data/testdata.csv \
+        --output-file=data/exp_simulated.jsonl [--candidates-file=data/testdata_candidates.jsonl] \
+        [--ablate-each | --ablate=<feature>,<feature>]
+    description: Train a local ranker (retrieve_and_rank_scorer.ranker.LinearRanker) on a training CSV built by
+        train.py or trainproxy.py, re-rank the candidate lists of a second RSInput CSV offline and write an
+        experiment file that analysis_utils can read. With --ablate or --ablate-each, one experiment is
+        written per removed feature, and the variants are trained in parallel. The RSInput CSV does not
+        carry the query text and the document ids: with --candidates-file (written by trainproxy.py next to
+        the training data), the entries use them, so that the experiment can be compared with the
+        experiments of test.py and testproxy.py
+"""
+
+import os
+import sys
+import json
+import logging
+import argparse
+import datetime
+import multiprocessing
+import numpy as np
+from retrieve_and_rank_scorer.ranker import RankerInput, LinearRanker
+from evaluation_runner import create_experiment_writer
+
+# Loggers
+logging.basicConfig()
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+# Training and test inputs, and candidates of the test input, of the worker process. Set by init_worker
+WORKER_INPUTS = None
+
+
+def read_candidates(path):
+    """ Query text and candidate document ids of each question, in the order of the RSInput file. \
+        One JSON object {"query": ..., "ids": [...]} per line, as written by trainproxy.py """
+    candidates = list()
+    with open(path, 'rt') as infile:
+        for line in infile:
+            if line.strip():
+                obj = json.loads(line)
+                candidates.append((obj['query'], [str(doc_id) for doc_id in obj['ids']]))
+    return candidates
+
+
+def init_worker(train_path, test_path, candidates_path=None):
+    """ Read the training, test and candidates files once per worker process """
+    global WORKER_INPUTS
+    train_input = RankerInput.read(train_path)
+    test_input = RankerInput.read(test_path)
+    if test_input.headers != train_input.headers:
+        raise ValueError('Training headers %r do not match test headers %r' % (train_input.headers,
+                                                                             test_input.headers))
+    candidates = read_candidates(candidates_path) if candidates_path else None
+    WORKER_INPUTS = (train_input, test_input, candidates)
+
+
+def variant_path(output_path, variant):
+    """ Output path of an ablation variant. exp.jsonl -> exp_no_<feature>.jsonl """
+    if variant is None:
+        return output_path
+    root, ext = os.path.splitext(output_path)
+    return '%s_no_%s%s' % (root, variant, ext)
+
+
+def rerank_entries(ranker, test_input, candidates=None):
+    """
+        Re-rank the candidates of each question. Return a list of experiment entries
+
+        The entries use the query text and document ids of candidates (see read_candidates) if it is \
+            provided, and the question id and <qid>_<row> ids otherwise
+    """
+    scores = ranker.score(test_input.features)
+    groups = test_input.groups()
+    if candidates is not None and len(candidates) != len(groups):
+        raise ValueError('Candidates file has %d questions, RSInput file has %d' % (len(candidates), len(groups)))
+    entries = list()
+    for k, (qid, rows) in enumerate(groups):
+        if candidates is not None:
+            query, doc_ids = candidates[k]
+            if len(doc_ids) != len(rows):
+                raise ValueError('Question %r has %d candidate ids and %d RSInput rows' % (query, len(doc_ids),
+                                                                                        len(rows)))
+        else:
+            query, doc_ids = qid, ['%s_%d' % (qid, i) for i in range(len(rows))]
+        relevant_docs = {doc_id: int(test_input.relevance[row]) for doc_id, row in zip(doc_ids, rows)
+                         if test_input.relevance[row] > 0}
+        if not relevant_docs:
+            continue
+        order = np.argsort(-scores[rows], kind='mergesort')
+        response_docs = [{'id': doc_ids[i], 'confidence': float(scores[rows[i]]),
+                          'relevance': int(test_input.relevance[rows[i]])} for i in order]
+        entries.append({'query': query, 'response_docs': response_docs, 'relevant_docs': relevant_docs})
+    return entries
+
+
+def run_variant(args):
+    """ Train without the ablated feature (None for all features) and write the experiment """
+    variant, output_path, l2, experiment_metadata = args
+    train_input, test_input, candidates = WORKER_INPUTS
+    headers = [h for h in train_input.headers if h != variant]
+    ranker = LinearRanker(l2=l2).fit(train_input.select(headers))
+    entries = rerank_entries(ranker, test_input.select(headers), candidates)
+    path = variant_path(output_path, variant)
+    metadata = dict(experiment_metadata, ablated_feature=variant, features=headers)
+    with open(path, 'wt') as outfile:
+        writer = create_experiment_writer(outfile, metadata, path)
+        for entry in entries:
+            writer.write(entry)
+        writer.close()
+    return path, writer.num_entries
+
+
+def simulated_metadata(train_file, test_file, l2):
+    """ Metadata of a simulated experiment. The service fields of the experiments of test.py are None, \
+        as no service was called """
+    return {'url': None, 'username': None, 'password': None, 'solr_cluster_id': None, 'solr_collection': None,
+            'ranker_id': None, 'simulated': True, 'train_file': train_file, 'test_file': test_file, 'l2': l2,
+            'time': str(datetime.datetime.now())}
+
+
+def parse_args():
+    """ Parse args """
+    parser = argparse.ArgumentParser(description='Re-rank stored feature vectors with a local ranker')
+    parser.add_argument('--train-file', type=str, help='Path to the RSInput CSV (or binary frames) used for training')
+    parser.add_argument('--test-file', type=str, help='Path to the RSInput CSV to re-rank. Must not be the '
+                                                      'training file, whose scores would overstate the ranker')
+    parser.add_argument('--candidates-file', type=str, default=None, help='Query text and candidate ids of each '
+                                                                          'question of the test file, written by '
+                                                                          'trainproxy.py')
+    parser.add_argument('--output-file', type=str, help='Path to output file. Written as line-delimited JSON if it ends with .jsonl')
+    parser.add_argument('--model-file', type=str, default=None, help='Where to save the model trained on all features')
+    parser.add_argument('--l2', type=float, default=1.0, help='L2 regularization of the ranker')
+    parser.add_argument('--ablate', type=str, default=None, help='Comma separated features to remove, one at a time')
+    parser.add_argument('--ablate-each', action='store_true', default=False, help='Remove every feature, one at a time')
+    parser.add_argument('--num-processes', type=int, default=multiprocessing.cpu_count(), help='Number of processes')
+    parser.add_argument('--debug', action='store_true', default=False, help='Whether to debug or not')
+    ns = parser.parse_args()
+    if not ns.train_file or not os.path.isfile(ns.train_file):
+        raise ValueError('Training file %s does not exist' % ns.train_file)
+    if not ns.test_file or not os.path.isfile(ns.test_file):
+        raise ValueError('Test file %s does not exist' % ns.test_file)
+    if os.path.abspath(ns.test_file) == os.path.abspath(ns.train_file):
+        raise ValueError('Test file %s is the training file' % ns.test_file)
+    if not ns.output_file:
+        raise ValueError('No output file specified')
+    return ns
+
+
+def main():
+    """ Main script """
+    try:
+        ns = parse_args()
+        if ns.debug:
+            logger.info('Setting logger to level=DEBUG')
+            logger.setLevel(logging.DEBUG)
+
+        init_worker(ns.train_file, ns.test_file, ns.candidates_file)
+        headers = WORKER_INPUTS[0].headers
+        if ns.ablate_each:
+            ablated = list(headers)
+        elif ns.ablate:
+            ablated = [x.strip() for x in ns.ablate.split(',')]
+            unknown = set(ablated) - set(headers)
+            if unknown:
+                raise ValueError('Features %r are not in the training file' % sorted(unknown))
+        else:
+            ablated = list()
+        if ns.model_file:
+            LinearRanker(l2=ns.l2).fit(WORKER_INPUTS[0]).save(ns.model_file)
+            logger.info('Model written to %s' % ns.model_file)
+
+        experiment_metadata = simulated_metadata(ns.train_file, ns.test_file, ns.l2)
+        tasks = [(variant, ns.output_file, ns.l2, experiment_metadata) for variant in [None] + ablated]
+        if ns.num_processes > 1 and len(tasks) > 1:
+            pool = multiprocessing.Pool(processes=min(ns.num_processes, len(tasks)), initializer=init_worker,
+                                        initargs=(ns.train_file, ns.test_file, ns.candidates_file))
+            try:
+                results = pool.map(run_variant, tasks)
+            finally:
+                pool.close()
+                pool.join()
+        else:
+            results = map(run_variant, tasks)
+        for path, num_entries in results:
+            logger.info('Wrote %d questions to %s' % (num_entries, path))
+        print ('Exiting with status code 0')
+        sys.exit(0)
+    except Exception as e:
+        logging.warning('Exception %r in main thread' % e)
+        print ('Exiting with status code 1')
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -19,13 +19,11 @@ import sys
 import logging
 import os
 import requests
-import json
 from requests import models
 import csv
 import argparse
-import multiprocessing
-from multiprocessing import pool as multi_pool
 import datetime
+from evaluation_runner import EvaluationRunner, create_experiment_writer
 
 # Loggers
 logging.basicConfig()
@@ -33,26 +31,6 @@ logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
 
 
-class Counter(object):
-    """ Simple counter object for managing the state """
-    def __init__(self):
-        self.lock = multiprocessing.Lock()
-        self.val = multiprocessing.Value('i', 0)
-
-    def increment(self):
-        with self.lock:
-            self.val.value += 1
-
-    def get(self):
-        with self.lock:
-            return self.val.value
-
-    def increment_and_get(self):
-        with self.lock:
-            self.val.value += 1
-            return self.val.value
-
-
 class SolrThread(object):
     """ Thread for a single query to be posted to retrieve and rank """
     def __init__(self, username, password, url, collection_name, cluster_id,
@@ -67,7 +45,6 @@ class SolrThread(object):
         self.default_wt = wt
         self.select_url = "%s/v1/solr_clusters/%s/solr/%s/select" % \
             (self.url, self.cluster_id, self.collection_name)
-        self.counter = Counter()
 
     def __call__(self, *args):
         """ Re-rank the results. First entry of args should be a dictionary containing the query """
@@ -84,10 +61,6 @@ class SolrThread(object):
         except Exception as e:
             logger.debug('Exception when retrieve results with args=%r. Exception=%r' % (args, e))
             return args, e
-        finally:
-            num_queries = self.counter.increment_and_get()
-            if num_queries % 50 == 0:
-                logger.debug('Num of Queries Retrieved = %d' % num_queries)
 # endclass SolrThread
 
 
@@ -105,7 +78,6 @@ class RetrieveAndRankQueryThread(object):
         self.default_fl = fl
         self.default_wt = wt
         self.fcselect_url = "%s/v1/solr_clusters/%s/solr/%s/fcselect" % (self.url, self.cluster_id, self.collection_name)
-        self.counter = Counter()
 
     def __call__(self, *args):
         """ Re-rank the results. First entry of args should be a dictionary containing the query """
@@ -122,10 +94,6 @@ class RetrieveAndRankQueryThread(object):
         except Exception as e:
             logger.debug('Exception when retrieve results with args=%r. Exception=%r' % (args, e))
             return args, e
-        finally:
-            num_queries = self.counter.increment_and_get()
-            if num_queries % 50 == 0:
-                logger.debug('Num of Queries Retrieved = %d' % num_queries)
 # endclass RetrieveAndRankQuestionThread
 
 
@@ -146,30 +114,37 @@ def read_relevance_file(relevance_file):
     return gt, (succ_rows, failed_rows)
 
 
+def create_experiment_entry(args, resp, relevance_dict):
+    """ Create the experiment entry for a single query response. Return None if the response is not valid """
+    if isinstance(resp, models.Response):
+        if resp.ok:
+            json_resp = resp.json()
+            status = json_resp.get('responseHeader', {}).get('status', 1)
+            response_docs = json_resp.get('response', {}).get('docs', [])
+            query = args[0].get('query', None)
+            rel = relevance_dict.get(query, [])
+            if status == 0 and response_docs and query and rel:
+                relevant_docs = {i: int(r) for i, r in rel}
+                for i, response_doc in enumerate(response_docs):
+                    doc_id = response_doc['id']
+                    response_docs[i]['relevance'] = relevant_docs.get(doc_id, 0)
+                return {'query': query, 'response_docs': response_docs, 'relevant_docs': relevant_docs}
+            else:
+                logger.debug('args=%r, response=%r. Response is not status 0 or does not have docs' % (args, resp))
+        else:
+            logger.debug('args=%r, response=%r. Response is not ok. Reason = %r' % (args, resp, resp.reason))
+    else:
+        logger.debug('args=%r, response=%r. Response is not of type requests.models.Response' % (args, resp))
+    return None
+
+
 def create_experiment_object(query_responses, relevance_dict):
     """ Write experiment responses to a file"""
     experiment_results = []
     for args, resp in query_responses:
-        if isinstance(resp, models.Response):
-            if resp.ok:
-                json_resp = resp.json()
-                status = json_resp.get('responseHeader', {}).get('status', 1)
-                response_docs = json_resp.get('response', {}).get('docs', [])
-                query = args[0].get('query', None)
-                rel = relevance_dict.get(query, [])
-                if status == 0 and response_docs and query and rel:
-                    relevant_docs = {i: int(r) for i, r in rel}
-                    for i, response_doc in enumerate(response_docs):
-                        doc_id = response_doc['id']
-                        response_docs[i]['relevance'] = relevant_docs.get(doc_id, 0)
-                    output_obj = {'query': query, 'response_docs': response_docs, 'relevant_docs': relevant_docs}
-                    experiment_results.append(output_obj)
-                else:
-                    logger.debug('args=%r, response=%r. Response is not status 0 or does not have docs' % (args, resp))
-            else:
-                logger.debug('args=%r, response=%r. Response is not ok. Reason = %r' % (args, resp, resp.reason))
-        else:
-            logger.debug('args=%r, response=%r. Response is not of type requests.models.Response' % (args, resp))
+        entry = create_experiment_entry(args, resp, relevance_dict)
+        if entry is not None:
+            experiment_results.append(entry)
     logger.debug('Number of Questions in Final Experiment = %d' % len(experiment_results))
     return experiment_results
 
@@ -184,22 +159,24 @@ def parse_args():
     parser.add_argument('--cluster-id', type=str, help='Id for Solr Cluster')
     parser.add_argument('--ranker-id', type=str, default=None, help='Id for Trained Ranker')
     parser.add_argument('--relevance-file', type=str, help='Path to relevance file for testing')
-    parser.add_argument('--output-file', type=str, help='Path to output json file')
-    parser.add_argument('--num-threads', type=int, default=10, help='Number of Threads to use')
+    parser.add_argument('--output-file', type=str, help='Path to output file. Written as line-delimited JSON if it ends with .jsonl')
+    parser.add_argument('--num-threads', type=int, default=10, help='Maximum number of queries in flight')
+    parser.add_argument('--max-qps', type=float, default=None, help='Maximum number of queries per second')
+    parser.add_argument('--max-retries', type=int, default=3, help='Number of retries for failed or throttled queries')
     parser.add_argument('--fl', type=str, default='id,title,subtitle,answer,answerScore', help='Features to retrieve from the api call')
     parser.add_argument('--debug', action='store_true', default=False, help='Whether to debug or not')
     ns = parser.parse_args()
     if not os.path.isfile(ns.relevance_file) and not ns.relevance_file.endswith('csv'):
         raise ValueError('Relevance file %s does not exist or is not a csv' % ns.relevance_file)
     return ns.username, ns.password, ns.url, ns.collection_name, ns.cluster_id, \
-        ns.ranker_id, ns.relevance_file, ns.output_file, ns.num_threads, ns.fl, ns.debug
+        ns.ranker_id, ns.relevance_file, ns.output_file, ns.num_threads, ns.max_qps, ns.max_retries, ns.fl, ns.debug
 
 
 def main():
     """ Main script """
     try:
         username, password, url, collection_name, cluster_id, ranker_id, relevance_path,\
-            output_path, num_threads, fl, use_debug = parse_args()
+            output_path, num_threads, max_qps, max_retries, fl, use_debug = parse_args()
         if use_debug:
             logger.info('Setting logger to level=DEBUG')
             logger.setLevel(logging.DEBUG)
@@ -213,17 +190,23 @@ def main():
         else:
             thread_obj = SolrThread(username, password, url, collection_name, \
                 cluster_id, fl=fl)
-        thread_pool = multi_pool.ThreadPool(processes=num_threads)
-        question_results = thread_pool.map_async(func=thread_obj,
-                                                 iterable=[{'query': q} for (q, rel) in relevance_dict.iteritems()]).get()
-        print ('Responses retrieved from Retrieve and Rank')
-        experiment_entries = create_experiment_object(question_results, relevance_dict)
         experiment_metadata = {'ranker_id': ranker_id, 'solr_collection': collection_name, 'solr_cluster_id': cluster_id,
                                'username': username, 'password': password, 'url': url, 'time':str(datetime.datetime.now())}
-        experiment_obj = dict(experiment_entries=experiment_entries, experiment_metadata=experiment_metadata)
+        runner = EvaluationRunner(thread_obj, num_threads=num_threads, max_qps=max_qps, max_retries=max_retries)
         print ('Writing results to output_path=%r' % output_path)
         with open(output_path, 'wt') as outfile:
-            json.dump(experiment_obj, outfile)
+            writer = create_experiment_writer(outfile, experiment_metadata, output_path)
+
+            def write_entry(result):
+                entry = create_experiment_entry(result[0], result[1], relevance_dict)
+                if entry is not None:
+                    writer.write(entry)
+            num_succeeded, num_failed, num_retries = runner.run([{'query': q} for q in relevance_dict.iterkeys()],
+                                                                write_entry)
+            writer.close()
+        print ('Responses retrieved from Retrieve and Rank')
+        logger.info('Queries succeeded = %d, failed = %d, retries = %d' % (num_succeeded, num_failed, num_retries))
+        logger.info('Number of Questions in Final Experiment = %d' % writer.num_entries)
         print ('Exiting with status code 0')
         sys.exit(0)
     except Exception as e:
@@ -0,0 +1,71 @@
+#!/usr/bin/env python
+# Copyright 2016 IBM Corp. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# -*- coding=utf8 -*-
+
+
+import os
+import sys
+import json
+import shutil
+import tempfile
+import unittest
+import simulate
+from retrieve_and_rank_scorer.ranker import RankerInput, LinearRanker
+
+
+class TestSimulate(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.train_file = os.path.join(self.directory, 'trainingdata.csv')
+        with open(self.train_file, 'wt') as outfile:
+            outfile.write('question_id,f0,f1,ground_truth\n')
+            outfile.write('1,0.1,0.9,0\n1,0.8,0.2,4\n2,0.3,0.3,0\n2,0.9,0.1,3\n')
+        self.candidates_file = os.path.join(self.directory, 'trainingdata_candidates.jsonl')
+        with open(self.candidates_file, 'wt') as outfile:
+            outfile.write(json.dumps({'query': 'what is a visa', 'ids': [10, 11]}) + '\n')
+            outfile.write(json.dumps({'query': 'cheap flights', 'ids': [20, 21]}) + '\n')
+        self.output_file = os.path.join(self.directory, 'exp_simulated.jsonl')
+        simulate.init_worker(self.train_file, self.train_file, self.candidates_file)
+        metadata = simulate.simulated_metadata(self.train_file, self.train_file, 1.0)
+        simulate.run_variant((None, self.output_file, 1.0, metadata))
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_entries_use_query_text_and_doc_ids(self):
+        with open(self.output_file, 'rt') as infile:
+            metadata = json.loads(infile.readline())['experiment_metadata']
+            entries = [json.loads(line) for line in infile]
+        self.assertIsNone(metadata['url'])
+        self.assertEqual([entry['query'] for entry in entries], ['what is a visa', 'cheap flights'])
+        self.assertEqual(entries[0]['relevant_docs'], {'11': 4})
+        self.assertEqual(entries[0]['response_docs'][0]['id'], '11')
+
+    def test_mismatched_candidates(self):
+        ranker = LinearRanker().fit(RankerInput.read(self.train_file))
+        self.assertRaises(ValueError, simulate.rerank_entries, ranker, RankerInput.read(self.train_file),
+                          [('what is a visa', ['10', '11'])])
+
+    def test_analysis_utils_reads_simulated_experiment(self):
+        sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'notebooks'))
+        import analysis_utils
+        experiment = analysis_utils.RetrieveAndRankExperiment(self.output_file)
+        self.assertIsNone(experiment.rr_service)
+        self.assertEqual(len(list(experiment.experiment_entries)), 2)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -21,6 +21,7 @@ import shlex
 import os
 import sys
 import getopt
+from retrieve_and_rank_scorer.ranker import RankerInput
 
 #remove the ranker training file (just in case it's left over from a previous run)
 curdir = os.getcwd()
@@ -38,13 +39,14 @@ RANKERNAME = ''
 ROWS = '10'
 DEBUG = False
 VERBOSE = ''
+FRAMES_FILE = ''
 
 def usage():
-    print ('train.py -u <username:password> -i <query relevance file> -c <solr cluster> -x <solr collection> -r [option_argument <solr rows per query>] -n <ranker name> -d [enable debug output for script] -v [ enable verbose output for curl]')
+    print ('train.py -u <username:password> -i <query relevance file> -c <solr cluster> -x <solr collection> -r [option_argument <solr rows per query>] -n <ranker name> -d [enable debug output for script] -v [ enable verbose output for curl] -b [option_argument <binary feature frames written by trainproxy.py -b, converted instead of calling fcselect>]')
 
 try:
-    opts, args = getopt.getopt(sys.argv[1:], 'hdvu:i:c:x:n:r:', [
-        'user=', 'inputfile=', 'cluster=', 'collection=', 'name=', 'rows='])
+    opts, args = getopt.getopt(sys.argv[1:], 'hdvu:i:c:x:n:r:b:', [
+        'user=', 'inputfile=', 'cluster=', 'collection=', 'name=', 'rows=', 'binary='])
 except getopt.GetoptError as err:
     print str(err)
     print usage()
@@ -69,6 +71,14 @@ for opt, arg in opts:
         DEBUG = True
     elif opt == '-v':
         VERBOSE = '-v'
+    elif opt in ('-b', '--binary'):
+        FRAMES_FILE = arg
+
+if FRAMES_FILE:
+    print ('Converting feature frames %s' % (FRAMES_FILE))
+    RankerInput.read_frames(FRAMES_FILE).write_csv(TRAININGDATA)
+    print ('Generating training data complete.')
+    sys.exit(0)
 
 if not RELEVANCE_FILE or not CLUSTER or not COLLECTION or not RANKERNAME:
     print ('Required argument missing.')
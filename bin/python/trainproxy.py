@@ -15,6 +15,7 @@
 #
 
 import csv
+import json
 import os
 import sys
 import getopt
@@ -23,10 +24,14 @@ import requests
 #remove the ranker training file (just in case it's left over from a previous run)
 curdir = os.getcwd()
 TRAININGDATA = curdir+'/../data/groundtruth/trainingdata.csv'
-try:
-    os.remove(TRAININGDATA)
-except OSError:
-    pass
+TRAININGFRAMES = curdir+'/../data/groundtruth/trainingdata.rsf'
+# query text and candidate ids of each question of trainingdata.csv, read by simulate.py --candidates-file
+TRAININGCANDIDATES = curdir+'/../data/groundtruth/trainingdata_candidates.jsonl'
+for training_path in (TRAININGDATA, TRAININGFRAMES, TRAININGCANDIDATES):
+    try:
+        os.remove(training_path)
+    except OSError:
+        pass
 
 CREDS = ''
 CLUSTER = ''
@@ -36,13 +41,14 @@ RANKERNAME = ''
 ROWS = '10'
 DEBUG = False
 VERBOSE = ''
+BINARY = False
 
 def usage():
-    print ('trainproxy.py -u <username:password> -i <query relevance file> -c <solr cluster> -x <solr collection> -r [option_argument <solr rows per query>] -n <ranker name> -d [enable debug output for script] -v [ enable verbose output for curl]')
+    print ('trainproxy.py -u <username:password> -i <query relevance file> -c <solr cluster> -x <solr collection> -r [option_argument <solr rows per query>] -n <ranker name> -d [enable debug output for script] -v [ enable verbose output for curl] -b [write binary feature frames to trainingdata.rsf instead of CSV]')
 
 try:
-    opts, args = getopt.getopt(sys.argv[1:], 'hdvu:i:c:x:n:r:', [
-        'user=', 'inputfile=', 'cluster=', 'collection=', 'name=', 'rows='])
+    opts, args = getopt.getopt(sys.argv[1:], 'hdvbu:i:c:x:n:r:', [
+        'user=', 'inputfile=', 'cluster=', 'collection=', 'name=', 'rows=', 'binary'])
 except getopt.GetoptError as err:
     print str(err)
     print usage()
@@ -67,6 +73,8 @@ for opt, arg in opts:
         DEBUG = True
     elif opt == '-v':
         VERBOSE = '-v'
+    elif opt in ('-b', '--binary'):
+        BINARY = True
 
 if not RELEVANCE_FILE or not CLUSTER or not COLLECTION or not RANKERNAME:
     print ('Required argument missing.')
@@ -88,7 +96,7 @@ RANKERURL = BASEURL + 'rankers'
 with open(RELEVANCE_FILE, 'rb') as csvfile:
     add_header = 'true'
     question_relevance = csv.reader(csvfile)
-    with open(TRAININGDATA, 'a') as training_file:
+    with open(TRAININGFRAMES if BINARY else TRAININGDATA, 'ab' if BINARY else 'a') as training_file:
         print ('Generating training data...')
         for row in question_relevance:
             question = row[0]
@@ -110,14 +118,23 @@ with open(RELEVANCE_FILE, 'rb') as csvfile:
                 fcselect_url = 'http://0.0.0.0:3000/api/train_ranker'
                 params = {'q': question, 'gt': relevance, 'rows': 10, 'generateHeader': add_header, 'returnRSInput': 'true',
                           'fl': 'id,title,subtitle,answer,answerScore,accepted,upModVotes', 'wt': 'json', 'fq': ''}
+                if BINARY:
+                    params['rsInputFormat'] = 'binary'
                 print params
                 resp = requests.get(fcselect_url, params=params, headers={'Accept':'application/json'})
                 if resp is None:
                     continue
-                parsed_json = resp.json()
-                #parsed_json = json.load(resp)
-                print (parsed_json)
-                training_file.write(parsed_json['RSInput'])
+                if BINARY:
+                    resp.raise_for_status()
+                    training_file.write(resp.content)
+                else:
+                    parsed_json = resp.json()
+                    #parsed_json = json.load(resp)
+                    print (parsed_json)
+                    training_file.write(parsed_json['RSInput'])
+                    with open(TRAININGCANDIDATES, 'a') as candidates_file:
+                        ids = [doc.get('id') for doc in parsed_json.get('response', {}).get('docs', [])]
+                        candidates_file.write(json.dumps({'query': question, 'ids': ids}) + '\n')
             except:
                 print ('Command:')
                 print curl_cmd
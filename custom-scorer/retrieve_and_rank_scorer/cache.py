@@ -0,0 +1,77 @@
+# Copyright 2016 IBM All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from collections import OrderedDict
+from threading import Lock
+
+
+class LRUCache(object):
+    """
+        Thread safe in-memory cache that evicts the least recently used entries once it holds max_size entries
+
+        Used by the scorers to share per-query work (compiled patterns, parsed phrases) across the \
+            documents of a response, and across the responses of repeated queries
+    """
+
+    def __init__(self, max_size=1024):
+        """
+            args:
+                max_size (int): Maximum number of entries
+        """
+        if max_size < 1:
+            raise ValueError('max_size=%r must be positive' % max_size)
+        self.max_size_ = max_size
+        self.entries_ = OrderedDict()
+        self.lock_ = Lock()
+
+    def __len__(self):
+        return len(self.entries_)
+
+    def __contains__(self, key):
+        with self.lock_:
+            return key in self.entries_
+
+    def get(self, key, default=None):
+        " Value of the key, or default if it is not cached "
+        with self.lock_:
+            if key not in self.entries_:
+                return default
+            value = self.entries_.pop(key)
+            self.entries_[key] = value
+            return value
+
+    def put(self, key, value):
+        " Cache the value of the key, evicting the least recently used entry if the cache is full "
+        with self.lock_:
+            self.entries_.pop(key, None)
+            self.entries_[key] = value
+            if len(self.entries_) > self.max_size_:
+                self.entries_.popitem(last=False)
+
+    def get_or_compute(self, key, func):
+        """
+            Value of the key, computed with func(key) and cached if it is missing. func runs outside \
+                of the lock, so two threads may compute the same missing key
+        """
+        missing = object()
+        value = self.get(key, missing)
+        if value is missing:
+            value = func(key)
+            self.put(key, value)
+        return value
+
+    def clear(self):
+        with self.lock_:
+            self.entries_.clear()
+# endclass LRUCache
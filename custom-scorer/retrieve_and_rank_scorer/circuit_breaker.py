@@ -0,0 +1,132 @@
+# Copyright 2016 IBM All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import time
+from threading import Lock
+
+# States of a CircuitBreaker
+CLOSED, OPEN, HALF_OPEN = 'closed', 'open', 'half_open'
+# Value of allow for the trial call of a half open breaker
+TRIAL = 'trial'
+
+
+class CircuitBreaker(object):
+    """
+        Tracks the failures and the latency of the calls to a scorer, and stops calling it while it is unhealthy
+
+        The breaker opens after failure_threshold consecutive failures. A call fails if it raises, or if it \
+            takes longer than slow_call_threshold. While the breaker is open, calls are short-circuited. \
+            After reset_timeout seconds, a single trial call is let through (half open): the breaker \
+            closes if it succeeds and opens again if it fails. Calls are also short-circuited while \
+            max_in_flight calls are running, so that calls that hang do not take every thread of the pool
+    """
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0, slow_call_threshold=None, max_in_flight=None):
+        """
+            args:
+                failure_threshold (int): Number of consecutive failures that open the breaker
+                reset_timeout (float): Seconds before an open breaker lets a trial call through
+                slow_call_threshold (float): Calls that take longer than this many seconds are failures
+                max_in_flight (int): Maximum number of calls running at the same time
+        """
+        self.failure_threshold_ = failure_threshold
+        self.reset_timeout_ = reset_timeout
+        self.slow_call_threshold_ = slow_call_threshold
+        self.max_in_flight_ = max_in_flight
+        self.lock_ = Lock()
+        self.state_ = CLOSED
+        self.opened_at_ = None
+        self.consecutive_failures_ = 0
+        self.in_flight_ = 0
+        self.trial_in_flight_ = False
+        self.counts_ = {'calls': 0, 'failures': 0, 'slow_calls': 0, 'short_circuits': 0, 'opened': 0}
+        self.latency_ = None
+
+    @property
+    def state(self):
+        with self.lock_:
+            return self._current_state()
+
+    def _current_state(self):
+        if self.state_ == OPEN and time.time() - self.opened_at_ >= self.reset_timeout_:
+            self.state_ = HALF_OPEN
+        return self.state_
+
+    def allow(self):
+        """
+            Whether a call can be made now. Every allowed call must be followed by a call to record
+
+            return:
+                allowed : False if the call is short-circuited, TRIAL if it is the trial call of a \
+                    half open breaker, True otherwise
+        """
+        with self.lock_:
+            state = self._current_state()
+            allowed = state == CLOSED or (state == HALF_OPEN and not self.trial_in_flight_)
+            if allowed and self.max_in_flight_ is not None and self.in_flight_ >= self.max_in_flight_:
+                allowed = False
+            if not allowed:
+                self.counts_['short_circuits'] += 1
+                return False
+            self.in_flight_ += 1
+            if state == HALF_OPEN:
+                self.trial_in_flight_ = True
+                return TRIAL
+            return True
+
+    def record(self, latency, succeeded, trial=False):
+        """
+            Record the outcome of an allowed call
+
+            args:
+                latency (float): Duration of the call, in seconds
+                succeeded (bool): False if the call raised
+                trial (bool): Whether allow returned TRIAL for the call. Only the trial call closes \
+                    or reopens a half open breaker
+        """
+        with self.lock_:
+            self.in_flight_ -= 1
+            self.counts_['calls'] += 1
+            self.latency_ = latency if self.latency_ is None else 0.9 * self.latency_ + 0.1 * latency
+            slow = self.slow_call_threshold_ is not None and latency > self.slow_call_threshold_
+            if slow:
+                self.counts_['slow_calls'] += 1
+            if not succeeded:
+                self.counts_['failures'] += 1
+            state = self._current_state()
+            if trial:
+                self.trial_in_flight_ = False
+            elif state == HALF_OPEN:
+                # A call let through before the breaker opened. The trial call decides
+                return
+            if succeeded and not slow:
+                self.consecutive_failures_ = 0
+                if state == HALF_OPEN:
+                    self.state_ = CLOSED
+            else:
+                self.consecutive_failures_ += 1
+                if state == HALF_OPEN or (state == CLOSED and
+                                          self.consecutive_failures_ >= self.failure_threshold_):
+                    self.state_ = OPEN
+                    self.opened_at_ = time.time()
+                    self.counts_['opened'] += 1
+
+    def metrics(self):
+        " State, counters and mean latency (exponentially weighted, in seconds) of the breaker "
+        with self.lock_:
+            metrics = dict(self.counts_)
+            metrics.update({'state': self._current_state(), 'in_flight': self.in_flight_,
+                            'consecutive_failures': self.consecutive_failures_, 'latency': self.latency_})
+            return metrics
+# endclass CircuitBreaker
@@ -0,0 +1,63 @@
+# Copyright 2016 IBM All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import time
+
+
+class DeadlineExceeded(Exception):
+    " Raised when work is started after the deadline of the request "
+    pass
+# endclass DeadlineExceeded
+
+
+class Deadline(object):
+    """
+        Time budget of a request. Created once per request and passed to every upstream call and to the \
+            scorers, which use the remaining budget as their timeout
+    """
+
+    def __init__(self, budget):
+        """
+            args:
+                budget (float): Seconds from now until the deadline
+        """
+        self.expires_at_ = time.time() + budget
+
+    @property
+    def expires_at(self):
+        return self.expires_at_
+
+    def remaining(self):
+        " Seconds left before the deadline, 0 once it has passed "
+        return max(0.0, self.expires_at_ - time.time())
+
+    def expired(self):
+        return self.remaining() <= 0.0
+
+    def timeout(self, cap=None):
+        """
+            Timeout of a call made now
+
+            args:
+                cap (float): Optional timeout of the call if the deadline is further away
+            raise:
+                DeadlineExceeded : If the deadline has passed
+            return:
+                timeout (float): The remaining budget, at most cap
+        """
+        remaining = self.remaining()
+        if remaining <= 0.0:
+            raise DeadlineExceeded('Request deadline exceeded')
+        return remaining if cap is None else min(cap, remaining)
+# endclass Deadline
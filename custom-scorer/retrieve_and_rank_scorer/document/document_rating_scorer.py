@@ -30,7 +30,7 @@ class PopularityScorer(DocumentScorer):
         super(PopularityScorer, self).__init__(name=name, short_name=short_name, description=description)
 
     def get_required_fields(self):
-        pass
+        return ['views', 'accepted']
 
     def score(self, document):
         views = document['views']
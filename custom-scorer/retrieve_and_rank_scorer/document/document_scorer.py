@@ -23,6 +23,12 @@ class DocumentScorer(object):
         doc contains the different fields for a given Solr Document
     """
 
+    # Capabilities, see retrieve_and_rank_scorer.registry
+    batchable = False
+    cacheable = True
+    thread_safe = True
+    cost = 'cheap'
+
     def __init__(self, name='DocumentScorer', short_name='ds', description='Description of the scorer'):
         """ Base class for any scorers that consume a Solr document and extract
             a specific signal from a Solr document
@@ -69,3 +75,14 @@ class DocumentScorer(object):
                 to the different fields in the Solr Document
         """
         raise NotImplementedError
+
+    def score_batch(self, documents):
+        """    Score several documents. Scorers that can do this faster than calling score for each
+            document override this method and set batchable to True
+
+            args:
+                documents (list): Contents of the solr documents
+            return:
+                scores (list): One score per document
+        """
+        return [self.score(document) for document in documents]
@@ -13,7 +13,7 @@
 # limitations under the License.
 
 from retrieve_and_rank_scorer.document.document_scorer import DocumentScorer
-from spacy.en import English
+from retrieve_and_rank_scorer import nlp
 
 class TotalDocumentWordsScorer(DocumentScorer):
     """
@@ -25,9 +25,11 @@ class TotalDocumentWordsScorer(DocumentScorer):
         documents are never short or long), then, ideally, the ranker would learn
         to prefer medium length documents to short or long documents
     """
+    cost = 'nlp'
+    batchable = True
 
     def __init__(self, name='DocumentScorer', short_name='ds', description='Description of the scorer',
-                 include_stop=False):
+                 include_stop=False, pipeline='tokenizer'):
         """ Base class for any scorers that consume a Solr document and extract
             a specific signal from a Solr document
 
@@ -35,13 +37,15 @@ class TotalDocumentWordsScorer(DocumentScorer):
                 name (str): Name of the Scorer
                 short_name (str): Used for the header which is sent to ranker
                 description (str): Description of the scorer
+                pipeline (str): spaCy components to run, see retrieve_and_rank_scorer.nlp.pipe. \
+                    Tokens and is_stop only need the tokenizer
         """
         super(TotalDocumentWordsScorer, self).__init__(name=name, short_name=short_name, description=description)
-        self.nlp_ = English()
         self.include_stop_words_ = include_stop
+        self.pipeline_ = pipeline
 
     def get_required_fields(self):
-        pass
+        return ['text']
 
     def score(self, document):
         """    Number of total words in a document. This is intended to be used as a fuzzy way to filter out
@@ -51,8 +55,14 @@ class TotalDocumentWordsScorer(DocumentScorer):
                 document (dict): Contents of the solr document. The fields in the dictionary correspond
                 to the different fields in the Solr Document
         """
-        text = document['text']
-        doc = self.nlp_(unicode(text))
+        return self.score_batch([document])[0]
+
+    def score_batch(self, documents):
+        """ Number of total words of several documents, processed as one batch """
+        docs = nlp.pipe([unicode(document['text']) for document in documents], pipeline=self.pipeline_)
+        return [self.count_words(doc) for doc in docs]
+
+    def count_words(self, doc):
         total_words = 0
         for token in doc:
             if not token.is_stop:
@@ -30,7 +30,7 @@ class UpVoteScorer(DocumentScorer):
         super(UpVoteScorer, self).__init__(name=name, short_name=short_name, description=description)
 
     def get_required_fields(self):
-        pass
+        return ['upModVotes']
 
     def score(self, document):
         up_vote = document['upModVotes']
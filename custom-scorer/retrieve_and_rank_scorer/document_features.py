@@ -0,0 +1,69 @@
+# Copyright 2016 IBM All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import numpy as np
+
+
+class DocumentFeatures(object):
+    """
+        Read-only, id-indexed values of document scorers computed at index time by \
+            bin/python/precompute_document_features.py
+
+        The file is a numpy .npz archive with the arrays:
+            ids (n_docs,): Solr document ids
+            short_names (n_scorers,): Short names of the document scorers
+            versions (n_scorers,): Configuration version of each scorer (see utils.scorer_version)
+            values (n_docs, n_scorers): float32 values. NaN if the scorer failed for a document
+    """
+
+    def __init__(self, path, versions):
+        """
+            args:
+                path (str): Path to the .npz file
+                versions (dict): Mapping from scorer short name to the current version of the scorer. \
+                    Columns computed with a different version are ignored
+        """
+        archive = np.load(path)
+        short_names = [str(sn) for sn in archive['short_names']]
+        stored_versions = [str(v) for v in archive['versions']]
+        self.columns_ = [(i, sn) for i, (sn, v) in enumerate(zip(short_names, stored_versions))
+                         if versions.get(sn) == v]
+        self.values_ = archive['values']
+        self.id_to_row_ = {str(doc_id): row for row, doc_id in enumerate(archive['ids'])}
+
+    @property
+    def short_names(self):
+        return [sn for (i, sn) in self.columns_]
+
+    def get(self, doc_id):
+        """
+            Precomputed values of a document
+
+            args:
+                doc_id (str): Id of the Solr document
+            return:
+                values (dict): Mapping from short name to value. Empty if the document is unknown
+        """
+        row = self.id_to_row_.get(str(doc_id)) if doc_id is not None else None
+        if row is None:
+            return dict()
+        values = self.values_[row]
+        return {sn: float(values[i]) for (i, sn) in self.columns_ if not np.isnan(values[i])}
+
+    @staticmethod
+    def save(path, ids, short_names, versions, values):
+        " Write the values computed for a corpus. See the class description for the format "
+        np.savez(path, ids=np.array([str(doc_id) for doc_id in ids]), short_names=np.array(short_names),
+                 versions=np.array(versions), values=np.asarray(values, dtype=np.float32))
+# endclass DocumentFeatures
@@ -0,0 +1,144 @@
+# Copyright 2016 IBM All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import cStringIO
+import json
+import struct
+import numpy as np
+
+# Start of every binary frame. See encode_frame
+FRAME_MAGIC = 'RSF1'
+_FRAME_PREFIX = struct.Struct('<4sII')
+
+
+class FeatureMatrix(object):
+    """
+        Feature vectors of the documents of a fcselect response, as a float32 matrix with one \
+            row per document
+
+        Features stay numeric from the moment the featureVector strings are parsed until the \
+            response or the answer CSV is written
+    """
+
+    def __init__(self, values):
+        """
+            args:
+                values (np.ndarray): Matrix of shape (n_docs, n_features)
+        """
+        self.values = np.asarray(values, dtype=np.float32)
+        if self.values.ndim != 2:
+            raise ValueError('FeatureMatrix values have shape %r, expected 2 dimensions' % (self.values.shape,))
+
+    @property
+    def shape(self):
+        return self.values.shape
+
+    def __len__(self):
+        return self.values.shape[0]
+
+    @staticmethod
+    def from_feature_vectors(feature_vectors):
+        """
+            Parse the whitespace separated featureVector strings of a response with a single call
+
+            args:
+                feature_vectors (list): featureVector string of each document
+            raise:
+                ValueError : If the feature vectors do not all have the same length
+            return:
+                FeatureMatrix
+        """
+        if not feature_vectors:
+            return FeatureMatrix(np.zeros((0, 0), dtype=np.float32))
+        num_features = len(feature_vectors[0].split())
+        values = np.fromstring(' '.join(feature_vectors), dtype=np.float32, sep=' ')
+        if values.size != num_features * len(feature_vectors):
+            raise ValueError('Feature vectors are not all of length %d' % num_features)
+        return FeatureMatrix(values.reshape(len(feature_vectors), num_features))
+
+    def append(self, columns):
+        " New FeatureMatrix with columns (shape (n_docs, n_columns)) added on the right "
+        columns = np.asarray(columns, dtype=np.float32)
+        if columns.ndim == 1:
+            columns = columns.reshape(len(self), 1)
+        return FeatureMatrix(np.hstack([self.values, columns]))
+
+    def format_rows(self, delimiter=' ', fmt='%.9g'):
+        """ Format every row as a delimited string. This is the only place where features become text. \
+            The default format keeps the 9 significant digits of a float32, so that small values are not rounded to 0 """
+        if len(self) == 0:
+            return list()
+        if self.shape[1] == 0:
+            return [''] * len(self)
+        output = cStringIO.StringIO()
+        np.savetxt(output, self.values, fmt=fmt, delimiter=delimiter)
+        return output.getvalue().splitlines()
+# endclass FeatureMatrix
+
+
+def encode_frame(headers, qids, relevance, features):
+    """
+        Encode the RSInput rows of a query as a binary frame
+
+        A frame is the magic 'RSF1', the little-endian uint32 lengths of the JSON header and of the body, \
+            the JSON header {"headers": [...], "qids": [...], "relevance": [...]} and the body, the features \
+            as little-endian float32 rows. Frames can be concatenated, e.g. appended to a training file
+
+        args:
+            headers (list): Names of the feature columns
+            qids (list): Question id of each row
+            relevance (list): Relevance label of each row
+            features (FeatureMatrix): Feature values, one row per question id
+        return:
+            frame (str)
+    """
+    if len(qids) != len(features) or len(relevance) != len(features):
+        raise ValueError('Frame has %d features rows for %d qids and %d relevance labels' % (len(features), len(qids),
+                                                                                          len(relevance)))
+    if len(features) and features.shape[1] != len(headers):
+        raise ValueError('Frame has %d headers for %d features' % (len(headers), features.shape[1]))
+    header = json.dumps({'headers': list(headers), 'qids': list(qids), 'relevance': [int(r) for r in relevance]})
+    body = features.values.astype('<f4').tostring()
+    return _FRAME_PREFIX.pack(FRAME_MAGIC, len(header), len(body)) + header + body
+
+
+def decode_frames(data):
+    """
+        Decode the concatenated frames written by encode_frame
+
+        args:
+            data (str): Content of a binary response or training file
+        raise:
+            ValueError : If the data is not a sequence of frames
+        return:
+            generator of (headers, qids, relevance, FeatureMatrix) tuples
+    """
+    offset = 0
+    while offset < len(data):
+        if len(data) - offset < _FRAME_PREFIX.size:
+            raise ValueError('Truncated frame at offset %d' % offset)
+        magic, header_length, body_length = _FRAME_PREFIX.unpack_from(data, offset)
+        if magic != FRAME_MAGIC:
+            raise ValueError('No frame at offset %d' % offset)
+        offset += _FRAME_PREFIX.size
+        if len(data) - offset < header_length + body_length:
+            raise ValueError('Truncated frame at offset %d' % offset)
+        header = json.loads(data[offset:offset + header_length])
+        offset += header_length
+        values = np.zeros((0, len(header['headers'])), dtype=np.float32)
+        if body_length:
+            values = np.frombuffer(data, dtype='<f4', count=body_length // 4, offset=offset)
+            values = values.reshape(len(header['qids']), len(header['headers']))
+        offset += body_length
+        yield header['headers'], header['qids'], header['relevance'], FeatureMatrix(values)
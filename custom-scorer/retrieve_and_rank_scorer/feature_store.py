@@ -0,0 +1,120 @@
+# Copyright 2016 IBM All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import hashlib
+import sqlite3
+from threading import Lock
+
+
+class FeatureStore(object):
+    """
+        On-disk store for custom feature values, backed by SQLite
+
+        Values are keyed by (query hash, document id, scorer short name, scorer version). \
+            Document scorers are stored with an empty query hash and query scorers with an \
+            empty document id, so that their values are shared across queries and documents. \
+            The scorer version is derived from the scorer configuration, so changing the \
+            configuration of a single scorer only invalidates the values of that scorer
+    """
+
+    def __init__(self, path, versions):
+        """
+            args:
+                path (str): Path to the SQLite database. Created if it does not exist
+                versions (dict): Mapping from scorer short name to the current version of the scorer
+        """
+        self.path_ = path
+        self.versions_ = dict(versions)
+        self.lock_ = Lock()
+        self.conn_ = sqlite3.connect(path, check_same_thread=False)
+        with self.lock_:
+            self.conn_.execute('PRAGMA journal_mode=WAL')
+            self.conn_.execute('PRAGMA synchronous=OFF')
+            self.conn_.execute('CREATE TABLE IF NOT EXISTS features (query_hash TEXT, doc_id TEXT, '
+                               'short_name TEXT, version TEXT, value REAL, '
+                               'PRIMARY KEY (query_hash, doc_id, short_name, version))')
+            self.conn_.commit()
+
+    @staticmethod
+    def query_key(query):
+        " Hash of the query text. Used as the query part of the key "
+        text = query.get('q', '') if isinstance(query, dict) else query
+        if isinstance(text, list):
+            text = text[0]
+        if isinstance(text, unicode):
+            text = text.encode('utf-8')
+        return hashlib.md5(text).hexdigest()
+
+    def get_many(self, query_hash, doc_id, short_names):
+        """
+            Look up the stored values of several scorers
+
+            args:
+                query_hash (str): Result of query_key, or '' for document scorers
+                doc_id (str): Id of the Solr document, or '' for query scorers
+                short_names (list): Short names of the scorers to look up
+            return:
+                values (dict): Mapping from short name to value, only for the values found
+        """
+        if not short_names:
+            return dict()
+        clauses = ' OR '.join(['(short_name=? AND version=?)'] * len(short_names))
+        params = [query_hash, doc_id]
+        for short_name in short_names:
+            params.extend([short_name, self.versions_.get(short_name, '')])
+        with self.lock_:
+            rows = self.conn_.execute('SELECT short_name, value FROM features WHERE query_hash=? AND doc_id=? '
+                                      'AND (%s)' % clauses, params).fetchall()
+        return dict(rows)
+
+    def put_many(self, query_hash, doc_id, values):
+        """
+            Store the values of several scorers
+
+            args:
+                query_hash (str): Result of query_key, or '' for document scorers
+                doc_id (str): Id of the Solr document, or '' for query scorers
+                values (dict): Mapping from short name to value. None values are not stored
+        """
+        rows = [(query_hash, doc_id, short_name, self.versions_.get(short_name, ''), float(value))
+                for (short_name, value) in values.iteritems() if value is not None]
+        if not rows:
+            return
+        with self.lock_:
+            self.conn_.executemany('INSERT OR REPLACE INTO features VALUES (?, ?, ?, ?, ?)', rows)
+            self.conn_.commit()
+
+    def purge_stale(self):
+        """
+            Delete the values of configured scorers whose version changed. Values of scorers \
+                that are not configured are kept, so that they can be re-enabled without recomputing
+
+            return:
+                num_deleted (int): Number of rows that were deleted
+        """
+        with self.lock_:
+            rows = self.conn_.execute('SELECT DISTINCT short_name, version FROM features').fetchall()
+            stale = [(sn, v) for (sn, v) in rows if sn in self.versions_ and self.versions_[sn] != v]
+            num_deleted = 0
+            for (short_name, version) in stale:
+                cursor = self.conn_.execute('DELETE FROM features WHERE short_name=? AND version=?',
+                                            (short_name, version))
+                num_deleted += cursor.rowcount
+            self.conn_.commit()
+        return num_deleted
+
+    def close(self):
+        with self.lock_:
+            self.conn_.close()
+# endclass FeatureStore
@@ -0,0 +1,73 @@
+# Copyright 2016 IBM All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from threading import Lock
+
+# Shared spaCy pipeline. Loaded by get_nlp on first use
+_NLP = None
+_NLP_LOCK = Lock()
+
+# Components run by pipe after the tokenizer, by pipeline name. None runs the whole pipeline
+PIPELINES = {'tokenizer': (), 'tagger': ('tagger',), 'full': None}
+
+# Number of texts processed together by pipe
+BATCH_SIZE = 64
+
+
+def get_nlp():
+    """
+        Shared spaCy English pipeline
+
+        spaCy and its models are only imported the first time a scorer needs them, so that \
+            configurations without NLP scorers do not pay for loading them, and all the NLP \
+            scorers of a process share the same pipeline
+
+        return:
+            nlp (spacy.en.English)
+    """
+    global _NLP
+    if _NLP is None:
+        with _NLP_LOCK:
+            if _NLP is None:
+                from spacy.en import English
+                _NLP = English()
+    return _NLP
+
+
+def pipe(texts, pipeline='full', batch_size=BATCH_SIZE):
+    """
+        Process texts in batches with a subset of the shared pipeline
+
+        Scorers that only need tokens (and lexical attributes such as is_stop) or part-of-speech tags \
+            skip the parser and the entity recognizer, which take most of the time of the full pipeline. \
+            The components are those of get_nlp, so no additional model is loaded
+
+        args:
+            texts (list): unicode texts
+            pipeline (str): 'tokenizer', 'tagger' (tokenizer and tagger) or 'full'
+            batch_size (int): Number of texts processed together
+        raise:
+            ValueError : If the pipeline is unknown
+        return:
+            docs (list): One spacy.tokens.Doc per text
+    """
+    if pipeline not in PIPELINES:
+        raise ValueError('pipeline=%r must be one of %r' % (pipeline, sorted(PIPELINES)))
+    nlp = get_nlp()
+    if PIPELINES[pipeline] is None:
+        return list(nlp.pipe(texts, batch_size=batch_size))
+    docs = nlp.tokenizer.pipe(texts, batch_size=batch_size)
+    for component in PIPELINES[pipeline]:
+        docs = getattr(nlp, component).pipe(docs, batch_size=batch_size)
+    return list(docs)
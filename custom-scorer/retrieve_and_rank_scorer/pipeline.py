@@ -0,0 +1,145 @@
+# Copyright 2016 IBM All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import logging
+from contextlib import contextmanager
+from threading import Event, Lock, Thread
+from retrieve_and_rank_scorer.scorers import Scorers
+
+logger = logging.getLogger(__name__)
+
+
+class _Version(object):
+    " A version of the pipeline, with the number of requests that are using it "
+
+    def __init__(self, scorers, number):
+        self.scorers = scorers
+        self.number = number
+        self.refs = 0
+        self.retired = False
+# endclass _Version
+
+
+class ScorerPipeline(object):
+    """
+        Versioned Scorers pipeline that is rebuilt when the feature configuration file changes
+
+        Requests take a snapshot of the current version with acquire() and use it until they are \
+            done. A reload builds the new version in the caller's thread (or in the polling thread), \
+            reusing the scorers whose configuration did not change, and then swaps it in atomically. \
+            The previous version is closed once its last request releases it, except for the scorers \
+            that the current version reuses
+    """
+
+    def __init__(self, feature_json_file, poll_interval=None, **scorers_kwargs):
+        """
+            args:
+                feature_json_file (str): Path to a feature configuration file
+                poll_interval (float): If provided, the modification time of the file is checked \
+                    every poll_interval seconds in a background thread, and the pipeline is reloaded \
+                    when it changes
+                scorers_kwargs (dict): Additional arguments of Scorers
+            raise:
+                ScorerConfigurationException : If the initial configuration cannot be loaded
+        """
+        self.feature_json_file_ = feature_json_file
+        self.scorers_kwargs_ = scorers_kwargs
+        self.lock_ = Lock()
+        self.reload_lock_ = Lock()
+        self.mtime_ = self._mtime()
+        self.current_ = _Version(Scorers(feature_json_file, **scorers_kwargs), 1)
+        self.stopped_ = Event()
+        self.poll_thread_ = None
+        if poll_interval:
+            self.poll_thread_ = Thread(target=self._poll, args=(poll_interval,), name='ScorerPipelinePoll')
+            self.poll_thread_.daemon = True
+            self.poll_thread_.start()
+
+    @property
+    def version(self):
+        return self.current_.number
+
+    def current(self):
+        " Current version of the Scorers, without holding it. Prefer acquire for the duration of a request "
+        return self.current_.scorers
+
+    @contextmanager
+    def acquire(self):
+        """
+            Hold the current version of the Scorers for the duration of the with block
+
+            return:
+                scorers (Scorers)
+        """
+        with self.lock_:
+            entry = self.current_
+            entry.refs += 1
+        try:
+            yield entry.scorers
+        finally:
+            with self.lock_:
+                entry.refs -= 1
+                close = entry.retired and entry.refs == 0
+            if close:
+                entry.scorers.close(keep=self.current_.scorers)
+
+    def reload(self):
+        """
+            Build a new version from the feature configuration file and swap it in
+
+            raise:
+                ScorerConfigurationException, ValueError : If the configuration cannot be loaded. \
+                    The current version stays in place
+            return:
+                version (int): Number of the new version
+        """
+        with self.reload_lock_:
+            mtime = self._mtime()
+            scorers = Scorers(self.feature_json_file_, previous=self.current_.scorers, **self.scorers_kwargs_)
+            with self.lock_:
+                old = self.current_
+                self.current_ = _Version(scorers, old.number + 1)
+                self.mtime_ = mtime
+                old.retired = True
+                close = old.refs == 0
+            if close:
+                old.scorers.close(keep=scorers)
+            logger.info('Loaded version %d of %s' % (self.current_.number, self.feature_json_file_))
+            return self.current_.number
+
+    def stop(self):
+        " Stop polling the feature configuration file "
+        self.stopped_.set()
+        if self.poll_thread_ is not None:
+            self.poll_thread_.join()
+
+    def _mtime(self):
+        try:
+            return os.path.getmtime(self.feature_json_file_)
+        except OSError:
+            return None
+
+    def _poll(self, poll_interval):
+        while not self.stopped_.wait(poll_interval):
+            mtime = self._mtime()
+            if mtime is None or mtime == self.mtime_:
+                continue
+            try:
+                self.reload()
+            except Exception as e:
+                # Keep serving the current version until the file is fixed
+                self.mtime_ = mtime
+                logger.warning('Failed to reload %s. Exception=%r' % (self.feature_json_file_, e))
+# endclass ScorerPipeline
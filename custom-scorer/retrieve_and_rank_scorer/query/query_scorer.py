@@ -22,6 +22,12 @@ class QueryScorer(object):
         All subclasses must override score(query)
     """
 
+    # Capabilities, see retrieve_and_rank_scorer.registry
+    batchable = False
+    cacheable = True
+    thread_safe = True
+    cost = 'cheap'
+
     def __init__(self, name='QueryScorer', short_name='qs',
                  description='Description of the scorer'):
         """ Base class for any scorers that want to consume both a Solr document and a Solr query
@@ -48,6 +54,14 @@ class QueryScorer(object):
     def description(self):
         return self.description_
 
+    def get_required_fields(self):
+        """
+            Query scorers do not read any field of the Solr documents
+            return:
+                List : Return a list of the required fields
+        """
+        return list()
+
     def score(self, query):
         """    Create a score for a given query. This score will be added as a
             feature for each document (for a given query)
@@ -14,7 +14,9 @@
 
 import re
 from retrieve_and_rank_scorer.query.query_scorer import QueryScorer
-from spacy.en import English
+from retrieve_and_rank_scorer import nlp as spacy_nlp
+
+PROPER_NOUN_TAG = re.compile('^NNP.*$')
 
 class ProperNounRatioScorer(QueryScorer):
     """
@@ -23,31 +25,36 @@ class ProperNounRatioScorer(QueryScorer):
             - KeywordConfidenceScorer scores (from 0 to 1) the extent to which a query looks like a keyword
             - PolarQueryScorer scores (from 0 to 1) the extent to which a question is a Yes/No question
     """
+    cost = 'nlp'
 
     def __init__(self, name='ProperNounRatioScorer', short_name='pnrs', description='Proper Noun Ratio Scorer',
-                 nlp=None):
+                 nlp=None, pipeline='tagger'):
         """
             Class that computes the ratio of proper nouns in a query
             The idea is that a query with a large fraction of proper nouns will tend to be a keyword query
 
             Args:
                 name, short_name, description (str): See QueryScorer
-                nlp (spacy.en.English): Tokenizes incoming text
+                nlp (spacy.en.English): Tokenizes incoming text. Defaults to the shared pipeline, \
+                    loaded on first use
+                pipeline (str): Components of the shared pipeline to run, see \
+                    retrieve_and_rank_scorer.nlp.pipe. Only the tags are needed
         """
         super(ProperNounRatioScorer, self).__init__(name=name, short_name=short_name, description=description)
-        if nlp:
-            self.nlp_ = nlp
-        else:
-            self.nlp_ = English()
+        self.nlp_ = nlp
+        self.pipeline_ = pipeline
 
     def score(self, query):
         """
             Computes the fraction of proper nouns in the underlying query text
         """
         query_text = query['q']
-        doc = self.nlp_(unicode(query_text))
+        if self.nlp_ is not None:
+            doc = self.nlp_(unicode(query_text))
+        else:
+            doc = spacy_nlp.pipe([unicode(query_text)], pipeline=self.pipeline_)[0]
         num_proper_nouns = 0
         for token in doc:
-            if re.match('^NNP.*$', token.tag_):
+            if PROPER_NOUN_TAG.match(token.tag_):
                 num_proper_nouns += 1
         return num_proper_nouns / float(len(doc))
@@ -14,12 +14,67 @@
 
 
 import time
+import logging
 import requests
+from threading import Thread, Event
+from concurrent import futures
 
+from retrieve_and_rank_scorer.cache import LRUCache
 from retrieve_and_rank_scorer.query_document.query_document_scorer import QueryDocumentScorer
 from retrieve_and_rank_scorer.scorer_exception import ScorerConfigurationException, ScorerRuntimeException
-from collections import defaultdict
-from multiprocessing import Lock
+
+logger = logging.getLogger(__name__)
+
+# When the classifiers of a scorer are validated, see NLCIntentScorer
+VALIDATIONS = ('eager', 'deferred', 'manual')
+
+
+def check_classifiers(classifiers, timeout=10, max_workers=8):
+    """
+        Run the health check of several classifiers concurrently
+
+        args:
+            classifiers (list): NLCIntentScorer objects
+            timeout (float): Time allowed for all the checks. Classifiers that have not answered \
+                by then are marked degraded
+            max_workers (int): Number of classifiers checked at the same time
+        return:
+            degraded (list): The classifiers that are degraded
+    """
+    if not classifiers:
+        return list()
+    executor = futures.ThreadPoolExecutor(min(max_workers, len(classifiers)))
+    try:
+        submitted = [(nlc, executor.submit(nlc.health_check)) for nlc in classifiers]
+        deadline = time.time() + timeout
+        for (nlc, f) in submitted:
+            try:
+                f.result(timeout=max(0.0, deadline - time.time()))
+            except futures.TimeoutError:
+                nlc.mark_degraded('Health check timed out after %.1f seconds' % timeout)
+    finally:
+        # Do not wait for the checks that timed out
+        executor.shutdown(wait=False)
+    return [nlc for nlc in classifiers if nlc.degraded]
+
+
+def start_health_checks(classifiers, interval=0, timeout=10, max_workers=8):
+    """
+        Check the classifiers in a background thread, once, and then every interval seconds if interval is positive
+
+        return:
+            stop (threading.Event): Set it to stop the checks
+    """
+    stop = Event()
+
+    def run():
+        check_classifiers(classifiers, timeout, max_workers)
+        while interval > 0 and not stop.wait(interval):
+            check_classifiers(classifiers, timeout, max_workers)
+    thread = Thread(target=run, name='NLCHealthCheck')
+    thread.daemon = True
+    thread.start()
+    return stop
 
 
 class NLCIntentScorer(QueryDocumentScorer):
@@ -30,6 +85,7 @@ class NLCIntentScorer(QueryDocumentScorer):
             one of the classes in the response matches the class of the Solr \
             document, then return the confidence
     """
+    cost = 'remote'
 
     def __init__(self, name, short_name, description, service_url, service_username, service_password, classifier_id, **kwargs):
         """
@@ -48,6 +104,14 @@ class NLCIntentScorer(QueryDocumentScorer):
                 classifier_id (str): Id for the trained classifier
                 id_to_class_csv_path (str): Path to a file mapping from an id \
                     to a class
+                cache_size (int): Number of classified queries that are kept
+                validation (str): 'eager' checks the classifier before returning, 'deferred' checks \
+                    it in a background thread, and 'manual' leaves it to the caller (see \
+                    check_classifiers). Until a deferred or manual check succeeds, the scorer is \
+                    degraded and raises without calling the service, so that Scorers uses its default
+                validation_timeout (float): Timeout of the request that checks the classifier
+                health_check_interval (float): With deferred validation, seconds between checks. \
+                    0 checks once
 
             raise:
                 ScorerConfigurationException, if:
@@ -55,22 +119,33 @@ class NLCIntentScorer(QueryDocumentScorer):
                     - Class mapping is improperly configured
         """
         super(NLCIntentScorer, self).__init__(name=name, short_name=short_name, description=description)
-        self.validate_nlc(service_url, service_username, service_password, classifier_id)
-        self.question_cache = defaultdict()
-        self.cache_lock = Lock()
-        self.cache_size = 10
-
-    def validate_nlc(self, url, username, password, classifier_id):
-        """ Validate the configuration of a single Natural Language Classifier instance
+        validation = kwargs.get('validation', 'eager')
+        if validation not in VALIDATIONS:
+            raise ScorerConfigurationException('validation=%r must be one of %r' % (validation, VALIDATIONS))
+        self.validation_timeout = kwargs.get('validation_timeout', 10)
+        self.degraded, self.degraded_reason = False, None
+        self.health_checks = None
+        if validation == 'eager':
+            self.validate_nlc(service_url, service_username, service_password, classifier_id)
+        else:
+            self.set_credentials(service_url, service_username, service_password, classifier_id)
+            self.mark_degraded('Classifier has not been checked yet')
+        if validation == 'deferred':
+            self.health_checks = start_health_checks([self], interval=kwargs.get('health_check_interval', 0),
+                                timeout=self.validation_timeout)
+        self.cache_size = kwargs.get('cache_size', 10)
+        self.question_cache = LRUCache(self.cache_size)
+
+    def close(self):
+        " Stop the health checks of a deferred validation "
+        if self.health_checks is not None:
+            self.health_checks.set()
+
+    def set_credentials(self, url, username, password, classifier_id):
+        """ Check the types of the credentials and keep them. Does not call the service
 
-            args:
-                url           (str) : Base url for the natural language classifier instance
-                username      (str) : Username for the NLC instance
-                password      (str) : Password for the NLC instance
-                classifier_id (str) : If for the classifier
             raises:
-                ScorerRuntimeException : If url, user, pw are invalid; if the classifier does not exist \
-                    or is not currently taking requests
+                ScorerConfigurationException : If url, user, pw or classifier_id are not strings
         """
         not_str = lambda x: not isinstance(x, str) and not isinstance(x, unicode)
         if not_str(url) or not_str(username) or not_str(password) or not_str(classifier_id):
@@ -83,20 +158,36 @@ class NLCIntentScorer(QueryDocumentScorer):
             else:
                 message = 'classifier_id=%s is not valid' % classifier_id
             raise ScorerConfigurationException(message)
+        self.service_url = url
+        self.service_username = username
+        self.service_password = password
+        self.classifier_id = classifier_id
+
+    def validate_nlc(self, url, username, password, classifier_id):
+        """ Validate the configuration of a single Natural Language Classifier instance
+
+            args:
+                url           (str) : Base url for the natural language classifier instance
+                username      (str) : Username for the NLC instance
+                password      (str) : Password for the NLC instance
+                classifier_id (str) : If for the classifier
+            raises:
+                ScorerRuntimeException : If url, user, pw are invalid; if the classifier does not exist \
+                    or is not currently taking requests
+        """
+        self.set_credentials(url, username, password, classifier_id)
 
         # Get the status of the classifier
         classifier_url = '%s/v1/classifiers/%s' % (url, classifier_id)
-        resp = requests.get(classifier_url, headers={'Accept':'application/json'}, \
-            auth=(username, password))
+        try:
+            resp = requests.get(classifier_url, headers={'Accept':'application/json'}, \
+                auth=(username, password), timeout=self.validation_timeout)
+        except requests.exceptions.RequestException as e:
+            raise ScorerConfigurationException('Error in pinging classifier. Reason : %r' % e)
         if resp.ok:
             try:
                 status = resp.json()['status']
-                if status == 'Available':
-                    self.service_url = url
-                    self.service_username = username
-                    self.service_password = password
-                    self.classifier_id = classifier_id
-                else:
+                if status != 'Available':
                     description = resp.json()['status_description']
                     message = 'classifier_id=%s has status=%s, which is not "Available". status_description=%s' % \
                         (classifier_id, status, description)
@@ -107,6 +198,28 @@ class NLCIntentScorer(QueryDocumentScorer):
             message = 'Error in pinging classifier. Reason : %s' % resp.reason
             raise ScorerConfigurationException(message)
 
+    def health_check(self):
+        """ Validate the classifier with the stored credentials, and mark the scorer degraded if it fails
+
+            return:
+                healthy (bool) : Whether the classifier is available
+        """
+        try:
+            self.validate_nlc(self.service_url, self.service_username, self.service_password, self.classifier_id)
+        except Exception as e:
+            self.mark_degraded(str(e))
+            return False
+        if self.degraded:
+            logger.info('Classifier %s is available' % self.classifier_id)
+        self.degraded, self.degraded_reason = False, None
+        return True
+
+    def mark_degraded(self, reason):
+        " Stop calling the classifier until a health check succeeds "
+        if not self.degraded or reason != self.degraded_reason:
+            logger.warning('Classifier %s is degraded. Reason : %s' % (self.classifier_id, reason))
+        self.degraded, self.degraded_reason = True, reason
+
     def classify(self, text):
         """ Classify an utterance. First check the cache, and then make a call \
                 to the nlc classifier that is configured
@@ -120,9 +233,9 @@ class NLCIntentScorer(QueryDocumentScorer):
         """
 
         # Check the cache
-        with self.cache_lock:
-            if text in self.question_cache:
-                return self.question_cache[text][1]
+        json_resp = self.question_cache.get(text)
+        if json_resp is not None:
+            return json_resp
 
         # Call the API
         classify_url = "%s/v1/classifiers/%s/classify" % (self.service_url, \
@@ -137,13 +250,7 @@ class NLCIntentScorer(QueryDocumentScorer):
             # Update the cache and return
             try:
                 json_resp = resp.json()
-                with self.cache_lock:
-                    if text not in self.question_cache:
-                        if len(self.question_cache) >= self.cache_size:
-                            oldest_key = sorted(self.question_cache.iteritems(), key=lambda x: x[1][0], \
-                                reverse=False)[0][0]
-                            del self.question_cache[oldest_key]
-                        self.question_cache[text] = (time.time(), json_resp)
+                self.question_cache.put(text, json_resp)
                 return json_resp
             except Exception as e:
                 raise ScorerRuntimeException(e.message)
@@ -220,7 +327,8 @@ class NLCIntentScorer(QueryDocumentScorer):
                 document (dict): If document does not have the field 'id', the \
                     method will raise a ScorerRuntimeException
             raise:
-                ScorerRuntimeException: If query is invalid, if document is invalid, other errors
+                ScorerRuntimeException: If query is invalid, if document is invalid, if the classifier \
+                    is degraded, other errors
             return:
                 score (float) : The score/feature that is extracted
         """
@@ -228,25 +336,39 @@ class NLCIntentScorer(QueryDocumentScorer):
         # Validate the document and the query
         self.validate_query(query)
         self.validate_document(document)
+        if self.degraded:
+            raise ScorerRuntimeException('Classifier %s is degraded. Reason : %s' % (self.classifier_id,
+                                                                                   self.degraded_reason))
 
         try:
-            # Get the class for the document
-            doc_class = self.doc_to_class(document)
-
             # Classify the query and return the confidence, if there is a match
-            resp_body = self.classify(query['q'])
-            for klass in resp_body['classes']:
-                if klass['class_name'] == doc_class:
-                    return klass['confidence']
-            return 0.0
+            return self.score_classification(self.classify(query['q']), document)
         except Exception as e:
             raise ScorerRuntimeException(e)
+
+    def score_classification(self, resp_body, document):
+        """ Confidence of the class of the document in a classification of the query. No service call
+
+            args:
+                resp_body (dict): Response of classify for the query
+                document (dict): Solr document, already validated
+            return:
+                score (float) : Confidence of the class of the document, 0.0 if it is not in the response
+        """
+        doc_class = self.doc_to_class(document)
+        for klass in resp_body['classes']:
+            if klass['class_name'] == doc_class:
+                return klass['confidence']
+        return 0.0
 # endclass NLCIntentScorer
 
 
 class MultiNLCIntentScorer(QueryDocumentScorer):
+    cost = 'remote'
+    batchable = True
 
-    def __init__(self, name, short_name, description, field_name=None, field_to_nlc=None):
+    def __init__(self, name, short_name, description, field_name=None, field_to_nlc=None, max_workers=8,
+                 defer_validation=False, validation_timeout=10, health_check_interval=0):
         """
             Create a feature based on the confidence of the natural language
             classifier.
@@ -260,6 +382,13 @@ class MultiNLCIntentScorer(QueryDocumentScorer):
                 field_name (str) : Name of the field to extrac the value from
                 field_to_nlc (dict) : Dictionary mapping the value of the field to a dictionary containing the
                     credentials
+                max_workers (int) : Number of classifiers called at the same time for a query
+                defer_validation (bool) : If True, the classifiers are checked in a background thread \
+                    and the ones that fail are degraded (the documents that need them raise when \
+                    scored) instead of raising here. Otherwise they are all checked concurrently \
+                    before returning
+                validation_timeout (float) : Time allowed to check all the classifiers
+                health_check_interval (float) : With defer_validation, seconds between checks. 0 checks once
 
             raise:
                 ScorerConfigurationException, if:
@@ -270,17 +399,51 @@ class MultiNLCIntentScorer(QueryDocumentScorer):
         self.field_name = field_name
         if field_to_nlc is None:
             field_to_nlc = {}
+        self.executor = futures.ThreadPoolExecutor(max_workers)
+        self.validation_timeout = validation_timeout
         self.configure_classifiers(field_to_nlc)
+        classifiers = self.classifiers()
+        self.health_checks = None
+        if defer_validation:
+            self.health_checks = start_health_checks(classifiers, interval=health_check_interval, timeout=validation_timeout,
+                                max_workers=max_workers)
+        else:
+            degraded = check_classifiers(classifiers, timeout=validation_timeout, max_workers=max_workers)
+            if degraded:
+                raise ScorerConfigurationException('; '.join(['classifier_id=%s : %s' % (nlc.classifier_id,
+                                                                                       nlc.degraded_reason)
+                                                              for nlc in degraded]))
+
+    def close(self):
+        " Stop the health checks and release the thread pool "
+        if self.health_checks is not None:
+            self.health_checks.set()
+        self.executor.shutdown(wait=False)
 
     def configure_classifiers(self, field_to_nlc):
-        " Set up the different classifier objects "
+        """ Set up the different classifier objects. Field values that share a classifier share one object. \
+            The classifiers are not checked here, see check_classifiers """
         self.field_to_nlc = {}
+        classifiers = {}
         for (fv, sc) in field_to_nlc.iteritems():
             url, user, pw = sc['url'], sc['username'], sc['password']
             cl_id = sc['classifier_id']
-            sis = NLCIntentScorer(name='name', short_name='short_name', description='simple_description',
-                                  service_url=url, service_username=user, service_password=pw, classifier_id=cl_id) # single intent scorer
-            self.field_to_nlc[fv] = sis
+            key = (url, user, cl_id)
+            if key not in classifiers:
+                classifiers[key] = NLCIntentScorer(name='name', short_name='short_name', description='simple_description',
+                                                   service_url=url, service_username=user, service_password=pw,
+                                                   classifier_id=cl_id, validation='manual',
+                                                   validation_timeout=self.validation_timeout) # single intent scorer
+            self.field_to_nlc[fv] = classifiers[key]
+
+    def classifiers(self):
+        " Distinct classifier objects "
+        return {id(nlc): nlc for nlc in self.field_to_nlc.values()}.values()
+
+    @property
+    def degraded(self):
+        " Whether any classifier is degraded "
+        return any(nlc.degraded for nlc in self.field_to_nlc.values())
 
     def get_required_fields(self):
         scorers_fields = list()
@@ -289,20 +452,65 @@ class MultiNLCIntentScorer(QueryDocumentScorer):
         scorers_fields.append(self.field_name)
         return list(set(scorers_fields))
 
+    def field_value(self, document):
+        " Value of the field of a document, or None if it has none "
+        if not document.has_key(self.field_name):
+            return None
+        fv = document[self.field_name] #MS
+        if isinstance(fv, list) and len(fv) > 1:
+            raise ScorerRuntimeException('Document %r has more than two values for field %s' % (document, self.field_name))
+        return fv if not isinstance(fv, list) else fv[0]
+
+    def classify_all(self, text, classifiers):
+        """ Classify the text with several classifiers at the same time
+
+            args:
+                text (str): Text to be classified
+                classifiers (list): NLCIntentScorer objects
+            raise:
+                ScorerRuntimeException: If a classifier fails
+            return:
+                responses (dict): Mapping from id of the classifier object to its response
+        """
+        submitted = [(id(nlc), self.executor.submit(nlc.classify, text)) for nlc in classifiers]
+        return {key: f.result() for (key, f) in submitted}
+
     def score(self, query, document):
         " Score a single query document pair "
-        if document.has_key(self.field_name):
-            fv = document[self.field_name] #MS
-            if isinstance(fv, list) and len(list) > 1:
-                raise ScorerRuntimeException('Document %r has more than two values for field %s' % (document, self.field_name))
-            fv = fv if not isinstance(fv, list) else fv[0]
-            if self.field_to_nlc.has_key(fv):
-                scorer = self.field_to_nlc.get(fv)
-                return scorer.score(query=query, document=document)
+        return self.score_batch(query, [document])[0]
+
+    def score_batch(self, query, documents):
+        """ Score the documents of a response. The query is classified once by each distinct classifier \
+            that the documents need, concurrently, and each document is then scored from these responses
+
+            raise:
+                ScorerRuntimeException: If a document needs a degraded classifier, or a classifier fails
+        """
+        field_values = [self.field_value(document) for document in documents]
+        classifiers = {id(self.field_to_nlc[fv]): self.field_to_nlc[fv] for fv in set(field_values)
+                       if self.field_to_nlc.has_key(fv)}
+        degraded = [nlc for nlc in classifiers.values() if nlc.degraded]
+        if degraded:
+            raise ScorerRuntimeException('; '.join(['Classifier %s is degraded. Reason : %s' % (nlc.classifier_id,
+                                                                                             nlc.degraded_reason)
+                                                    for nlc in degraded]))
+        if not classifiers:
+            return [0.0] * len(documents)
+        for nlc in classifiers.values():
+            nlc.validate_query(query)
+        responses = self.classify_all(query['q'], classifiers.values())
+        scores = list()
+        for (fv, document) in zip(field_values, documents):
+            if self.field_to_nlc.has_key(fv) and id(self.field_to_nlc[fv]) in responses:
+                nlc = self.field_to_nlc[fv]
+                nlc.validate_document(document)
+                try:
+                    scores.append(nlc.score_classification(responses[id(nlc)], document))
+                except Exception as e:
+                    raise ScorerRuntimeException(e)
             else:
-                return 0.0
-        else:
-            return 0.0
+                scores.append(0.0)
+        return scores
 # endclass MultiNLCIntentScorer
 
 
@@ -13,26 +13,42 @@
 # limitations under the License.
 
 import re
-from spacy.en import English
+import numpy as np
+from retrieve_and_rank_scorer.nlp import get_nlp
+from retrieve_and_rank_scorer.cache import LRUCache
+from retrieve_and_rank_scorer.sentence_cache import get_sentence_cache
 from retrieve_and_rank_scorer.query_document.query_document_scorer import QueryDocumentScorer
 
+# Query and sentence patterns, compiled once
+WHAT_IS_QUERY = re.compile('^what is (.*)$')
+DEFINITION_QUERY = re.compile('^what (?:is|are|am|was) (.*)$')
+DEFINITION_SENTENCE = re.compile('^(.*) (?:is|are|am|was) .*$')
+
+# Number of analyzed queries kept by each scorer
+ANALYSIS_CACHE_SIZE = 1024
+
 class WhatIsScorer(QueryDocumentScorer):
     """
         If a question is a definition, score the extent to which there exists a single passage that answers that
         question
     """
+    cost = 'nlp'
 
-    def __init__(self, name='WhatIsScorer', description='', short_name='wis', strategy='max'):
+    def __init__(self, name='WhatIsScorer', description='', short_name='wis', strategy='max',
+                 sentence_cache=None):
         """ If a question is of the form 'what is X' score the extent to which a single sentence
             in the answer is of the form 'X is ...'
 
             args:
                 name, description, short_name (str): See QueryDocumentScorer
                 strategy (str): The scoring strategy. Must be one of the following: 'max', 'average'
+                sentence_cache (str): Optional path to a SQLite file where the sentence boundaries of \
+                    the documents are kept across restarts. See sentence_cache.get_sentence_cache
         """
         super(WhatIsScorer, self).__init__(name=name, description=description, short_name=short_name)
         self.strategy = strategy
-        self.nlp = English()
+        self.analyses_ = LRUCache(ANALYSIS_CACHE_SIZE)
+        self.sentences_ = get_sentence_cache(sentence_cache)
 
     def mean(self, iterable):
         n = len(iterable)
@@ -42,39 +58,53 @@ class WhatIsScorer(QueryDocumentScorer):
     def get_required_fields(self):
         return ['text']
 
+    def analyze(self, query_text):
+        """ Compile the answer matcher of a query, once per query text
+            return:
+                matcher (re.RegexObject): Matches the sentences of the form 'X is ...', \
+                    or None if the query is not of the form 'what is X'
+        """
+        qtm = WHAT_IS_QUERY.match(query_text.lower())
+        if qtm is None:
+            return None
+        qr = qtm.group(1) # query remainder, matched literally
+        return re.compile('^%s (?:is|are|am|was) .*$' % re.escape(qr)) # answer matcher
+
     def score(self, query, document):
         """ Score the definition overlap of the sentence
             Step 1: Extract the thing to be defined
             Step 2: Find and sentences that match
             Step 3: Compute the score
         """
-        qt = query['q'] # query text
-        qtm = re.match('^what is (.*)$', qt.lower())
-        if qtm:
-            qr = qtm.group(1) # query remainder
-            dt = self.nlp(unicode(document['text']))
-            ss = list() # sentence scores
-            for sent in dt.sents:
-                amt = '^%s (?:is|are|am|was) .*$' % qr # answer matcher text
-                ss.append(1.0 if re.match(amt, sent.orth_.lower()) else 0.0)
-            return self.mean(ss) if self.strategy == 'average' else max(ss)
-        else:
+        matcher = self.analyses_.get_or_compute(query['q'], self.analyze)
+        if matcher is None:
             return 0.0
+        sentences = self.sentences_.sentences(document)
+        ss = [1.0 if matcher.match(sent) else 0.0 for (start, end, sent) in sentences] # sentence scores
+        return self.mean(ss) if self.strategy == 'average' else max(ss)
 # endclass WhatIsScorer
 
 
 class QueryDefinitionScorer(QueryDocumentScorer):
-    def __init__(self, name='QueryDefinitionScorer', description='', short_name='qds', strategy='max'):
+    cost = 'nlp'
+
+    def __init__(self, name='QueryDefinitionScorer', description='', short_name='qds', strategy='max',
+                 vector_cache_size=0, sentence_cache=None):
         """ If a question is of the form 'what is X' score the extent to which a single sentence
             in the answer is of the form 'X is ...'
 
             args:
                 name, description, short_name (str): See QueryDocumentScorer
                 strategy (str): The scoring strategy. Must be one of the following: 'max', 'average'
+                vector_cache_size (int): If positive, the subject vectors of this many documents are \
+                    kept in memory, keyed by document id and text
+                sentence_cache (str): See WhatIsScorer
         """
         super(QueryDefinitionScorer, self).__init__(name=name, description=description, short_name=short_name)
         self.strategy = strategy
-        self.nlp = English()
+        self.analyses_ = LRUCache(ANALYSIS_CACHE_SIZE)
+        self.vectors_ = LRUCache(vector_cache_size) if vector_cache_size > 0 else None
+        self.sentences_ = get_sentence_cache(sentence_cache)
 
     def mean(self, iterable):
         n = len(iterable)
@@ -87,7 +117,7 @@ class QueryDefinitionScorer(QueryDocumentScorer):
     def to_be_defined(self, query, **kwargs):
         " Return the thing to be defined "
         if 'q' in query:
-            qtm = re.match('^what (?:is|are|am|was) (.*)$', query['q'].lower())
+            qtm = DEFINITION_QUERY.match(query['q'].lower())
             if qtm:
                 return qtm.group(1)
             else:
@@ -95,12 +125,57 @@ class QueryDefinitionScorer(QueryDocumentScorer):
         else:
             return None
 
-    def sentence_definition_overlap(self, tbd, sent, **kwargs):
-        " Does the sentence define the thing that is tbd (to be defined)? "
-        sm = re.match('^(.*) (?:is|are|am|was) .*$', sent.lower())
+    def analyze(self, query_text):
+        """ Extract the thing to be defined and compute its vector, once per query text
+            return:
+                analysis (tuple): (tbd, vector of tbd), or None if the query is not a definition query
+        """
+        tbd = self.to_be_defined({'q': query_text})
+        if tbd is None:
+            return None
+        return tbd, np.asarray(get_nlp().tokenizer(unicode(tbd)).vector, dtype=np.float32)
+
+    def subject_vectors(self, sentences, size):
+        """ Vector of the subject span ('X' in 'X is ...') of every sentence. The subject spans are only \
+            tokenized, as word vectors do not depend on the tagger or the parser
+            args:
+                sentences (list): (start, end, lowercase sentence) of each sentence, see SentenceCache
+                size (int): Size of the word vectors
+            return:
+                vectors (np.ndarray): float32 matrix of shape (n_sentences, size). The rows of the sentences \
+                    that are not of the form 'X is ...' are 0
+        """
+        tokenizer = get_nlp().tokenizer
+        vectors = np.zeros((len(sentences), size), dtype=np.float32)
+        for (i, (start, end, sent)) in enumerate(sentences):
+            sm = DEFINITION_SENTENCE.match(sent)
+            if sm:
+                vectors[i] = tokenizer(sm.group(1)).vector
+        return vectors
+
+    def document_subject_vectors(self, document, size):
+        " subject_vectors of the sentences of a document, read from the vector cache if it is enabled "
+        if self.vectors_ is None:
+            return self.subject_vectors(self.sentences_.sentences(document), size)
+        key = self.sentences_.document_key(document)
+        return self.vectors_.get_or_compute(key, lambda k: self.subject_vectors(self.sentences_.sentences(document),
+                                                                                 size))
+
+    def similarities(self, vectors, tbd_vector):
+        """ Cosine similarity of each row of vectors with tbd_vector. 0 for rows (or a tbd_vector) of norm 0 """
+        norms = np.linalg.norm(vectors, axis=1) * np.linalg.norm(tbd_vector)
+        dots = np.dot(vectors, tbd_vector)
+        sims = np.zeros(len(vectors), dtype=np.float64)
+        np.divide(dots, norms, out=sims, where=norms > 0)
+        return sims
+
+    def sentence_definition_overlap(self, tbd, sent, tbd_doc=None, **kwargs):
+        """ Does the sentence define the thing that is tbd (to be defined)? tbd_doc is the parsed tbd, \
+            parsed here if it is not provided """
+        sm = DEFINITION_SENTENCE.match(sent.lower())
         if sm:
-            doc1 = self.nlp(unicode(sm.group(1)))
-            doc2 = self.nlp(unicode(tbd))
+            doc1 = get_nlp()(unicode(sm.group(1)))
+            doc2 = tbd_doc if tbd_doc is not None else get_nlp()(unicode(tbd))
             return doc1.similarity(doc2) # Might need to re-think this
         else:
             return 0.0
@@ -113,15 +188,17 @@ class QueryDefinitionScorer(QueryDocumentScorer):
         """ Score the definition overlap of the sentence
             Step 1: Is this a definition query?
             Step 2: If so, find the thing to be defined
-            Step 3: For each sentence in the document text, score the sentence definition overlap
+            Step 3: For each sentence in the document text, score the sentence definition overlap, \
+                as the similarity of the vectors of the subject of the sentence and of the thing to be defined
             Step 4: Score the entire thing
         """
-        tbd = self.to_be_defined(query) # to-be-defined
-        if tbd is None:
+        if 'q' not in query:
+            return 0.0
+        analysis = self.analyses_.get_or_compute(query['q'], self.analyze)
+        if analysis is None:
             return 0.0
-        dt, ss = self.nlp(unicode(document['text'])), []
-        for sent in dt.sents:
-            sdo = self.sentence_definition_overlap(tbd, sent.orth_) # does this sentence define the thing to be defined?
-            ss.append(sdo)
-        return self.aggregate_score(ss)
+        tbd, tbd_vector = analysis # to-be-defined
+        # How much does each sentence define the thing to be defined? One matrix-vector product
+        ss = self.similarities(self.document_subject_vectors(document, len(tbd_vector)), tbd_vector)
+        return self.aggregate_score(ss.tolist())
 # endclass QueryDefinitionScorer
@@ -21,6 +21,12 @@ class QueryDocumentScorer(object):
         All subclasses of QueryDocumentScorer must override the score(query, doc) method
     """
 
+    # Capabilities, see retrieve_and_rank_scorer.registry
+    batchable = False
+    cacheable = True
+    thread_safe = True
+    cost = 'cheap'
+
     def __init__(self, name='QueryDocumentScorer', short_name='qds',
                  description='Description of the scorer'):
         """ Base class for any scorers that want to consume both a Solr document and a Solr query
@@ -71,4 +77,16 @@ class QueryDocumentScorer(object):
                 document (dict): Contents of the solr document
         """
         raise NotImplementedError
+
+    def score_batch(self, query, documents):
+        """    Score the query against several documents. Scorers that can do this faster than calling
+            score for each document override this method and set batchable to True
+
+            Args:
+                query (dict): See score
+                documents (list): Contents of the solr documents
+            Return:
+                scores (list): One score per document
+        """
+        return [self.score(query, document) for document in documents]
 #endclass QueryDocumentScorer
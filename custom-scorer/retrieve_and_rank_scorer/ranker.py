@@ -0,0 +1,196 @@
+# Copyright 2016 IBM All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import csv
+import numpy as np
+from retrieve_and_rank_scorer.feature_matrix import FRAME_MAGIC, decode_frames
+
+
+class RankerInput(object):
+    """
+        Feature vectors of a RSInput CSV, as written by bin/python/train.py and trainproxy.py, \
+            or of the binary frames written by trainproxy.py -b
+
+        Each row is <question_id>,<feature_1>,...,<feature_n>,<relevance>. The header row is \
+            optional. Header rows that are repeated inside the file (the training scripts append \
+            to the same file) are skipped
+    """
+
+    def __init__(self, headers, qids, features, relevance):
+        """
+            args:
+                headers (list): Names of the feature columns
+                qids (list): Question id of each row
+                features (np.ndarray): float32 matrix of shape (n_rows, n_features)
+                relevance (np.ndarray): int array of shape (n_rows,)
+        """
+        self.headers = headers
+        self.qids = qids
+        self.features = features
+        self.relevance = relevance
+
+    @staticmethod
+    def read(path):
+        " Read a RSInput CSV file, or a file of binary frames (see feature_matrix.encode_frame) "
+        with open(path, 'rb') as infile:
+            magic = infile.read(len(FRAME_MAGIC))
+        if magic == FRAME_MAGIC:
+            return RankerInput.read_frames(path)
+        return RankerInput.read_csv(path)
+
+    @staticmethod
+    def read_frames(path):
+        " Read a file of binary frames, as written by trainproxy.py -b "
+        with open(path, 'rb') as infile:
+            data = infile.read()
+        headers, qids, matrices, relevance = None, list(), list(), list()
+        for (frame_headers, frame_qids, frame_relevance, features) in decode_frames(data):
+            if headers is None:
+                headers = frame_headers
+            elif frame_headers != headers:
+                raise ValueError('Frame headers %r do not match %r' % (frame_headers, headers))
+            qids.extend(frame_qids)
+            relevance.extend(frame_relevance)
+            matrices.append(features.values)
+        if not qids:
+            raise ValueError('Frame file %r does not contain any feature vectors' % path)
+        return RankerInput(headers, qids, np.vstack(matrices), np.array(relevance, dtype=np.int32))
+
+    def write_csv(self, path):
+        " Write the input as a RSInput CSV file, the format of the rank API training data. See FeatureMatrix.format_rows "
+        with open(path, 'wb') as outfile:
+            writer = csv.writer(outfile)
+            writer.writerow(['question_id'] + self.headers + ['ground_truth'])
+            for qid, values, rel in zip(self.qids, self.features.tolist(), self.relevance.tolist()):
+                writer.writerow([qid] + ['%.9g' % v for v in values] + [rel])
+
+    @staticmethod
+    def read_csv(path):
+        " Read a RSInput CSV file "
+        headers, qids, rows, relevance = None, list(), list(), list()
+        with open(path, 'rb') as infile:
+            for row in csv.reader(infile):
+                if len(row) < 3:
+                    continue
+                try:
+                    values = [float(x) for x in row[1:-1]]
+                    rel = int(float(row[-1]))
+                except ValueError:
+                    if headers is None:
+                        headers = [x.strip() for x in row[1:-1]]
+                    continue
+                qids.append(row[0])
+                rows.append(values)
+                relevance.append(rel)
+        if not rows:
+            raise ValueError('RSInput file %r does not contain any feature vectors' % path)
+        features = np.array(rows, dtype=np.float32)
+        if headers is None:
+            headers = ['feature_%d' % i for i in range(features.shape[1])]
+        elif len(headers) != features.shape[1]:
+            raise ValueError('Header has %d features, rows have %d' % (len(headers), features.shape[1]))
+        return RankerInput(headers, qids, features, np.array(relevance, dtype=np.int32))
+
+    def select(self, headers):
+        " Copy of the input restricted to the given feature columns "
+        indices = [self.headers.index(h) for h in headers]
+        return RankerInput(list(headers), self.qids, self.features[:, indices], self.relevance)
+
+    def groups(self):
+        " Row indices of each question, in order of first appearance, as a list of (qid, indices) "
+        qid_to_rows, order = dict(), list()
+        for i, qid in enumerate(self.qids):
+            if qid not in qid_to_rows:
+                qid_to_rows[qid] = list()
+                order.append(qid)
+            qid_to_rows[qid].append(i)
+        return [(qid, np.array(qid_to_rows[qid])) for qid in order]
+# endclass RankerInput
+
+
+class LinearRanker(object):
+    """
+        Local stand-in for the Retrieve and Rank ranker. A ridge regression of the relevance \
+            on the standardized feature vectors, solved in closed form. Used to re-rank stored \
+            candidate lists offline and as a local ranker backend
+    """
+
+    def __init__(self, l2=1.0):
+        """
+            args:
+                l2 (float): Strength of the L2 regularization
+        """
+        self.l2_ = l2
+        self.headers_ = None
+        self.mean_ = None
+        self.scale_ = None
+        self.coef_ = None
+        self.intercept_ = 0.0
+
+    @property
+    def headers(self):
+        return self.headers_
+
+    def fit(self, ranker_input):
+        """
+            Train the model
+
+            args:
+                ranker_input (RankerInput): Training feature vectors and relevance labels
+            return:
+                self
+        """
+        x = ranker_input.features.astype(np.float64)
+        y = ranker_input.relevance.astype(np.float64)
+        self.mean_ = x.mean(axis=0)
+        self.scale_ = x.std(axis=0)
+        self.scale_[self.scale_ == 0.0] = 1.0
+        z = (x - self.mean_) / self.scale_
+        gram = np.dot(z.T, z) + self.l2_ * np.eye(z.shape[1])
+        self.intercept_ = y.mean()
+        self.coef_ = np.linalg.solve(gram, np.dot(z.T, y - self.intercept_))
+        self.headers_ = list(ranker_input.headers)
+        return self
+
+    def score(self, features):
+        """
+            Score feature vectors
+
+            args:
+                features (np.ndarray): Matrix of shape (n_rows, n_features), columns in the order of headers
+            return:
+                scores (np.ndarray): Array of shape (n_rows,). Higher is better
+        """
+        if self.coef_ is None:
+            raise ValueError('LinearRanker has not been trained')
+        z = (np.asarray(features, dtype=np.float64) - self.mean_) / self.scale_
+        return np.dot(z, self.coef_) + self.intercept_
+
+    def save(self, path):
+        " Write the trained model to a .npz file "
+        np.savez(path, headers=np.array(self.headers_), mean=self.mean_, scale=self.scale_, coef=self.coef_,
+                 intercept=np.array([self.intercept_]), l2=np.array([self.l2_]))
+
+    @staticmethod
+    def load(path):
+        " Read a model written by save "
+        archive = np.load(path)
+        ranker = LinearRanker(l2=float(archive['l2'][0]))
+        ranker.headers_ = [str(h) for h in archive['headers']]
+        ranker.mean_ = archive['mean']
+        ranker.scale_ = archive['scale']
+        ranker.coef_ = archive['coef']
+        ranker.intercept_ = float(archive['intercept'][0])
+        return ranker
+# endclass LinearRanker
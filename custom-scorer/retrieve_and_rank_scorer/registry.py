@@ -0,0 +1,102 @@
+# Copyright 2016 IBM All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+    Registry of the scorer classes that can be used in a feature configuration file
+
+    Scorer classes declare their capabilities as class attributes, which Scorers uses to \
+        schedule the work without instantiating or calling them:
+        batchable (bool): score_batch scores several documents faster than calling score for each
+        cacheable (bool): The score is a deterministic function of its inputs and can be stored
+        thread_safe (bool): score can be called from several threads at the same time
+        cost (str): 'cheap' (field lookups), 'nlp' (runs a spaCy pipeline) or 'remote' (calls a service)
+
+    Scorer modules are only imported when a configuration refers to them, and heavy dependencies \
+        (spaCy, see retrieve_and_rank_scorer.nlp) are only loaded when a scorer first needs them
+"""
+
+import importlib
+from threading import Lock
+from retrieve_and_rank_scorer.document.document_scorer import DocumentScorer
+from retrieve_and_rank_scorer.query.query_scorer import QueryScorer
+from retrieve_and_rank_scorer.query_document.query_document_scorer import QueryDocumentScorer
+
+# Base class of each scorer type
+SCORER_TYPES = {'document': DocumentScorer, 'query': QueryScorer, 'query_document': QueryDocumentScorer}
+
+# Scheduling order of the cost classes. Expensive scorers are started first
+COSTS = {'cheap': 0, 'nlp': 1, 'remote': 2}
+
+
+class ScorerRegistry(object):
+    """
+        Resolves the (type, module, class) of a scorer configuration to a scorer class
+    """
+
+    def __init__(self):
+        self.classes_ = dict()
+        self.lock_ = Lock()
+
+    def register(self, scorer_type, module_name, class_name, cls):
+        """
+            Register a scorer class explicitly, e.g. a scorer defined outside of this package
+
+            raise:
+                ValueError : If the class does not subclass the base class of scorer_type
+        """
+        self._validate(scorer_type, cls)
+        with self.lock_:
+            self.classes_[(scorer_type, module_name, class_name)] = cls
+
+    def resolve(self, scorer_type, module_name, class_name):
+        """
+            Scorer class of a configuration entry. The module retrieve_and_rank_scorer.<type>.<module> \
+                is imported the first time one of its classes is resolved
+
+            raise:
+                ValueError : If the type is unknown, or the class does not subclass the base class of the type
+                ImportError, AttributeError : If the module or the class does not exist
+        """
+        key = (scorer_type, module_name, class_name)
+        with self.lock_:
+            cls = self.classes_.get(key)
+        if cls is None:
+            if scorer_type not in SCORER_TYPES:
+                raise ValueError('Scorer %s.%s is not of type "document", "query" or "query_document"' %
+                                 (module_name, class_name))
+            module = importlib.import_module('retrieve_and_rank_scorer.%s.%s' % (scorer_type, module_name))
+            cls = getattr(module, class_name)
+            self.register(scorer_type, module_name, class_name, cls)
+        return cls
+
+    def create(self, scorer_info):
+        " Instantiate the scorer of a configuration entry. See utils.load_from_file for the format "
+        cls = self.resolve(scorer_info['type'], scorer_info['module'], scorer_info['class'])
+        return cls(**scorer_info['init_args'])
+
+    @staticmethod
+    def _validate(scorer_type, cls):
+        base = SCORER_TYPES.get(scorer_type)
+        if base is None or not isinstance(cls, type) or not issubclass(cls, base):
+            raise ValueError('Scorer=%r of type %s is not properly subclassed' % (cls, scorer_type))
+# endclass ScorerRegistry
+
+
+# Registry used by utils.load_from_file
+default_registry = ScorerRegistry()
+
+
+def cost_rank(scorer):
+    " Scheduling rank of a scorer, from its cost class. Unknown classes are treated as 'cheap' "
+    return COSTS.get(getattr(scorer, 'cost', 'cheap'), 0)
@@ -13,14 +13,27 @@
 # limitations under the License.
 
 
-from retrieve_and_rank_scorer import utils
+import math
+import time
+import logging
+from threading import Lock
+from retrieve_and_rank_scorer import utils, registry
+from retrieve_and_rank_scorer.circuit_breaker import CircuitBreaker, OPEN, TRIAL
+from retrieve_and_rank_scorer.feature_store import FeatureStore
+from retrieve_and_rank_scorer.document_features import DocumentFeatures
 from retrieve_and_rank_scorer.scorer_exception import ScorerRuntimeException, ScorerTimeoutException
 import numpy as np
 from concurrent import futures
 
+logger = logging.getLogger(__name__)
+
+# Returned by Scorers._call when the circuit breaker of the scorer does not let the call through
+SHORT_CIRCUITED = object()
+
 class Scorers(object):
 
-    def __init__(self, feature_json_file, timeout=10, max_workers=10):
+    def __init__(self, feature_json_file, timeout=10, max_workers=10, feature_store_path=None,
+                 document_features_path=None, previous=None, default_value=None, degrade=True):
         """
             Pipeline that manages scoring of multiple custom feature scorers
             This is the API that almost all scorers will access when training \
@@ -29,17 +42,47 @@ class Scorers(object):
             args:
                 feature_json_file (str): Path to a feature configuration file. \
                     This file defines the pipeline of custom scorers used
+                feature_store_path (str): Optional path to a feature store. If provided, scores are \
+                    read from the store when present and written to it when computed
+                document_features_path (str): Optional path to the document scorer values computed \
+                    at index time. Document scorers are only run for documents missing from this file
+                previous (Scorers): Optional previous version of the pipeline. Its scorers are reused \
+                    when their configuration did not change
+                default_value (float): Value of a scorer that fails, times out or is short-circuited by \
+                    its circuit breaker, unless the feature file sets a "default" for the scorer. \
+                    None is sent to the ranker as 0
+                degrade (bool): If True, scorer failures and timeouts are replaced with the default \
+                    value. Otherwise they raise
             raise:
                 ScorerConfigurationException : If any of the individual scorers raise during configuration, \
                     If the file feature_json_file cannot be found or is not of the proper type
         """
-        scorer_dict = utils.load_from_file(feature_json_file)
+        reuse = previous.scorers_by_version() if previous is not None else None
+        scorer_dict = utils.load_from_file(feature_json_file, reuse=reuse)
+        self._versions = scorer_dict.get('versions', {})
         self._document_scorers = scorer_dict.get('document', [])
         self._query_scorers = scorer_dict.get('query', [])
         self._query_document_scorers = scorer_dict.get('query_document', [])
         self._timeout = timeout
         self._interval = 0.1
+        self._max_workers = max_workers
         self._thread_executor = futures.ThreadPoolExecutor(max_workers)
+        self._scorer_locks = {scorer.short_name: Lock() for scorer in self._all_scorers() if not scorer.thread_safe}
+        self._default_value = default_value
+        self._degrade = degrade
+        self._defaults = scorer_dict.get('defaults', {})
+        # Calls slower than the timeout count as failures, unless the feature file says otherwise
+        breaker_configs = scorer_dict.get('circuit_breakers', {})
+        self._breakers = {scorer.short_name: CircuitBreaker(**dict({'slow_call_threshold': timeout},
+                                                                   **breaker_configs.get(scorer.short_name, {})))
+                          for scorer in self._all_scorers()}
+        self._feature_store = None
+        if feature_store_path is not None:
+            self._feature_store = FeatureStore(feature_store_path, scorer_dict.get('versions', {}))
+            self._feature_store.purge_stale()
+        self._document_features = None
+        if document_features_path is not None:
+            self._document_features = DocumentFeatures(document_features_path, scorer_dict.get('versions', {}))
 
     def get_headers(self):
         " Get the custom headers "
@@ -52,64 +95,335 @@ class Scorers(object):
     def get_required_fields(self):
         " Get the required fields for the underlying scorers "
         required_fields = list()
-        for qs in self._query_scorers:
-            required_fields.extend(qs.get_required_fields())
-        for qds in self._query_document_scorers:
-            required_fields.extend(qds.get_required_fields())
+        for scorer in self._all_scorers():
+            required_fields.extend(scorer.get_required_fields() or [])
         return list(set(required_fields))
 
-    def _score(self, scorer, *args, **kwargs):
+    def _all_scorers(self):
+        " All scorers, in the order of the headers "
+        return self._document_scorers + self._query_scorers + self._query_document_scorers
+
+    def scorers_by_version(self):
+        " Mapping from the configuration version of each scorer to the scorer "
+        return {self._versions[scorer.short_name]: scorer for scorer in self._all_scorers()
+                if scorer.short_name in self._versions}
+
+    def breaker_metrics(self):
+        " Metrics of the circuit breaker of each scorer, by short name "
+        return {short_name: breaker.metrics() for (short_name, breaker) in self._breakers.iteritems()}
+
+    def default(self, scorer):
+        " Value of the scorer when it fails, times out or is short-circuited "
+        return self._defaults.get(scorer.short_name, self._default_value)
+
+    def close(self, keep=None):
+        """
+            Release the thread pool and the feature store, and close the scorers that have a close method \
+                (e.g. to stop their health checks)
+
+            args:
+                keep (Scorers): Optional newer version of the pipeline. The scorers it reuses stay open
+        """
+        self._thread_executor.shutdown(wait=False)
+        kept = set(id(scorer) for scorer in keep._all_scorers()) if keep is not None else set()
+        for scorer in self._all_scorers():
+            if id(scorer) not in kept and hasattr(scorer, 'close'):
+                scorer.close()
+        if self._feature_store is not None:
+            self._feature_store.close()
+
+    def _score(self, scorer, args, deadline=None):
         """ Score an individual item
             args:
                 scorer (Scorer) : Scorer object
-                args (list)     : List of additional unnamed args
-                kwargs (dict)   : Dictionary of additional named args
+                args (tuple)    : Arguments of the score method
+                deadline (Deadline) : Optional deadline of the request. The scorer gets the remaining \
+                    budget if it is shorter than the timeout, and is not run once it has passed
             raise:
-                ScorerRuntimeException : If scorer fails along the way
-                ScorerTimeoutException : If scorer times out
+                ScorerRuntimeException : If scorer fails along the way, and degrade is False
+                ScorerTimeoutException : If scorer times out, and degrade is False
             return:
-                score (float) : Score
+                score (float) : Score, or the default of the scorer if it failed and degrade is True
+                computed (bool) : False if score is the default
         """
+        timeout = self._timeout if deadline is None else min(self._timeout, deadline.remaining())
+        if self._breakers[scorer.short_name].state == OPEN or timeout <= 0.0:
+            return self.default(scorer), False
         f = None
         try:
-            f = self._thread_executor.submit(scorer.score, *args, **kwargs)
-            return f.result(timeout=self._timeout)
+            f = self._thread_executor.submit(self._call, scorer, scorer.score, *args)
+            score = f.result(timeout=timeout)
+            if score is SHORT_CIRCUITED:
+                return self.default(scorer), False
+            return score, True
         except futures.TimeoutError, e:
             if f is not None:
                 f.cancel()
-            raise ScorerTimeoutException('Scorer %r timed out', args, kwargs)
-        except ScorerRuntimeException as e:
+            return self._failed(scorer, ScorerTimeoutException('Scorer %s timed out' % scorer.short_name)), False
+        except Exception as e:
+            return self._failed(scorer, e), False
+
+    def _call(self, scorer, method, *args, **kwargs):
+        """ Call a method of a scorer through its circuit breaker, and under its lock if it is not thread safe
+            return:
+                result : Result of the method, or SHORT_CIRCUITED if the breaker did not let the call through
+        """
+        breaker = self._breakers[scorer.short_name]
+        allowed = breaker.allow()
+        if not allowed:
+            return SHORT_CIRCUITED
+        lock = self._scorer_locks.get(scorer.short_name)
+        start, succeeded = time.time(), False
+        try:
+            if lock is not None:
+                with lock:
+                    result = method(*args, **kwargs)
+            else:
+                result = method(*args, **kwargs)
+            succeeded = True
+            return result
+        finally:
+            breaker.record(time.time() - start, succeeded, trial=allowed == TRIAL)
+
+    def _failed(self, scorer, e):
+        " Default of a scorer that failed with exception e. Raise e if degrade is False "
+        if not self._degrade:
             raise e
+        logger.warning('Scorer %s failed, using default=%r. Exception=%r' % (scorer.short_name,
+                                                                            self.default(scorer), e))
+        return self.default(scorer)
 
-    def scores(self, query, doc):
+    def scores(self, query, doc, deadline=None):
         """
             Score the query/document pair using all registered scorers
 
             args:
                 query (dict): Dictionary containing contents of the query
                 doc (dict): Dictionary containing contents of individual Solr Doc
+                deadline (retrieve_and_rank_scorer.deadline.Deadline): Optional deadline of the request. \
+                    Scorers that cannot finish before it get their default value
             raises:
                 ScorerRuntimeException: If there are any issues scoring \
                     individual query/document pairs
             returns:
                 vect (numpy.ndarray): Numpy array containing the feature vectors
         """
-        vect = list()
+        if self._feature_store is not None:
+            precomputed = dict()
+            if self._document_features is not None:
+                precomputed = self._document_features.get(doc.get('id'))
+            return self._stored_scores(query, doc, precomputed, deadline)
+        return np.array(self._score_rows(query, [doc], deadline)[0])
+
+    def scores_matrix(self, query, docs, deadline=None):
+        """
+            Score the query against every document of a response
+
+            args:
+                query (dict): Dictionary containing contents of the query
+                docs (list): Dictionaries containing contents of the Solr Docs
+                deadline (retrieve_and_rank_scorer.deadline.Deadline): See scores
+            returns:
+                mat (numpy.ndarray): float32 matrix of shape (len(docs), len(get_headers())). \
+                    NaN where a scorer returned None
+        """
+        mat = np.empty((len(docs), len(self.get_headers())), dtype=np.float32)
+        if self._feature_store is not None and docs:
+            mat[:] = np.array(self._stored_rows(query, docs, deadline), dtype=np.float32)
+        elif docs:
+            mat[:] = np.array(self._score_rows(query, docs, deadline), dtype=np.float32)
+        return mat
 
-        # Score the docs
-        for document_scorer in self._document_scorers:
-            score = self._score(document_scorer, doc)
-            vect.append(score)
+    def _score_rows(self, query, docs, deadline=None, known=None, computed=None):
+        """
+            Score the query against documents with all registered scorers. All the work is submitted at \
+                once: query scorers run once for all the documents, batchable scorers score all the \
+                documents in one call, and known scores are not recomputed
 
-        # Score the queries
-        for query_scorer in self._query_scorers:
-            score = self._score(query_scorer, query)
-            vect.append(score)
+            args:
+                known (list): Optional scores that are already known, one dict per document mapping \
+                    short names to values. Defaults to the precomputed document scores
+                computed (list): Optional list of one dict per document, filled with the scores that \
+                    were computed, leaving out the defaults of scorers that failed
+            returns:
+                rows (list): One list of scores per document, in the order of the headers
+        """
+        scorers = self._all_scorers()
+        num_document, num_query = len(self._document_scorers), len(self._query_scorers)
+        rows = [[None] * len(scorers) for doc in docs]
+        if known is None:
+            known = [dict() for doc in docs]
+            if self._document_features is not None:
+                known = [self._document_features.get(doc.get('id')) for doc in docs]
+        # Task keys are (row, column), ('query', column), or (rows, column) for batches
+        tasks, missing = list(), dict()
+        for j, scorer in enumerate(scorers):
+            missing[j] = list()
+            for i, doc in enumerate(docs):
+                if scorer.short_name in known[i]:
+                    rows[i][j] = known[i][scorer.short_name]
+                else:
+                    missing[j].append(i)
+        for j, scorer in enumerate(self._document_scorers):
+            if scorer.batchable and missing[j]:
+                tasks.append(((tuple(missing[j]), j), scorer, scorer.score_batch, ([docs[i] for i in missing[j]],)))
+            else:
+                tasks.extend([((i, j), scorer, scorer.score, (docs[i],)) for i in missing[j]])
+        for j, scorer in enumerate(self._query_scorers, num_document):
+            if missing[j]:
+                tasks.append((('query', j), scorer, scorer.score, (query,)))
+        for j, scorer in enumerate(self._query_document_scorers, num_document + num_query):
+            if scorer.batchable and missing[j]:
+                tasks.append(((tuple(missing[j]), j), scorer, scorer.score_batch,
+                              (query, [docs[i] for i in missing[j]])))
+            else:
+                tasks.extend([((i, j), scorer, scorer.score, (query, docs[i])) for i in missing[j]])
+
+        defaulted = set()
+        for ((i, j), value) in self._run(tasks, deadline, defaulted).iteritems():
+            if i == 'query':
+                scores = [(row_index, value) for row_index in missing[j]]
+            elif isinstance(i, tuple):
+                scores = zip(i, value)
+            else:
+                scores = [(i, value)]
+            for (row_index, score) in scores:
+                rows[row_index][j] = score
+                if computed is not None and (i, j) not in defaulted:
+                    computed[row_index][scorers[j].short_name] = score
+        return rows
+
+    def _store_keys(self, query_hash, doc):
+        """ Feature store keys (query part, document part) of the document, query and query/document scorers. \
+            Documents without an id cannot be keyed, only their query scorers have a key """
+        doc_id = doc.get('id')
+        if doc_id is None or str(doc_id) == '':
+            return [(self._query_scorers, (query_hash, ''))]
+        return [(self._document_scorers, ('', str(doc_id))),
+                (self._query_scorers, (query_hash, '')),
+                (self._query_document_scorers, (query_hash, str(doc_id)))]
 
-        # Score the query-document pairs
-        for query_document_scorer in self._query_document_scorers:
-            score = self._score(query_document_scorer, query, doc)
-            vect.append(score)
+    def _stored_rows(self, query, docs, deadline=None):
+        """ Same as _score_rows, but the scores found in the feature store or in the precomputed document \
+            scores are looked up for all the documents first, and only the missing ones go through the \
+            batched scoring. The computed scores of cacheable scorers are stored, defaults are not """
+        query_hash = FeatureStore.query_key(query)
+        known = list()
+        for doc in docs:
+            precomputed = dict()
+            if self._document_features is not None:
+                precomputed = self._document_features.get(doc.get('id'))
+            values = dict(precomputed)
+            for (scorers, (key_query, key_doc)) in self._store_keys(query_hash, doc):
+                values.update(self._feature_store.get_many(key_query, key_doc,
+                                                           [s.short_name for s in scorers
+                                                            if s.cacheable and s.short_name not in precomputed]))
+            known.append(values)
 
+        computed = [dict() for doc in docs]
+        rows = self._score_rows(query, docs, deadline, known, computed)
+        stored = set()
+        for (doc, values) in zip(docs, computed):
+            for (scorers, key) in self._store_keys(query_hash, doc):
+                new = {s.short_name: values[s.short_name] for s in scorers if s.cacheable and s.short_name in values}
+                # The query scores are the same for every document, they are stored once
+                if new and key not in stored:
+                    stored.add(key)
+                    self._feature_store.put_many(key[0], key[1], new)
+        return rows
+
+    def _run(self, tasks, deadline=None, defaulted=None):
+        """
+            Run scoring tasks on the thread pool, the most expensive ones first. Scorers that are not \
+                thread safe never run concurrently with themselves. Scorers whose circuit breaker is \
+                open are not run
+
+            args:
+                tasks (list): (key, scorer, method, args) tuples, where method is score or score_batch
+                deadline (Deadline): Optional deadline of the request. The tasks that have not finished \
+                    by then time out, and none is started once it has passed
+                defaulted (set): Optional set that receives the keys of the tasks whose result is the default
+            raise:
+                ScorerRuntimeException : If a scorer fails along the way, and degrade is False
+                ScorerTimeoutException : If the scorers time out, and degrade is False. Every round of \
+                    max_workers tasks gets the timeout of a single scorer
+            return:
+                results (dict): Mapping from the key of each task to its result. The result of a task \
+                    that failed, timed out or was short-circuited is the default of its scorer \
+                    (one per document for score_batch)
+        """
+        submitted, results = list(), dict()
+        failed = defaulted if defaulted is not None else set()
+        expired = deadline is not None and deadline.expired()
+        for (key, scorer, method, args) in sorted(tasks, key=lambda task: -registry.cost_rank(task[1])):
+            if expired or self._breakers[scorer.short_name].state == OPEN:
+                results[key] = self._default_result(scorer, method, args)
+                failed.add(key)
+            else:
+                submitted.append((key, scorer, method, args,
+                                  self._thread_executor.submit(self._call, scorer, method, *args)))
+        end = time.time() + self._timeout * math.ceil(len(submitted) / float(self._max_workers))
+        if deadline is not None:
+            end = min(end, deadline.expires_at)
+        try:
+            for (key, scorer, method, args, f) in submitted:
+                try:
+                    result = f.result(timeout=max(0.0, end - time.time()))
+                    if result is SHORT_CIRCUITED:
+                        result = self._default_result(scorer, method, args)
+                        failed.add(key)
+                except futures.TimeoutError:
+                    f.cancel()
+                    e = ScorerTimeoutException('Scorer %s timed out' % scorer.short_name)
+                    result = self._default_result(scorer, method, args, self._failed(scorer, e))
+                    failed.add(key)
+                except Exception as e:
+                    result = self._default_result(scorer, method, args, self._failed(scorer, e))
+                    failed.add(key)
+                results[key] = result
+        except Exception:
+            for (key, scorer, method, args, f) in submitted:
+                f.cancel()
+            raise
+        return results
+
+    def _default_result(self, scorer, method, args, value=None):
+        " Result of a task when its scorer does not produce one. One value per document for score_batch "
+        value = self.default(scorer) if value is None else value
+        if method == scorer.score_batch:
+            return [value] * len(args[-1])
+        return value
+
+    def _stored_scores(self, query, doc, precomputed, deadline=None):
+        """ Same as scores, but only computes the scores that are missing from the feature store \
+            and from the precomputed document scores. Default values are not stored """
+        query_hash = FeatureStore.query_key(query)
+        doc_id = doc.get('id')
+        doc_id = '' if doc_id is None else str(doc_id)
+        groups = [(self._document_scorers, '', doc_id, (doc,)),
+                  (self._query_scorers, query_hash, '', (query,)),
+                  (self._query_document_scorers, query_hash, doc_id, (query, doc))]
+        vect = list()
+        for (scorers, key_query, key_doc, args) in groups:
+            # Documents without an id cannot be keyed
+            use_store = key_doc != '' or scorers is self._query_scorers
+            stored = dict()
+            if use_store:
+                stored = self._feature_store.get_many(key_query, key_doc, [s.short_name for s in scorers
+                                                                           if s.cacheable and
+                                                                           s.short_name not in precomputed])
+            if scorers is self._document_scorers:
+                stored.update(precomputed)
+            computed = dict()
+            for scorer in scorers:
+                if scorer.short_name in stored:
+                    vect.append(stored[scorer.short_name])
+                else:
+                    score, computed_score = self._score(scorer, args, deadline)
+                    if scorer.cacheable and computed_score:
+                        computed[scorer.short_name] = score
+                    vect.append(score)
+            if use_store:
+                self._feature_store.put_many(key_query, key_doc, computed)
         return np.array(vect)
 # endclass Scorers
@@ -0,0 +1,127 @@
+# Copyright 2016 IBM All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import json
+import hashlib
+import sqlite3
+from threading import Lock
+from retrieve_and_rank_scorer.cache import LRUCache
+from retrieve_and_rank_scorer.nlp import get_nlp
+
+# Shared caches, by path. See get_sentence_cache
+_CACHES = dict()
+_CACHES_LOCK = Lock()
+
+
+class SentenceCache(object):
+    """
+        Sentences of the documents, as segmented by the dependency parser
+
+        Entries are keyed by document id and hash of the text, so that an edited document is segmented \
+            again. The most recent documents are kept in memory. If a path is provided, the sentence \
+            boundaries are also written to a SQLite database, so that they survive restarts
+    """
+
+    def __init__(self, max_size=10000, path=None):
+        """
+            args:
+                max_size (int): Number of documents kept in memory
+                path (str): Optional path to a SQLite database. Created if it does not exist
+        """
+        self.memory_ = LRUCache(max_size)
+        self.path_ = path
+        self.conn_ = None
+        self.lock_ = Lock()
+        if path is not None:
+            self.conn_ = sqlite3.connect(path, check_same_thread=False)
+            with self.lock_:
+                self.conn_.execute('PRAGMA journal_mode=WAL')
+                self.conn_.execute('PRAGMA synchronous=OFF')
+                self.conn_.execute('CREATE TABLE IF NOT EXISTS sentences (doc_key TEXT PRIMARY KEY, '
+                                   'boundaries TEXT)')
+                self.conn_.commit()
+
+    @staticmethod
+    def document_key(document):
+        " Key of a document: its id and the hash of its text "
+        text = unicode(document['text'])
+        return '%s:%s' % (document.get('id', ''), hashlib.md5(text.encode('utf-8')).hexdigest())
+
+    @staticmethod
+    def segment(text):
+        """
+            Parse a text and return the boundaries of its sentences
+
+            return:
+                boundaries (list): (start, end) character offsets of each sentence
+        """
+        return [(sent[0].idx, sent[-1].idx + len(sent[-1])) for sent in get_nlp()(text).sents]
+
+    def sentences(self, document):
+        """
+            Sentences of the text of a document. The parser only runs on a cache miss
+
+            args:
+                document (dict): Solr document with a 'text' field
+            return:
+                sentences (list): (start, end, lowercase sentence) of each sentence
+        """
+        key = self.document_key(document)
+        sentences = self.memory_.get(key)
+        if sentences is None:
+            text = unicode(document['text'])
+            boundaries = self._load(key)
+            if boundaries is None:
+                boundaries = self.segment(text)
+                self._save(key, boundaries)
+            sentences = [(start, end, text[start:end].lower()) for (start, end) in boundaries]
+            self.memory_.put(key, sentences)
+        return sentences
+
+    def _load(self, key):
+        if self.conn_ is None:
+            return None
+        with self.lock_:
+            row = self.conn_.execute('SELECT boundaries FROM sentences WHERE doc_key=?', (key,)).fetchone()
+        return None if row is None else [tuple(b) for b in json.loads(row[0])]
+
+    def _save(self, key, boundaries):
+        if self.conn_ is None:
+            return
+        with self.lock_:
+            self.conn_.execute('INSERT OR REPLACE INTO sentences (doc_key, boundaries) VALUES (?, ?)',
+                               (key, json.dumps(boundaries)))
+            self.conn_.commit()
+
+    def close(self):
+        if self.conn_ is not None:
+            with self.lock_:
+                self.conn_.close()
+# endclass SentenceCache
+
+
+def get_sentence_cache(path=None):
+    """
+        Sentence cache shared by all the scorers that use the same path, so that a document is \
+            segmented once for all the sentence-level scorers
+
+        args:
+            path (str): Optional path to the SQLite database of the cache. None for an in-memory cache
+        return:
+            cache (SentenceCache)
+    """
+    with _CACHES_LOCK:
+        if path not in _CACHES:
+            _CACHES[path] = SentenceCache(path=path)
+        return _CACHES[path]
@@ -0,0 +1,60 @@
+# Copyright 2016 IBM All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import shutil
+import tempfile
+import unittest
+from retrieve_and_rank_scorer.cache import LRUCache
+from retrieve_and_rank_scorer.sentence_cache import SentenceCache
+from retrieve_and_rank_scorer.query_document.query_definition_scorer import WhatIsScorer
+
+
+class TestLRUCache(unittest.TestCase):
+
+    def test_evicts_least_recently_used(self):
+        cache = LRUCache(max_size=2)
+        cache.put('a', 1)
+        cache.put('b', 2)
+        self.assertEqual(cache.get('a'), 1)
+        cache.put('c', 3)
+        self.assertNotIn('b', cache)
+        self.assertEqual([cache.get('a'), cache.get('c')], [1, 3])
+        self.assertEqual(cache.get_or_compute('d', lambda key: key * 2), 'dd')
+        self.assertEqual(len(cache), 2)
+
+    def test_what_is_matcher_escapes_query(self):
+        scorer = WhatIsScorer()
+        matcher = scorer.analyze('What is C++')
+        self.assertTrue(matcher.match('c++ is a programming language'))
+        self.assertFalse(matcher.match('ccc is a programming language'))
+        self.assertIsNone(scorer.analyze('how do I apply for a visa'))
+    def test_sentence_cache_reads_boundaries_from_disk(self):
+        directory = tempfile.mkdtemp()
+        try:
+            path = os.path.join(directory, 'sentences.db')
+            document = {'id': 7, 'text': u'Python is a language. It is Dynamic.'}
+            cache = SentenceCache(path=path)
+            cache._save(SentenceCache.document_key(document), [(0, 21), (22, 37)])
+            cache.close()
+            # A new cache finds the boundaries on disk and does not need the parser
+            cache = SentenceCache(path=path)
+            self.assertEqual(cache.sentences(document), [(0, 21, u'python is a language.'),
+                                                         (22, 37, u'it is dynamic.')])
+            cache.close()
+        finally:
+            shutil.rmtree(directory)
+
+if __name__ == '__main__':
+    unittest.main()
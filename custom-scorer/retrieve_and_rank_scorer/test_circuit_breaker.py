@@ -0,0 +1,74 @@
+# Copyright 2016 IBM All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import json
+import shutil
+import tempfile
+import unittest
+from retrieve_and_rank_scorer.circuit_breaker import CircuitBreaker, CLOSED, OPEN, HALF_OPEN, TRIAL
+from retrieve_and_rank_scorer.scorers import Scorers
+
+
+class TestCircuitBreaker(unittest.TestCase):
+
+    def test_opens_and_recovers(self):
+        breaker = CircuitBreaker(failure_threshold=2, reset_timeout=0.0, slow_call_threshold=1.0)
+        self.assertTrue(breaker.allow())
+        breaker.record(0.1, False)
+        self.assertTrue(breaker.allow())
+        breaker.record(2.0, True) # slow
+        self.assertEqual(breaker.metrics()['opened'], 1)
+        # reset_timeout=0, so the breaker is half open right away and lets a single trial through
+        self.assertEqual(breaker.state, HALF_OPEN)
+        self.assertEqual(breaker.allow(), TRIAL)
+        self.assertFalse(breaker.allow())
+        breaker.record(0.1, True, trial=True)
+        self.assertEqual(breaker.state, CLOSED)
+        self.assertEqual(breaker.metrics()['short_circuits'], 1)
+
+    def test_only_the_trial_call_frees_the_trial(self):
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.0)
+        self.assertTrue(breaker.allow())
+        self.assertTrue(breaker.allow())
+        breaker.record(0.1, False)
+        self.assertEqual(breaker.allow(), TRIAL)
+        # The second call was let through before the breaker opened
+        breaker.record(0.1, True)
+        self.assertEqual(breaker.state, HALF_OPEN)
+        self.assertFalse(breaker.allow())
+        breaker.record(0.1, False, trial=True)
+        self.assertEqual(breaker.metrics()['opened'], 2)
+
+    def test_scorers_use_default_of_failing_scorer(self):
+        directory = tempfile.mkdtemp()
+        try:
+            path = os.path.join(directory, 'features.json')
+            scorers = [{'init_args': {'name': 'UpVoteScorer', 'short_name': 'uv', 'description': ''},
+                        'type': 'document', 'module': 'document_upvote_scorer', 'class': 'UpVoteScorer',
+                        'default': -1.0, 'circuit_breaker': {'failure_threshold': 1, 'reset_timeout': 60}}]
+            with open(path, 'wt') as outfile:
+                json.dump({'scorers': scorers}, outfile)
+            scorers = Scorers(path)
+            self.assertEqual(scorers.scores_matrix({'q': 'visa'}, [{'upModVotes': 20}]).tolist(), [[1.0]])
+            # The document has no upModVotes, so the scorer raises and the breaker opens
+            self.assertEqual(scorers.scores_matrix({'q': 'visa'}, [{}]).tolist(), [[-1.0]])
+            self.assertEqual(scorers.breaker_metrics()['uv']['state'], OPEN)
+            self.assertEqual(scorers.scores_matrix({'q': 'visa'}, [{'upModVotes': 20}]).tolist(), [[-1.0]])
+            scorers.close()
+        finally:
+            shutil.rmtree(directory)
+
+if __name__ == '__main__':
+    unittest.main()
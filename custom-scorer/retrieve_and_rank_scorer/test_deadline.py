@@ -0,0 +1,54 @@
+# Copyright 2016 IBM All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import json
+import time
+import shutil
+import tempfile
+import unittest
+from retrieve_and_rank_scorer.deadline import Deadline, DeadlineExceeded
+from retrieve_and_rank_scorer.scorers import Scorers
+
+
+class TestDeadline(unittest.TestCase):
+
+    def test_timeout_is_capped_by_remaining_budget(self):
+        deadline = Deadline(5.0)
+        self.assertEqual(deadline.timeout(1.0), 1.0)
+        self.assertLessEqual(deadline.timeout(10.0), 5.0)
+        deadline = Deadline(0.01)
+        time.sleep(0.02)
+        self.assertTrue(deadline.expired())
+        self.assertRaises(DeadlineExceeded, deadline.timeout, 1.0)
+
+    def test_scorers_default_after_deadline(self):
+        directory = tempfile.mkdtemp()
+        try:
+            path = os.path.join(directory, 'features.json')
+            scorers = [{'init_args': {'name': 'UpVoteScorer', 'short_name': 'uv', 'description': ''},
+                        'type': 'document', 'module': 'document_upvote_scorer', 'class': 'UpVoteScorer'}]
+            with open(path, 'wt') as outfile:
+                json.dump({'scorers': scorers}, outfile)
+            scorers = Scorers(path, default_value=-1.0)
+            docs = [{'upModVotes': 20}, {'upModVotes': 0}]
+            self.assertEqual(scorers.scores_matrix({'q': 'visa'}, docs, Deadline(0.0)).tolist(), [[-1.0], [-1.0]])
+            self.assertEqual(scorers.breaker_metrics()['uv']['calls'], 0)
+            self.assertEqual(scorers.scores_matrix({'q': 'visa'}, docs, Deadline(5.0)).tolist(), [[1.0], [0.0]])
+            scorers.close()
+        finally:
+            shutil.rmtree(directory)
+
+if __name__ == '__main__':
+    unittest.main()
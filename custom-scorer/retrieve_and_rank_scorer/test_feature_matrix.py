@@ -0,0 +1,54 @@
+#!/usr/bin/env python
+# Copyright 2016 IBM All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the 'License');
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an 'AS IS' BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import unittest
+import numpy as np
+from retrieve_and_rank_scorer.feature_matrix import FeatureMatrix, encode_frame, decode_frames
+
+
+class TestFeatureMatrix(unittest.TestCase):
+
+    def test_parse_append_and_format(self):
+        fm = FeatureMatrix.from_feature_vectors(['1.5 0 2', '0.25 3 -1'])
+        self.assertEqual(fm.shape, (2, 3))
+        fm = fm.append(np.array([[0.5], [1.0]]))
+        self.assertEqual(fm.format_rows(delimiter=',', fmt='%.2f'), ['1.50,0.00,2.00,0.50', '0.25,3.00,-1.00,1.00'])
+
+    def test_format_keeps_small_values(self):
+        fm = FeatureMatrix.from_feature_vectors(['0.00000012 123456.7 0'])
+        rows = fm.format_rows()
+        self.assertEqual(rows, ['1.19999996e-07 123456.703 0'])
+        np.testing.assert_array_equal(FeatureMatrix.from_feature_vectors(rows).values, fm.values)
+
+    def test_ragged_feature_vectors(self):
+        self.assertRaises(ValueError, FeatureMatrix.from_feature_vectors, ['1 2', '1 2 3'])
+
+    def test_empty_response(self):
+        fm = FeatureMatrix.from_feature_vectors([]).append(np.zeros((0, 2)))
+        self.assertEqual(fm.shape, (0, 2))
+        self.assertEqual(fm.format_rows(), [])
+
+    def test_frames_round_trip(self):
+        fm = FeatureMatrix.from_feature_vectors(['1.5 0', '0.25 3'])
+        frame = encode_frame(['f0', 'f1'], ['q1', 'q1'], [2, 0], fm)
+        frames = list(decode_frames(frame + frame))
+        self.assertEqual(len(frames), 2)
+        headers, qids, relevance, decoded = frames[1]
+        self.assertEqual((headers, qids, relevance), (['f0', 'f1'], ['q1', 'q1'], [2, 0]))
+        np.testing.assert_array_equal(decoded.values, fm.values)
+        self.assertRaises(ValueError, list, decode_frames(frame[:-1]))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,49 @@
+#!/usr/bin/env python
+# Copyright 2016 IBM All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the 'License');
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an 'AS IS' BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import shutil
+import tempfile
+import unittest
+from retrieve_and_rank_scorer.feature_store import FeatureStore
+
+
+class TestFeatureStore(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'features.db')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_put_and_get(self):
+        store = FeatureStore(self.path, {'a': '1', 'b': '1'})
+        query_hash = FeatureStore.query_key({'q': 'what is a visa'})
+        store.put_many(query_hash, '10', {'a': 0.5, 'b': None})
+        self.assertEqual(store.get_many(query_hash, '10', ['a', 'b']), {'a': 0.5})
+        self.assertEqual(store.get_many(query_hash, '11', ['a', 'b']), {})
+
+    def test_version_change_invalidates_only_that_scorer(self):
+        store = FeatureStore(self.path, {'a': '1', 'b': '1'})
+        store.put_many('', '10', {'a': 1.0, 'b': 2.0})
+        store.close()
+        store = FeatureStore(self.path, {'a': '2', 'b': '1'})
+        self.assertEqual(store.get_many('', '10', ['a', 'b']), {'b': 2.0})
+        self.assertEqual(store.purge_stale(), 1)
+        self.assertEqual(store.get_many('', '10', ['a', 'b']), {'b': 2.0})
+
+if __name__ == '__main__':
+    unittest.main()
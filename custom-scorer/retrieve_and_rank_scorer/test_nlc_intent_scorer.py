@@ -0,0 +1,80 @@
+# Copyright 2016 IBM All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import time
+import unittest
+from threading import Lock
+from retrieve_and_rank_scorer.query_document.nlc_intent_scorer import NLCIntentScorer, MultiNLCIntentScorer, \
+    check_classifiers, start_health_checks
+from retrieve_and_rank_scorer.scorer_exception import ScorerRuntimeException
+
+
+class CountingNLCIntentScorer(NLCIntentScorer):
+    " Classifier that answers with a fixed class instead of calling the service "
+
+    def __init__(self, class_name, delay=0.0):
+        self.class_name = class_name
+        self.delay = delay
+        self.num_calls = 0
+        self.num_checks = 0
+        self.lock = Lock()
+        super(CountingNLCIntentScorer, self).__init__('name', 'short_name', 'description', 'url', 'user', 'pw', 'id')
+
+    def validate_nlc(self, url, username, password, classifier_id):
+        self.set_credentials(url, username, password, classifier_id)
+        self.num_checks += 1
+        time.sleep(self.delay)
+
+    def classify(self, text):
+        with self.lock:
+            self.num_calls += 1
+        return {'classes': [{'class_name': self.class_name, 'confidence': 0.75}]}
+
+
+class TestMultiNLCIntentScorer(unittest.TestCase):
+
+    def test_classifies_once_per_classifier(self):
+        scorer = MultiNLCIntentScorer('name', 'mnlc', 'description', field_name='product')
+        car, bike = CountingNLCIntentScorer('1'), CountingNLCIntentScorer('2')
+        scorer.field_to_nlc = {'car': car, 'truck': car, 'bike': bike}
+        documents = [{'id': '1', 'product': 'car'}, {'id': '2', 'product': ['bike']},
+                     {'id': '1', 'product': 'truck'}, {'id': '1', 'product': 'boat'}, {'id': '1'}]
+        self.assertEqual(scorer.score_batch({'q': 'how fast'}, documents), [0.75, 0.75, 0.75, 0.0, 0.0])
+        self.assertEqual((car.num_calls, bike.num_calls), (1, 1))
+
+    def test_slow_classifiers_are_degraded(self):
+        scorer = MultiNLCIntentScorer('name', 'mnlc', 'description', field_name='product')
+        car, bike = CountingNLCIntentScorer('1'), CountingNLCIntentScorer('2', delay=0.5)
+        scorer.field_to_nlc = {'car': car, 'bike': bike}
+        self.assertEqual(check_classifiers([car, bike], timeout=0.1), [bike])
+        self.assertTrue(scorer.degraded)
+        documents = [{'id': '1', 'product': 'car'}, {'id': '2', 'product': 'bike'}]
+        self.assertEqual(scorer.score_batch({'q': 'how fast'}, documents[:1]), [0.75])
+        self.assertRaises(ScorerRuntimeException, scorer.score_batch, {'q': 'how fast'}, documents)
+        self.assertRaises(ScorerRuntimeException, bike.score, {'q': 'how fast'}, documents[1])
+        self.assertEqual(bike.num_calls, 0)
+
+    def test_health_checks_stop(self):
+        nlc = CountingNLCIntentScorer('1')
+        stop = start_health_checks([nlc], interval=0.01)
+        time.sleep(0.05)
+        stop.set()
+        time.sleep(0.05)
+        checks = nlc.num_checks
+        self.assertGreater(checks, 1)
+        time.sleep(0.05)
+        self.assertEqual(nlc.num_checks, checks)
+
+if __name__ == '__main__':
+    unittest.main()
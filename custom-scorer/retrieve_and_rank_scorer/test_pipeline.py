@@ -0,0 +1,74 @@
+#!/usr/bin/env python
+# Copyright 2016 IBM All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the 'License');
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an 'AS IS' BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import shutil
+import tempfile
+import unittest
+import json
+from retrieve_and_rank_scorer.pipeline import ScorerPipeline
+
+
+class TestScorerPipeline(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'features.json')
+        self.upvote = {'init_args': {'name': 'UpVoteScorer', 'short_name': 'uv', 'description': ''},
+                       'type': 'document', 'module': 'document_upvote_scorer', 'class': 'UpVoteScorer'}
+        self.popularity = {'init_args': {'name': 'PopularityScorer', 'short_name': 'pop', 'description': ''},
+                           'type': 'document', 'module': 'document_rating_scorer', 'class': 'PopularityScorer'}
+        self.write([self.upvote])
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def write(self, scorers):
+        with open(self.path, 'wt') as outfile:
+            json.dump({'scorers': scorers}, outfile)
+
+    def test_reload_reuses_unchanged_scorers(self):
+        pipeline = ScorerPipeline(self.path)
+        with pipeline.acquire() as old:
+            self.write([self.upvote, self.popularity])
+            self.assertEqual(pipeline.reload(), 2)
+            # In-flight requests keep the version they started with
+            self.assertEqual(old.get_headers(), ['uv'])
+        new = pipeline.current()
+        self.assertEqual(new.get_headers(), ['uv', 'pop'])
+        self.assertIn(old.scorers_by_version().values()[0], new.scorers_by_version().values())
+
+    def test_reload_closes_only_dropped_scorers(self):
+        pipeline = ScorerPipeline(self.path)
+        closed = list()
+        upvote = pipeline.current().scorers_by_version().values()[0]
+        upvote.close = lambda: closed.append(upvote)
+        self.write([self.upvote, self.popularity])
+        pipeline.reload()
+        self.assertEqual(closed, [])
+        self.write([self.popularity])
+        pipeline.reload()
+        self.assertEqual(closed, [upvote])
+
+    def test_failed_reload_keeps_current_version(self):
+        pipeline = ScorerPipeline(self.path)
+        with open(self.path, 'wt') as outfile:
+            outfile.write('{')
+        self.assertRaises(ValueError, pipeline.reload)
+        self.assertEqual(pipeline.version, 1)
+        self.assertEqual(pipeline.current().get_headers(), ['uv'])
+
+if __name__ == '__main__':
+    unittest.main()
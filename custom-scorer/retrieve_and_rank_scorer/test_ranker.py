@@ -0,0 +1,62 @@
+#!/usr/bin/env python
+# Copyright 2016 IBM All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the 'License');
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an 'AS IS' BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import shutil
+import tempfile
+import unittest
+import numpy as np
+from retrieve_and_rank_scorer.ranker import RankerInput, LinearRanker
+
+
+class TestRanker(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'training.csv')
+        with open(self.path, 'wt') as outfile:
+            outfile.write('question_id,f0,f1,ground_truth\n')
+            outfile.write('1,0.9,0.1,3\n1,0.2,0.5,0\n2,0.8,0.3,2\n2,0.1,0.4,0\n')
+            outfile.write('question_id,f0,f1,ground_truth\n')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_read_csv(self):
+        ranker_input = RankerInput.read_csv(self.path)
+        self.assertEqual(ranker_input.headers, ['f0', 'f1'])
+        self.assertEqual(ranker_input.features.shape, (4, 2))
+        self.assertEqual([qid for (qid, rows) in ranker_input.groups()], ['1', '2'])
+
+    def test_write_csv_keeps_small_values(self):
+        ranker_input = RankerInput.read_csv(self.path)
+        ranker_input.features[0, 0] = 1.2e-7
+        path = os.path.join(self.directory, 'written.csv')
+        ranker_input.write_csv(path)
+        np.testing.assert_array_equal(RankerInput.read_csv(path).features, ranker_input.features)
+
+    def test_fit_save_and_load(self):
+        ranker_input = RankerInput.read_csv(self.path)
+        ranker = LinearRanker(l2=0.1).fit(ranker_input)
+        scores = ranker.score(ranker_input.features)
+        self.assertTrue(scores[0] > scores[1] and scores[2] > scores[3])
+        model_path = os.path.join(self.directory, 'model.npz')
+        ranker.save(model_path)
+        loaded = LinearRanker.load(model_path)
+        self.assertEqual(loaded.headers, ['f0', 'f1'])
+        np.testing.assert_allclose(loaded.score(ranker_input.features), scores)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,56 @@
+#!/usr/bin/env python
+# Copyright 2016 IBM All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the 'License');
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an 'AS IS' BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import shutil
+import tempfile
+import unittest
+import json
+import numpy as np
+from retrieve_and_rank_scorer.registry import ScorerRegistry
+from retrieve_and_rank_scorer.scorers import Scorers
+from retrieve_and_rank_scorer.document.document_upvote_scorer import UpVoteScorer
+
+
+class TestRegistry(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'features.json')
+        scorers = [{'init_args': {'name': 'UpVoteScorer', 'short_name': 'uv', 'description': ''},
+                    'type': 'document', 'module': 'document_upvote_scorer', 'class': 'UpVoteScorer'},
+                   {'init_args': {'name': 'PopularityScorer', 'short_name': 'pop', 'description': ''},
+                    'type': 'document', 'module': 'document_rating_scorer', 'class': 'PopularityScorer'}]
+        with open(self.path, 'wt') as outfile:
+            json.dump({'scorers': scorers}, outfile)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_resolve_validates_type(self):
+        registry = ScorerRegistry()
+        self.assertIs(registry.resolve('document', 'document_upvote_scorer', 'UpVoteScorer'), UpVoteScorer)
+        self.assertRaises(ValueError, registry.resolve, 'passage', 'document_upvote_scorer', 'UpVoteScorer')
+        self.assertRaises(ValueError, registry.register, 'query', 'm', 'UpVoteScorer', UpVoteScorer)
+
+    def test_scores_matrix(self):
+        scorers = Scorers(self.path)
+        self.assertEqual(sorted(scorers.get_required_fields()), ['accepted', 'upModVotes', 'views'])
+        docs = [{'upModVotes': 20, 'views': 6000, 'accepted': 1}, {'upModVotes': 0, 'views': -1, 'accepted': 0}]
+        np.testing.assert_allclose(scorers.scores_matrix({'q': 'visa'}, docs), [[1.0, 1.0], [0.0, 0.0]])
+        np.testing.assert_allclose(scorers.scores({'q': 'visa'}, docs[0]), [1.0, 1.0])
+
+if __name__ == '__main__':
+    unittest.main()
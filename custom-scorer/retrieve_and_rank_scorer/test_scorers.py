@@ -13,7 +13,13 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import os
+import json
+import shutil
+import tempfile
 import unittest
+import numpy as np
+from retrieve_and_rank_scorer.scorers import Scorers
 from retrieve_and_rank_scorer.document.document_size_scorer import TotalDocumentWordsScorer
 from retrieve_and_rank_scorer.document.document_upvote_scorer import UpVoteScorer
 from retrieve_and_rank_scorer.document.document_rating_scorer import PopularityScorer
@@ -58,5 +64,44 @@ class TestStringMethods(unittest.TestCase):
         unpopular_doc['accepted'] = 1
         self.assertGreater(scorer.score(popular_doc), scorer.score(unpopular_doc))
 
+
+class TestScorersFeatureStore(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'features.json')
+        with open(self.path, 'wt') as outfile:
+            json.dump({'scorers': [
+                {'init_args': {'name': 'UpVoteScorer', 'short_name': 'uv', 'description': ''},
+                 'type': 'document', 'module': 'document_upvote_scorer', 'class': 'UpVoteScorer'},
+                {'init_args': {'name': 'PopularityScorer', 'short_name': 'pop', 'description': ''},
+                 'type': 'document', 'module': 'document_rating_scorer', 'class': 'PopularityScorer'}]}, outfile)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_scores_matrix_only_batches_missing_scores(self):
+        scorers = Scorers(self.path, feature_store_path=os.path.join(self.directory, 'features.db'),
+                          default_value=-1.0)
+        scorers._feature_store.put_many('', '1', {'uv': 0.99})
+        upvote, batches = scorers._document_scorers[0], list()
+        upvote.batchable = True
+
+        def score_batch(docs):
+            batches.append([doc['id'] for doc in docs])
+            return [upvote.score(doc) for doc in docs]
+        upvote.score_batch = score_batch
+        docs = [{'id': '1', 'upModVotes': 4, 'views': 10, 'accepted': 1},
+                {'id': '2', 'upModVotes': 20, 'views': 10, 'accepted': 1},
+                {'id': '3', 'upModVotes': 10}]
+        mat = scorers.scores_matrix({'q': 'what is a visa'}, docs)
+        np.testing.assert_allclose(mat, [[0.99, 0.5], [1.0, 0.5], [0.75, -1.0]])
+        self.assertEqual(batches, [['2', '3']])
+        # Computed scores are stored, the default of the scorer that failed is not
+        self.assertEqual(scorers._feature_store.get_many('', '3', ['uv', 'pop']), {'uv': 0.75})
+        np.testing.assert_allclose(scorers.scores_matrix({'q': 'what is a visa'}, docs[:2]), mat[:2])
+        self.assertEqual(batches, [['2', '3']])
+        scorers.close()
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,40 @@
+# Copyright 2016 IBM All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import unittest
+from retrieve_and_rank_scorer.utils import strip_special, normalize_query, scorer_version
+
+
+class TestUtils(unittest.TestCase):
+
+    def test_strip_special(self):
+        self.assertEqual(strip_special('<p>Prior art (US) vs. EU</p>'), 'Prior art US vs. EU ')
+        self.assertEqual(strip_special('a\n"b"  c'), 'a b c')
+
+    def test_normalize_query(self):
+        self.assertEqual(normalize_query('  What is a Patent?? '), 'what is a patent')
+        self.assertEqual(normalize_query('what is a patent'), normalize_query('What is, a patent!'))
+        self.assertEqual(normalize_query(None), '')
+        self.assertNotEqual(normalize_query('C++ templates'), normalize_query('C# templates'))
+        self.assertEqual(normalize_query('Node.js  AND c++?'), 'node.js AND c++')
+        self.assertEqual(normalize_query(normalize_query('What is, a patent!')), 'what is a patent')
+
+    def test_scorer_version(self):
+        info = {'init_args': {'short_name': 'uv'}, 'type': 'document', 'module': 'm', 'class': 'C'}
+        tuned = dict(info, default=0.5, circuit_breaker={'failure_threshold': 3})
+        self.assertEqual(scorer_version(info), scorer_version(tuned))
+        self.assertNotEqual(scorer_version(info), scorer_version(dict(info, version=2)))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -14,13 +14,12 @@
 
 import json
 import os
-import importlib
+import re
+import hashlib
 from collections import defaultdict
-from retrieve_and_rank_scorer.document import document_scorer
-from retrieve_and_rank_scorer.query import query_scorer
-from retrieve_and_rank_scorer.query_document import query_document_scorer
+from retrieve_and_rank_scorer import registry
 
-def load_from_file(features_json_path):
+def load_from_file(features_json_path, scorer_types=None, reuse=None):
     """
         Load classes from a configuration file. Configuration files must be of the following format:
         {
@@ -34,18 +33,30 @@ def load_from_file(features_json_path):
               },
               "type":"document",
               "module":"document_size_scorer",
-              "class":"TotalDocumentWordsScorer"
+              "class":"TotalDocumentWordsScorer",
+              "default":0.0,
+              "circuit_breaker":{"failure_threshold":5, "reset_timeout":30}
             }
           ]
         }
+        "default" (the value used when the scorer fails or is short-circuited) and "circuit_breaker" \
+            (arguments of retrieve_and_rank_scorer.circuit_breaker.CircuitBreaker) are optional
 
         Args:
             features_json_path (str): Path to a configuration file
+            scorer_types (list): If provided, only scorers of these types are loaded
+            reuse (dict): Optional mapping from configuration version to an existing scorer. Scorers \
+                whose configuration did not change are reused instead of being created again
 
         Raise:
             If scorer fails to load
             If more than one scorer has the same short name
             If scorer of a certain type does not subclass the proper module
+
+        Return:
+            scorer_dict (dict): Scorers by type ("document", "query" and "query_document"), plus \
+                "versions", which maps the short name of each scorer to its configuration version, and \
+                "defaults" and "circuit_breakers", which map it to its optional settings
     """
     if not isinstance(features_json_path, str):
         raise ValueError('Path %r is not a string' % features_json_path)
@@ -57,42 +68,68 @@ def load_from_file(features_json_path):
         features_json_obj = json.load(open(features_json_path))
         scorer_dict = defaultdict(list)
         short_names = defaultdict()
+        scorer_dict['versions'] = dict()
+        scorer_dict['defaults'] = dict()
+        scorer_dict['circuit_breakers'] = dict()
         for scorer_info in features_json_obj['scorers']:
-            # Create an instance of the scorer
-            doc_type, module_name, class_name = scorer_info['type'], scorer_info['module'], scorer_info['class']
-            init_args = scorer_info['init_args']
-            full_module_name = "retrieve_and_rank_scorer.%s.%s" % (doc_type, module_name)
-            obj = instantiate(full_module_name, class_name, init_args)
+            if scorer_types is not None and scorer_info['type'] not in scorer_types:
+                continue
+
+            # Create an instance of the scorer. Raises if it does not subclass the base class of its type
+            doc_type, version = scorer_info['type'], scorer_version(scorer_info)
+            obj = reuse.get(version) if reuse else None
+            if obj is None:
+                obj = registry.default_registry.create(scorer_info)
 
             # Raise if multiple short names
             if obj.short_name in short_names:
                 raise ValueError('Scorers with name=%s and name=%s have the same short_name=%s' %
                                  (obj.name, short_names[obj.short_name], obj.short_name))
             short_names[obj.short_name] = obj.name
-
-            # Validate scorer is properly subclassed
-            if doc_type == 'document':
-                if isinstance(obj, document_scorer.DocumentScorer):
-                    scorer_dict['document'].append(obj)
-                else:
-                    raise ValueError('Scorer=%r of type %s is not properly subclassed' % (obj, doc_type))
-            elif doc_type == 'query':
-                if isinstance(obj, query_scorer.QueryScorer):
-                    scorer_dict['query'].append(obj)
-                else:
-                    raise ValueError('Scorer=%r of type %s is not properly subclassed' % (obj, doc_type))
-            elif doc_type == 'query_document':
-                if isinstance(obj, query_document_scorer.QueryDocumentScorer):
-                    scorer_dict['query_document'].append(obj)
-                else:
-                    raise ValueError('Scorer=%r of type %s is not properly subclassed' % (obj, doc_type))
-            else:
-                raise ValueError('Scorer with name=%s is not of type "document", "query" or "query_document"')
+            scorer_dict['versions'][obj.short_name] = version
+            if 'default' in scorer_info:
+                scorer_dict['defaults'][obj.short_name] = scorer_info['default']
+            scorer_dict['circuit_breakers'][obj.short_name] = scorer_info.get('circuit_breaker', {})
+            scorer_dict[doc_type].append(obj)
         return scorer_dict
 
 
-def instantiate(module_name, cls_name, init_args):
-    """ Load in a class. Raise if the loading fails or the object is not of the correct type """
-    module = importlib.import_module(module_name)
-    cls = getattr(module, cls_name)
-    return cls(**init_args)
+# Fields of a scorer configuration that change the values the scorer computes
+VERSION_FIELDS = ['type', 'module', 'class', 'init_args', 'version']
+
+
+def scorer_version(scorer_info):
+    """ Version of a scorer configuration. Changes whenever a field that affects the scores changes, \
+        including an optional "version" field that can be bumped when the scorer code changes. The \
+        default value and the circuit breaker settings are not part of the version """
+    fields = {field: scorer_info.get(field) for field in VERSION_FIELDS}
+    return hashlib.md5(json.dumps(fields, sort_keys=True)).hexdigest()
+
+
+# Markup tags, and the characters that strip_special replaces with a space
+HTML_TAG = re.compile(r'<[A-Za-z\/][^>]*>')
+SPECIAL_CHARACTERS = re.compile(r'[\n"!@#$%^&*()<>/\\\[\]{}|:;,\-+=~_]')
+SPACES = re.compile(' +')
+# Punctuation at the end of a word, which does not change the meaning of a query
+QUERY_PUNCTUATION = re.compile(r'[?!.,;]+(?=\s|$)')
+# Solr operators, which keep their case
+QUERY_OPERATORS = ('AND', 'OR', 'NOT')
+
+
+def strip_special(text):
+    """ Remove the markup and the special characters of a text. Applied by extract_stackexchange_dump.py \
+        to the titles and bodies of the corpus """
+    text = HTML_TAG.sub('', text.replace('/', '\\/'))
+    text = SPECIAL_CHARACTERS.sub(' ', text).replace(' p ', ' ')
+    return SPACES.sub(' ', text)
+
+
+def normalize_query(query):
+    """ Canonical form of a query, used as the key of the response caches. Queries that only differ \
+        by the case of their words, their whitespace and the punctuation at the end of their words have \
+        the same canonical form. Other symbols (e.g. C++ and C#) and the Solr operators are kept, so that \
+        the canonical form can be sent to the service in place of the query """
+    if not query:
+        return ''
+    words = QUERY_PUNCTUATION.sub('', query).split()
+    return ' '.join(word if word in QUERY_OPERATORS else word.lower() for word in words)
@@ -133,26 +133,182 @@ class RetrieveAndRankService(object):
 # endclass RetrieveAndRankService
 
 
+class ExperimentEntries(object):
+    """
+        Lazy, re-iterable view of the entries of a line-delimited experiment file (see
+        bin/python/evaluation_runner.py). Entries are read from disk on each iteration
+    """
+    def __init__(self, experiment_file_path, response_doc_fields=None):
+        """
+            args:
+                experiment_file_path (str): Path to the experiment file
+                response_doc_fields (list): If provided, only these fields are kept in each response doc
+        """
+        self.experiment_file_path = experiment_file_path
+        self.response_doc_fields = response_doc_fields
+        self._length = None
+
+    def __iter__(self):
+        with open(self.experiment_file_path, 'rt') as infile:
+            infile.readline() # metadata header
+            for line in infile:
+                if not line.strip():
+                    continue
+                entry = json.loads(line)
+                if self.response_doc_fields is not None:
+                    entry['response_docs'] = [{f: doc[f] for f in self.response_doc_fields if f in doc}
+                                              for doc in entry['response_docs']]
+                yield entry
+
+    def __len__(self):
+        if self._length is None:
+            self._length = sum(1 for _ in self)
+        return self._length
+# endclass ExperimentEntries
+
+
 class RetrieveAndRankExperiment(object):
-    def __init__(self, experiment_file_path):
+    def __init__(self, experiment_file_path, response_doc_fields=None):
         """ State associated with a single Retrieve & Rank Experiment
 
             args:
-                experiment_file_path (str): Path to the experiment file
+                experiment_file_path (str): Path to the experiment file. Either a single JSON object or a \
+                    line-delimited file with a metadata header, whose entries are read lazily
+                response_doc_fields (list): For line-delimited files, only keep these fields in each \
+                    response doc (for example ['id', 'relevance']) to reduce memory
         """
-        obj = json.load(open(experiment_file_path, 'rt'))
-        self.experiment_entries = obj['experiment_entries']
-        self.base_url = obj['experiment_metadata']['url']
-        self.username = obj['experiment_metadata']['username']
-        self.password = obj['experiment_metadata']['password']
-        self.solr_cluster_id = obj['experiment_metadata']['solr_cluster_id']
-        self.solr_collection = obj['experiment_metadata']['solr_collection']
-        self.ranker_id = obj['experiment_metadata']['ranker_id']
-        self.rr_service = RetrieveAndRankService(self.username, self.password, self.base_url,
-                                                 self.solr_cluster_id, self.solr_collection)
+        with open(experiment_file_path, 'rt') as infile:
+            try:
+                obj = json.loads(infile.readline())
+            except ValueError:
+                obj = json.load(open(experiment_file_path, 'rt')) # indented single JSON object
+        if 'experiment_entries' in obj:
+            self.experiment_entries = obj['experiment_entries']
+        else:
+            self.experiment_entries = ExperimentEntries(experiment_file_path, response_doc_fields=response_doc_fields)
+        # Simulated experiments (bin/python/simulate.py) did not call the service
+        metadata = obj['experiment_metadata']
+        self.base_url = metadata.get('url')
+        self.username = metadata.get('username')
+        self.password = metadata.get('password')
+        self.solr_cluster_id = metadata.get('solr_cluster_id')
+        self.solr_collection = metadata.get('solr_collection')
+        self.ranker_id = metadata.get('ranker_id')
+        self.rr_service = None
+        if self.base_url is not None:
+            self.rr_service = RetrieveAndRankService(self.username, self.password, self.base_url,
+                                                     self.solr_cluster_id, self.solr_collection)
 #endclass RetrieveAndRankExperiment
 
 
+class RelevanceMatrix(object):
+    """
+        Relevance of the response docs of all the entries of an experiment, as a zero-padded
+        (num_entries x depth) matrix. Built once, after which every metric is computed for all
+        entries and all cut-offs n with a few NumPy operations
+    """
+    def __init__(self, experiment_entries, depth=None):
+        """
+            args:
+                experiment_entries (iterable): Experiment entries (see RetrieveAndRankExperiment)
+                depth (int): Number of response docs kept per entry. Defaults to the longest response
+        """
+        responses, judged, queries = [], [], []
+        for entry in experiment_entries:
+            queries.append(entry.get('query'))
+            responses.append([doc['relevance'] for doc in entry['response_docs']])
+            judged.append(list(entry['relevant_docs'].values()))
+        self.queries = queries
+        if depth is None:
+            depth = max([len(r) for r in responses] + [1])
+        self.depth = depth
+        self.relevance = self._pad(responses, depth)
+        self.judged = self._pad(judged, max([len(j) for j in judged] + [1]))
+        self.judged_mask = self._pad([[1] * len(j) for j in judged], self.judged.shape[1]) > 0
+
+    @staticmethod
+    def _pad(rows, width):
+        mat = np.zeros((len(rows), width))
+        for i, row in enumerate(rows):
+            row = row[:width]
+            mat[i, :len(row)] = row
+        return mat
+
+    def __len__(self):
+        return self.relevance.shape[0]
+
+    def _columns(self, n):
+        " Column index of the cut-off(s) n, clipped to the depth of the matrix "
+        return np.clip(np.asarray(n), 1, self.depth) - 1
+
+    @staticmethod
+    def _dcg(mat, n):
+        width = mat.shape[1]
+        cum = np.cumsum(mat / np.log2(np.arange(2, width + 2)), axis=1)
+        return cum[:, np.clip(np.asarray(n), 1, width) - 1]
+
+    def ndcg(self, n=10, method='relative'):
+        """ NDCG@n per entry. Shape (num_entries,) for a scalar n, (num_entries, len(n)) otherwise.
+            See ndcg for the definition of method """
+        dcg_n = self._dcg(self.relevance, n)
+        if method == 'relative':
+            ideal = -np.sort(-self.relevance, axis=1)
+            has_rel = self.relevance.sum(axis=1) != 0
+        else:
+            ideal = -np.sort(-self.judged, axis=1)
+            has_rel = np.ones(len(self), dtype=bool)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            result = dcg_n / self._dcg(ideal, n)
+        has_rel = has_rel if result.ndim == 1 else has_rel[:, np.newaxis]
+        return np.where(has_rel, result, 0.0)
+
+    def number_relevant(self, n=10, min_rel=1):
+        """ Vectorized number_relevant. Returns (relevant docs in the top n,
+            min(n, number of relevant docs)) per entry """
+        hits = np.cumsum(self.relevance >= min_rel, axis=1)[:, self._columns(n)]
+        num_judged = ((self.judged >= min_rel) & self.judged_mask).sum(axis=1)
+        num_judged = num_judged if np.ndim(n) == 0 else num_judged[:, np.newaxis]
+        return hits, np.minimum(np.asarray(n), num_judged)
+
+    def precision(self, n=10, min_rel=1):
+        " Fraction of the top n response docs that are relevant "
+        hits, _ = self.number_relevant(n, min_rel=min_rel)
+        return hits / np.asarray(n, dtype=float)
+
+    def recall(self, n=10, min_rel=1):
+        " Fraction of the relevant docs that are in the top n response docs "
+        hits, _ = self.number_relevant(n, min_rel=min_rel)
+        num_judged = ((self.judged >= min_rel) & self.judged_mask).sum(axis=1).astype(float)
+        num_judged = num_judged if np.ndim(n) == 0 else num_judged[:, np.newaxis]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return np.where(num_judged > 0, hits / num_judged, 0.0)
+
+    def reciprocal_rank(self, min_rel=1):
+        " 1 / rank of the first relevant response doc per entry. 0 if there is none "
+        is_rel = self.relevance >= min_rel
+        first = np.argmax(is_rel, axis=1)
+        return np.where(is_rel.any(axis=1), 1.0 / (first + 1), 0.0)
+
+    def average_precision(self, min_rel=1):
+        " Average precision per entry, over the relevant docs of the entry "
+        is_rel = self.relevance >= min_rel
+        precision_at = np.cumsum(is_rel, axis=1) / np.arange(1, self.depth + 1, dtype=float)
+        num_judged = ((self.judged >= min_rel) & self.judged_mask).sum(axis=1).astype(float)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return np.where(num_judged > 0, (precision_at * is_rel).sum(axis=1) / num_judged, 0.0)
+
+    def summary(self, ns=range(1, 11), min_rel=1):
+        """ Mean NDCG, precision and recall at every n in ns, plus MRR and MAP, as a DataFrame indexed by n """
+        ns = np.asarray(list(ns))
+        return pd.DataFrame({'ndcg_relative': self.ndcg(ns, method='relative').mean(axis=0),
+                             'ndcg_absolute': self.ndcg(ns, method='absolute').mean(axis=0),
+                             'precision': self.precision(ns, min_rel=min_rel).mean(axis=0),
+                             'recall': self.recall(ns, min_rel=min_rel).mean(axis=0),
+                             'mrr': self.reciprocal_rank(min_rel=min_rel).mean(),
+                             'map': self.average_precision(min_rel=min_rel).mean()}, index=ns)
+#endclass RelevanceMatrix
+
+
 """
     --------------------------
     --------------------------
@@ -291,15 +447,20 @@ def ndcg(r, entry, n=10, method='relative'):
         return dcg(r, entry, n=n) / idcg(r, entry, n=n, method=method)
 
 
+def as_relevance_matrix(experiment_entries):
+    " Build a RelevanceMatrix, unless experiment_entries already is one "
+    if isinstance(experiment_entries, RelevanceMatrix):
+        return experiment_entries
+    return RelevanceMatrix(experiment_entries)
+
+
 def experiment_ndcg(experiment, n=10, method='relative'):
-    " Compute the NDCG over all experiment entries "
-    ndcg_arr = [ndcg([doc['relevance'] for doc in entry['response_docs']], entry, n=n, method=method)
-                for entry in experiment]
-    return ndcg_arr
+    " Compute the NDCG over all experiment entries. n can be a single cut-off or an array of cut-offs "
+    return as_relevance_matrix(experiment).ndcg(n, method=method)
 
 
 def experiment_average_ndcg(experiment, n=10, method='relative'):
-    return np.mean(experiment_ndcg(experiment, n=n, method=method))
+    return np.mean(experiment_ndcg(experiment, n=n, method=method), axis=0)
 
 
 def number_relevant(entry, top_n=10, min_rel=1):
@@ -312,20 +473,27 @@ def total_relevance_at_n(experiment_entries, n=10, strategy='average', min_rel=1
         total_rel_at_n_for_query = (# of relevant docs in top n) / min(n, # of relevant_docs)
         If strategy == 'average', then compute the above for all entries and average
         If strategy == 'total', will sum the numerate/denominator over all and return that result
+        experiment_entries can be a RelevanceMatrix and n an array of cut-offs
     """
     if strategy not in ['average', 'total']:
         raise ValueError('Strategy must be average or total')
-    results = map(lambda entry: number_relevant(entry, top_n=n, min_rel=min_rel), experiment_entries)
+    rel, total_rel = as_relevance_matrix(experiment_entries).number_relevant(n, min_rel=min_rel)
     if strategy == 'average':
-        return np.mean([rel / float(total_rel) for (rel, total_rel) in results])
+        return np.mean(rel / total_rel.astype(float), axis=0)
     else:
-        return sum([rel for rel, total_rel in results]) / float(sum([total_rel for rel, total_rel in results]))
+        return rel.sum(axis=0) / total_rel.sum(axis=0).astype(float)
 
 
 def relevance_at_n(experiment_entries, n=10, min_rel=1):
     " A document is relevant at n if it contains a relevant document in the top n"
-    results = [number_relevant(entry, top_n=n, min_rel=min_rel) for entry in experiment_entries]
-    return np.mean([1 if rel > 0 else 0 for rel, total_rel in results])
+    rel, total_rel = as_relevance_matrix(experiment_entries).number_relevant(n, min_rel=min_rel)
+    return np.mean(rel > 0, axis=0)
+
+
+def compare_experiments(entries_mat, labels, ns=range(1, 11), min_rel=1):
+    " Summary (see RelevanceMatrix.summary) of several experiments, as a single DataFrame "
+    return pd.concat([as_relevance_matrix(entries).summary(ns, min_rel=min_rel) for entries in entries_mat],
+                     keys=labels, names=['experiment', 'n'])
 
 def plot_relevance_results(entries_mat, func=total_relevance_at_n, legend=[],
                             xlabel=None, ylabel=None, title=None):
@@ -333,7 +501,8 @@ def plot_relevance_results(entries_mat, func=total_relevance_at_n, legend=[],
     labels = ind + 0.35
     total_rel_at_n = list()
     for entries in entries_mat:
-        total_rel_at_n.append([func(entries, n=i) for i in ind])
+        # Metrics of this module compute all the cut-offs at once
+        total_rel_at_n.append(func(as_relevance_matrix(entries), n=ind))
     f, ax = plt.subplots(figsize=(9, 7))
     width = 0.80 / len(total_rel_at_n)
     delta = -0.40
@@ -0,0 +1,160 @@
+#!/usr/bin/env python
+# -*- coding=utf8 -*-
+
+"""
+    Company: IBM
+    Name: comparison_utils.py
+    Description: Paired comparison of Retrieve and Rank Experiments. Per-query metric deltas between
+        experiments, paired bootstrap confidence intervals and randomization (sign-flip) tests. Resamples
+        are drawn as matrices, so that thousands of them are evaluated with a few NumPy operations, and
+        can optionally be spread over a process pool
+"""
+
+
+# Runtime imports
+import multiprocessing
+
+# 3rd party imports
+import numpy as np
+import pandas as pd
+import analysis_utils as au
+
+
+METRICS = ['ndcg', 'ndcg_absolute', 'precision', 'recall', 'reciprocal_rank', 'average_precision']
+
+
+"""
+    --------------------------
+    --------------------------
+            FUNCTIONS
+    --------------------------
+    --------------------------
+"""
+
+
+def per_query_metric(experiment_entries, metric='ndcg', n=10, min_rel=1):
+    " Value of a metric for every query of an experiment, as a dictionary query -> value "
+    rm = au.as_relevance_matrix(experiment_entries)
+    if metric == 'ndcg':
+        values = rm.ndcg(n, method='relative')
+    elif metric == 'ndcg_absolute':
+        values = rm.ndcg(n, method='absolute')
+    elif metric == 'precision':
+        values = rm.precision(n, min_rel=min_rel)
+    elif metric == 'recall':
+        values = rm.recall(n, min_rel=min_rel)
+    elif metric == 'reciprocal_rank':
+        values = rm.reciprocal_rank(min_rel=min_rel)
+    elif metric == 'average_precision':
+        values = rm.average_precision(min_rel=min_rel)
+    else:
+        raise ValueError('metric=%r must be one of %r' % (metric, METRICS))
+    return dict(zip(rm.queries, values))
+
+
+def paired_deltas(entries_a, entries_b, metric='ndcg', n=10, min_rel=1):
+    """ Metric of b minus metric of a for the queries present in both experiments
+
+        return:
+            (queries, values_a, values_b) : queries, and the aligned metric arrays
+    """
+    metric_a = per_query_metric(entries_a, metric=metric, n=n, min_rel=min_rel)
+    metric_b = per_query_metric(entries_b, metric=metric, n=n, min_rel=min_rel)
+    queries = sorted(set(metric_a.keys()) & set(metric_b.keys()))
+    values_a = np.array([metric_a[q] for q in queries], dtype=float)
+    values_b = np.array([metric_b[q] for q in queries], dtype=float)
+    return queries, values_a, values_b
+
+
+def _mean(values):
+    " Mean of values, NaN if there are none "
+    return values.mean() if len(values) else np.nan
+
+
+def _bootstrap_chunk(args):
+    " Means of num_resamples bootstrap resamples of deltas "
+    deltas, num_resamples, seed = args
+    rng = np.random.RandomState(seed)
+    idx = rng.randint(0, len(deltas), size=(num_resamples, len(deltas)))
+    return deltas[idx].mean(axis=1)
+
+
+def _randomization_chunk(args):
+    " Means of num_resamples random sign flips of deltas "
+    deltas, num_resamples, seed = args
+    rng = np.random.RandomState(seed)
+    signs = rng.randint(0, 2, size=(num_resamples, len(deltas))) * 2 - 1
+    return (signs * deltas).mean(axis=1)
+
+
+def _resample(func, deltas, num_resamples, seed, processes, chunk_size):
+    " Evaluate func over chunks of resamples, in a process pool if processes > 1 "
+    rng = np.random.RandomState(seed)
+    sizes = [chunk_size] * (num_resamples // chunk_size)
+    if num_resamples % chunk_size:
+        sizes.append(num_resamples % chunk_size)
+    tasks = [(deltas, size, rng.randint(0, 2 ** 31 - 1)) for size in sizes]
+    if processes is not None and processes > 1:
+        pool = multiprocessing.Pool(processes=processes)
+        try:
+            results = pool.map(func, tasks)
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        results = map(func, tasks)
+    return np.concatenate(results)
+
+
+def bootstrap_ci(deltas, num_resamples=10000, alpha=0.05, seed=None, processes=None, chunk_size=1000):
+    """ Paired bootstrap confidence interval of the mean of deltas
+
+        return:
+            (low, high) : Percentile interval with coverage 1 - alpha. NaN if there are no deltas
+    """
+    deltas = np.asarray(deltas, dtype=float)
+    if not len(deltas):
+        return np.nan, np.nan
+    means = _resample(_bootstrap_chunk, deltas, num_resamples, seed, processes, chunk_size)
+    return np.percentile(means, 100 * alpha / 2.0), np.percentile(means, 100 * (1 - alpha / 2.0))
+
+
+def randomization_test(deltas, num_resamples=10000, seed=None, processes=None, chunk_size=1000):
+    " Two-sided p-value of the paired randomization test that the mean of deltas is 0. NaN if there are no deltas "
+    deltas = np.asarray(deltas, dtype=float)
+    if not len(deltas):
+        return np.nan
+    means = _resample(_randomization_chunk, deltas, num_resamples, seed, processes, chunk_size)
+    observed = abs(deltas.mean())
+    return (np.sum(np.abs(means) >= observed) + 1) / float(num_resamples + 1)
+
+
+def significance_table(entries_mat, labels, baseline=0, metric='ndcg', n=10, min_rel=1,
+                       num_resamples=10000, alpha=0.05, seed=None, processes=None):
+    """ Compare every experiment against a baseline experiment, on the queries they have in common. \
+        The statistics of an experiment without any query in common with the baseline are NaN
+
+        args:
+            entries_mat (list): Experiment entries (or RelevanceMatrix objects)
+            labels (list): Name of each experiment
+            baseline (int): Index of the baseline experiment in entries_mat
+            metric (str): One of METRICS
+            processes (int): If > 1, resamples are spread over this many processes
+        return:
+            DataFrame with one row per compared experiment
+    """
+    rows = list()
+    for i, entries in enumerate(entries_mat):
+        if i == baseline:
+            continue
+        queries, values_a, values_b = paired_deltas(entries_mat[baseline], entries, metric=metric, n=n,
+                                                    min_rel=min_rel)
+        deltas = values_b - values_a
+        low, high = bootstrap_ci(deltas, num_resamples=num_resamples, alpha=alpha, seed=seed, processes=processes)
+        p_value = randomization_test(deltas, num_resamples=num_resamples, seed=seed, processes=processes)
+        rows.append({'experiment': labels[i], 'baseline': labels[baseline], 'num_queries': len(queries),
+                     'baseline_mean': _mean(values_a), 'mean': _mean(values_b), 'delta': _mean(deltas),
+                     'ci_low': low, 'ci_high': high, 'p_value': p_value})
+    columns = ['experiment', 'baseline', 'num_queries', 'baseline_mean', 'mean', 'delta', 'ci_low', 'ci_high',
+               'p_value']
+    return pd.DataFrame(rows, columns=columns)
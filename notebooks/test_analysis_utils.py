@@ -0,0 +1,98 @@
+#!/usr/bin/env python
+# -*- coding=utf8 -*-
+
+"""
+    Company: IBM
+    Name: test_analysis_utils.py
+    Description: Tests of the vectorized experiment metrics of analysis_utils, against small experiments
+        whose metrics are known
+"""
+
+import os
+import json
+import shutil
+import tempfile
+import unittest
+import numpy as np
+import analysis_utils as au
+
+
+ENTRIES = [
+    {'query': 'q1', 'response_docs': [{'id': 'a', 'relevance': 3}, {'id': 'd', 'relevance': 0},
+                                      {'id': 'b', 'relevance': 2}],
+     'relevant_docs': {'a': 3, 'b': 2, 'c': 1}},
+    {'query': 'q2', 'response_docs': [{'id': 'e', 'relevance': 0}, {'id': 'f', 'relevance': 0}],
+     'relevant_docs': {'x': 1}},
+    {'query': 'q3', 'response_docs': [{'id': 'g', 'relevance': 0}, {'id': 'y', 'relevance': 1},
+                                      {'id': 'h', 'relevance': 0}],
+     'relevant_docs': {'y': 1}},
+]
+
+
+class TestRelevanceMatrix(unittest.TestCase):
+
+    def setUp(self):
+        self.rm = au.RelevanceMatrix(ENTRIES)
+
+    def test_shape(self):
+        self.assertEqual(len(self.rm), 3)
+        self.assertEqual(self.rm.depth, 3)
+        self.assertEqual(self.rm.queries, ['q1', 'q2', 'q3'])
+
+    def test_ndcg_matches_the_per_entry_definition(self):
+        for method in ['relative', 'absolute']:
+            for n in [1, 2, 3, 10]:
+                expected = [au.ndcg([d['relevance'] for d in e['response_docs']], e, n=n, method=method)
+                            for e in ENTRIES]
+                np.testing.assert_allclose(self.rm.ndcg(n, method=method), expected)
+        np.testing.assert_allclose(self.rm.ndcg([1, 3])[:, 1], self.rm.ndcg(3))
+
+    def test_number_relevant_matches_the_per_entry_definition(self):
+        hits, num_judged = self.rm.number_relevant(2)
+        expected = [au.number_relevant(e, top_n=2) for e in ENTRIES]
+        self.assertEqual(zip(hits.tolist(), num_judged.tolist()), expected)
+
+    def test_known_metrics(self):
+        np.testing.assert_allclose(self.rm.precision(2), [0.5, 0.0, 0.5])
+        np.testing.assert_allclose(self.rm.recall(2), [1 / 3.0, 0.0, 1.0])
+        np.testing.assert_allclose(self.rm.reciprocal_rank(), [1.0, 0.0, 0.5])
+        np.testing.assert_allclose(self.rm.average_precision(), [(1 + 2 / 3.0) / 3, 0.0, 0.5])
+        np.testing.assert_allclose(self.rm.precision(2, min_rel=3), [0.5, 0.0, 0.0])
+        np.testing.assert_allclose(au.relevance_at_n(self.rm, n=[1, 2]), [1 / 3.0, 2 / 3.0])
+
+    def test_summary(self):
+        summary = self.rm.summary(ns=[1, 2])
+        self.assertEqual(list(summary.index), [1, 2])
+        self.assertAlmostEqual(summary.loc[2, 'precision'], 1 / 3.0)
+        self.assertAlmostEqual(summary.loc[1, 'mrr'], 0.5)
+#endclass TestRelevanceMatrix
+
+
+class TestExperimentEntries(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'experiment.jsonl')
+        with open(self.path, 'wt') as outfile:
+            outfile.write(json.dumps({'experiment_metadata': {'url': None}}) + '\n')
+            for entry in ENTRIES:
+                outfile.write(json.dumps(entry) + '\n\n')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_entries_are_read_lazily_and_filtered(self):
+        entries = au.ExperimentEntries(self.path, response_doc_fields=['relevance'])
+        self.assertEqual(len(entries), 3)
+        self.assertEqual([e['query'] for e in entries], ['q1', 'q2', 'q3'])
+        self.assertEqual(list(entries)[0]['response_docs'], [{'relevance': 3}, {'relevance': 0}, {'relevance': 2}])
+
+    def test_experiment_metrics_from_file(self):
+        experiment = au.RetrieveAndRankExperiment(self.path)
+        self.assertIsNone(experiment.rr_service)
+        np.testing.assert_allclose(au.experiment_ndcg(experiment.experiment_entries, n=3),
+                                   au.RelevanceMatrix(ENTRIES).ndcg(3))
+#endclass TestExperimentEntries
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,58 @@
+#!/usr/bin/env python
+# -*- coding=utf8 -*-
+
+"""
+    Company: IBM
+    Name: test_comparison_utils.py
+    Description: Tests of the paired comparison of experiments, on deltas whose statistics are known
+"""
+
+import unittest
+import numpy as np
+import comparison_utils as cu
+
+
+def entries(relevances):
+    " One experiment entry per query, with the relevance of its response docs "
+    return [{'query': 'q%d' % i, 'response_docs': [{'relevance': r} for r in rels], 'relevant_docs': {'a': 1}}
+            for (i, rels) in enumerate(relevances)]
+
+
+class TestComparisonUtils(unittest.TestCase):
+
+    def test_bootstrap_ci(self):
+        self.assertEqual(cu.bootstrap_ci([0.2] * 10, num_resamples=500, seed=0), (0.2, 0.2))
+        low, high = cu.bootstrap_ci(np.arange(10) / 10.0, num_resamples=2000, seed=0)
+        self.assertTrue(low < 0.45 < high)
+        self.assertEqual(cu.bootstrap_ci(np.arange(10) / 10.0, num_resamples=2000, seed=0, chunk_size=300),
+                         cu.bootstrap_ci(np.arange(10) / 10.0, num_resamples=2000, seed=0, chunk_size=300,
+                                         processes=2))
+        self.assertTrue(all(np.isnan(cu.bootstrap_ci([]))))
+
+    def test_randomization_test(self):
+        # Only the 2 resamples that keep every sign are as extreme as 12 deltas of 1
+        self.assertLess(cu.randomization_test([1.0] * 12, num_resamples=2000, seed=0), 0.01)
+        self.assertEqual(cu.randomization_test([0.0] * 12, num_resamples=100, seed=0), 1.0)
+        self.assertTrue(cu.randomization_test([1.0, -1.0] * 6, num_resamples=2000, seed=0) > 0.5)
+        self.assertTrue(np.isnan(cu.randomization_test([])))
+
+    def test_paired_deltas_keep_common_queries(self):
+        queries, values_a, values_b = cu.paired_deltas(entries([[0, 1], [0, 0]]), entries([[1, 0]]),
+                                                       metric='reciprocal_rank')
+        self.assertEqual((queries, values_a.tolist(), values_b.tolist()), (['q0'], [0.5], [1.0]))
+
+    def test_significance_table(self):
+        baseline, better = entries([[0, 1]] * 12), entries([[1, 0]] * 12)
+        table = cu.significance_table([baseline, better, []], ['baseline', 'better', 'empty'],
+                                      metric='reciprocal_rank', num_resamples=500, seed=0)
+        self.assertEqual(list(table['experiment']), ['better', 'empty'])
+        better_row, empty_row = table.iloc[0], table.iloc[1]
+        self.assertEqual((better_row['num_queries'], better_row['delta']), (12, 0.5))
+        self.assertEqual((better_row['ci_low'], better_row['ci_high']), (0.5, 0.5))
+        self.assertLess(better_row['p_value'], 0.01)
+        self.assertEqual(empty_row['num_queries'], 0)
+        self.assertTrue(np.isnan(empty_row['delta']) and np.isnan(empty_row['p_value']))
+#endclass TestComparisonUtils
+
+if __name__ == '__main__':
+    unittest.main()
@@ -16,29 +16,45 @@
 #
 # -*- coding: utf-8 -*-
 
-import csv
 import copy
 import time
 import os
-import requests
+import threading
+import numpy as np
+from contextlib import contextmanager
+from retrieve_and_rank_scorer.pipeline import ScorerPipeline
+from retrieve_and_rank_scorer.feature_matrix import FeatureMatrix, encode_frame
+from routes.ranker_backend import RemoteRankerBackend
+from routes.upstream import UpstreamClient
+from routes.query_cache import QueryCache
 this_dir = os.path.dirname(__file__)
 
 class FcSelect(object):
     def __init__(self, scorers, service_url, service_username, service_password,
                  cluster_id, collection_name, answer_directory, default_rerank_rows = 10,
-                 default_search_rows = 30, default_fl = 'id,title,text'):
+                 default_search_rows = 30, default_fl = 'id,title,text', ranker_backend = None,
+                 upstream = None, query_cache = None):
         """
             Class that manages custom feature scorers
 
             Args:
                 scorers (retrieve_and_rank_scorer.scorers.Scorers): Scorers object, which is \
-                    used to score individual query/document pairs
+                    used to score individual query/document pairs. A \
+                    retrieve_and_rank_scorer.pipeline.ScorerPipeline can be passed instead, in which \
+                    case each request uses the version that is current when it starts
                 service_url, service_username, service_password (str): Credentials \
                     for the different services
                 cluster_id (str): Id for the Solr Cluster
                 collection_name (str): Name of the Solr Collection
+                ranker_backend (routes.ranker_backend.RankerBackend): Backend that ranks \
+                    the answers in rerank. Defaults to the remote rank API
+                upstream (routes.upstream.UpstreamClient): HTTP client of the service calls. \
+                    Defaults to a client without hedging
+                query_cache (routes.query_cache.QueryCache): Responses of fcselect and fcselect_default, \
+                    keyed on the normalized query. Defaults to sharing identical concurrent requests only
         """
-        self.scorers_ = scorers
+        self.pipeline_ = scorers
+        self.local_ = threading.local()
         self.service_url_ = service_url
         self.service_username_ = service_username
         self.service_password_ = service_password
@@ -54,32 +70,87 @@ class FcSelect(object):
         self.default_rerank_rows_ = default_rerank_rows
         self.default_search_rows_ = default_search_rows
         self.default_fl_ = default_fl
-
-
-    def fcselect(self, **kwargs):
+        self.upstream_ = upstream if upstream is not None else UpstreamClient()
+        if ranker_backend is None:
+            ranker_backend = RemoteRankerBackend(service_url, service_username, service_password,
+                                                 self.answer_directory_, upstream=self.upstream_)
+        self.ranker_backend_ = ranker_backend
+        self.query_cache_ = query_cache if query_cache is not None else QueryCache()
+
+    @property
+    def scorers_(self):
+        " Scorers of the current request "
+        scorers = getattr(self.local_, 'scorers', None)
+        if scorers is not None:
+            return scorers
+        if isinstance(self.pipeline_, ScorerPipeline):
+            return self.pipeline_.current()
+        return self.pipeline_
+
+    @contextmanager
+    def request_scorers(self):
+        """
+            Hold one version of the scorer pipeline for the duration of a request, so that a reload \
+                of the feature file never mixes two versions in the same response
+        """
+        if getattr(self.local_, 'scorers', None) is not None or not isinstance(self.pipeline_, ScorerPipeline):
+            yield
+            return
+        with self.pipeline_.acquire() as scorers:
+            self.local_.scorers = scorers
+            try:
+                yield
+            finally:
+                self.local_.scorers = None
+
+    def fcselect(self, deadline=None, **kwargs):
         """
             /fcselect endpoint
 
             Args:
+                deadline (retrieve_and_rank_scorer.deadline.Deadline): Optional deadline of the request. \
+                    Each service call gets the remaining budget as its timeout, and the custom scorers \
+                    that cannot finish in time get their default value
                 kwargs (dict): Contains the same query params as are supported \
-                    by the traditional fcselect endpoint
+                    by the traditional fcselect endpoint. With returnRSInput and \
+                    rsInputFormat=binary, the RSInput rows are returned as a binary frame \
+                    (retrieve_and_rank_scorer.feature_matrix.encode_frame) instead of the JSON response. \
+                    The canonical form of the query is sent, and requests with the same canonical \
+                    query and params share their response, see routes.query_cache.QueryCache
+            Raises:
+                retrieve_and_rank_scorer.deadline.DeadlineExceeded: If the deadline passes before \
+                    a service call
         """
+        kwargs = QueryCache.normalize(kwargs)
+        key = self.query_cache_.key('fcselect', kwargs, getattr(self.pipeline_, 'version', None))
+        return self.query_cache_.call(key, lambda: self._request(self._fcselect, deadline, kwargs), deadline)
+
+    def fcselect_uncached(self, deadline=None, **kwargs):
+        """ fcselect without the query cache, so that every call runs the scorers and the service calls. \
+            Used by routes.warmup.Warmup """
+        return self._request(self._fcselect, deadline, kwargs)
+
+    def _request(self, method, deadline, kwargs):
+        with self.request_scorers():
+            return method(deadline, **kwargs)
+
+    def _fcselect(self, deadline, **kwargs):
         # Re-rank the answers
         if kwargs.has_key('ranker_id'):
-            return self.rerank(**kwargs)
+            return self.rerank(deadline=deadline, **kwargs)
 
         # Parameters
         q           = self.get_query_value(kwargs, 'q')
         search_rows = self.get_query_value(kwargs, 'rows', self.default_search_rows_)
         gt          = self.get_query_value(kwargs, 'gt')
         fl          = self.get_query_value(kwargs, 'fl', self.default_fl_)
+        rs_format   = self.get_query_value(kwargs, 'rsInputFormat', 'csv')
 
         # Determine the parameters to send to the classifier
-        required_fields = self.scorers_.get_required_fields()
-        required_fields.append('featureVector')
-        required_fields.extend([x.strip() for x in fl.split(',')])
-        non_return_fields = set(required_fields) - {'featureVector'} - set([x.strip() for x in fl.split(',')])
-        required_fl = ','.join(list(set(required_fields)))
+        # The id keys the precomputed document features and the feature store
+        scorer_fields = self.scorers_.get_required_fields() + ['id']
+        non_return_fields = set(scorer_fields) - {'featureVector'} - set([x.strip() for x in fl.split(',')])
+        required_fl = self.field_list(scorer_fields, ['featureVector'], fl.split(','))
 
         # Call fcselect
         params_no_rs = {'q': q, 'rows': search_rows, 'fl': required_fl, 'gt': gt, 'wt': 'json'}
@@ -93,37 +164,36 @@ class FcSelect(object):
             return_rs_input = kwargs.get('returnRSInput')
             params_rs['returnRSInput'] = return_rs_input if type(return_rs_input) is not list else return_rs_input[0]
             return_rs_input = True
+        if return_rs_input and rs_format == 'binary':
+            # Frames always carry the feature names
+            params_rs['generateHeader'] = 'true'
         time_1 = time.time()
-        fcselect_json = self.service_fcselect(params_no_rs)
+        fcselect_json = self.service_fcselect(params_no_rs, deadline=deadline)
         time_2 = time.time()
         print ("Time for Service Call #1 = %.4f" % (time_2 - time_1))
 
         # Modify individual feature vectors
-        score_map, score_list = dict(), list()
-        times = list()
-        prev_time = time_2
-        for i, doc in enumerate(fcselect_json.get('response', {}).get('docs', [])):
-            feature_doc = self.prepare_document(doc, fl)
-            fv = doc.get('featureVector')
-            new_scores = self.scorers_.scores(params_rs, feature_doc)
-            fv += ' ' + ' '.join('%.4f' % x if x > 0.0 else '0.0' for x in new_scores)
+        docs = fcselect_json.get('response', {}).get('docs', [])
+        feature_docs = [self.prepare_document(doc, scorer_fields) for doc in docs]
+        custom_matrix = FeatureMatrix(self.custom_scores(params_rs, feature_docs, deadline))
+        feature_matrix = FeatureMatrix.from_feature_vectors([doc.get('featureVector') for doc in docs])
+        feature_matrix = feature_matrix.append(custom_matrix.values)
+        for i, fv in enumerate(feature_matrix.format_rows(delimiter=' ')):
             fcselect_json['response']['docs'][i]['featureVector'] = fv
             for field_value in fcselect_json['response']['docs'][i].keys():
                 if field_value in non_return_fields:
                     del fcselect_json['response']['docs'][i][field_value]
-            score_map[doc.get('id')] = new_scores
-            score_list.append(new_scores)
-            times.append(time.time() - prev_time)
-            prev_time = time.time()
+        score_list = custom_matrix.format_rows(delimiter=',')
         time_3 = time.time()
-        print ('Time for the first 10 in the loop = %r' % times[:10])
         print ('Time to extract the new features = %.4f' % (time_3 - time_2))
 
         # Modify RSInput
         if return_rs_input:
-            fcselect_json_rs = self.service_fcselect(params_rs)
+            fcselect_json_rs = self.service_fcselect(params_rs, deadline=deadline)
             time_4 = time.time()
             print ('Time for service call #2 = %.4f' % (time_4 - time_3))
+            if rs_format == 'binary':
+                return self.rs_input_frame(fcselect_json_rs['RSInput'], custom_matrix)
             rs_input_splits = fcselect_json_rs['RSInput'].split('\n')
             rs_input_modified = ''
             score_index, rs_split_index = 0, 0
@@ -153,8 +223,7 @@ class FcSelect(object):
                         rs_split_index += 1
 
                         # Get new scores
-                        new_scores = score_list[score_index]
-                        new_score_string = ','.join('%.4f' % x if x > 0.0 else '0.0' for x in new_scores)
+                        new_score_string = score_list[score_index]
                         score_index += 1
 
                         # Combine
@@ -169,6 +238,35 @@ class FcSelect(object):
             print ('Time for Creating RS String = %.4f' % (time_5 - time_4))
         return fcselect_json
 
+    def rs_input_frame(self, rs_input, custom_matrix):
+        """
+            Encode the RSInput returned by the service, extended with the custom scores, as a binary frame
+
+            Args:
+                rs_input (str): RSInput CSV of the service, with a header line
+                custom_matrix (FeatureMatrix): Custom scores of the documents, in the order of the RSInput rows
+        """
+        lines = [line for line in rs_input.split('\n') if line.strip() != '']
+        if not lines:
+            raise ValueError('RSInput value %r does not contain a header' % rs_input)
+        headers = lines[0].split(',')[1:-1] + self.scorers_.get_headers()
+        rows = lines[1:]
+        if len(rows) != len(custom_matrix):
+            raise ValueError('RSInput has %d rows for %d documents' % (len(rows), len(custom_matrix)))
+        qids = [row[:row.index(',')] for row in rows]
+        relevance = [int(row[row.rindex(',') + 1:]) for row in rows]
+        features = FeatureMatrix.from_feature_vectors([row[row.index(',') + 1:row.rindex(',')].replace(',', ' ')
+                                                       for row in rows])
+        return encode_frame(headers, qids, relevance, features.append(custom_matrix.values))
+
+    @staticmethod
+    def field_list(*groups):
+        """ Solr fl parameter of the union of the groups of fields """
+        fields = set()
+        for group in groups:
+            fields.update(f.strip() for f in group if f.strip())
+        return ','.join(sorted(fields))
+
     def get_query_value(self, dct, arg, default_value=None):
         if arg not in dct.keys():
             if default_value is not None:
@@ -181,24 +279,31 @@ class FcSelect(object):
         else:
             return val
 
-    def rerank(self, **kwargs):
-        """ Re-rank the incoming query """
+    def rerank(self, deadline=None, **kwargs):
+        """ Re-rank the incoming query. All the answers are returned, with the fields of fl for the top \
+            rows answers (all of them by default) and only the id and confidence for the others. \
+            See fcselect for the deadline """
+        with self.request_scorers():
+            return self._rerank(deadline, **kwargs)
+
+    def _rerank(self, deadline, **kwargs):
         # Extract the parameters
         ranker_id = self.get_query_value(kwargs, 'ranker_id')
         q = self.get_query_value(kwargs, 'q')
         search_rows = self.get_query_value(kwargs, 'search_rows', self.default_search_rows_)
+        rows = kwargs.get('rows')
+        rows = int(rows if type(rows) is not list else rows[0]) if rows is not None else None
 
-        # Get the appropriate values
+        # Only the fields of the scorers are needed to rank the answers. The fields of the response
+        # are fetched after the ranking, by order_answers_by_id, for the top rows answers only if rows is set
         fl = self.get_query_value(kwargs, 'fl', self.default_fl_)
-        required_fields = self.scorers_.get_required_fields()
-        required_fields.append('featureVector')
-        required_fields.extend([x.strip() for x in fl.split(',')])
-        required_fl = ','.join(list(set(required_fields)))
+        scorer_fields = self.scorers_.get_required_fields() + ['id']
+        required_fl = self.field_list(scorer_fields, ['featureVector'])
 
         # Make a call to fcselect and get the features plus other parameters
         fcselect_params = {'q': q, 'rows': search_rows, 'fl': required_fl, 'wt': 'json', \
             'generateHeader': 'true', 'returnRSInput':'true'}
-        fcselect_json = self.service_fcselect(fcselect_params)
+        fcselect_json = self.service_fcselect(fcselect_params, deadline=deadline)
 
         if type(fcselect_json) is not dict:
             raise ValueError('Response object %r is type %r and is not a dictionary' % (fcselect_json, type(fcselect_json)))
@@ -211,76 +316,86 @@ class FcSelect(object):
             full_header = rs_input_splits[0] + ',' + ','.join(self.scorers_.get_headers())
 
         # Score the documents/queries
+        docs = fcselect_json.get('response', {}).get('docs', [])
+        feature_docs = [self.prepare_document(doc, scorer_fields) for doc in docs]
+        features = FeatureMatrix.from_feature_vectors([doc.get('featureVector') for doc in docs])
+        features = features.append(self.custom_scores(fcselect_params, feature_docs, deadline))
 
-        features = list()
-        for i, doc in enumerate(fcselect_json.get('response', {}).get('docs', [])):
-            feature_doc = self.prepare_document(doc, fl)
-            fv = doc.get('featureVector').split(' ')
-            new_scores = self.scorers_.scores(fcselect_params, feature_doc)
-            fv.extend([str(x) for x in new_scores])
-            features.append((doc.get('id'), fv))
-
-        # Write to a CSV
-        file_path = os.path.join(self.answer_directory_, 'answer_%d.csv' % time.time())
-        self.write_to_answer_csv(file_path, full_header.split(','), features)
-
-        # Call the re-rank API
-        rerank_resp = requests.post('%s/v1/rankers/%s/rank' % (self.service_url_, ranker_id), \
-            auth=(self.service_username_, self.service_password_), \
-            headers={'Accept':'application/json'}, \
-            files={'answer_data': open(file_path, 'rb')})
-        if rerank_resp.ok:
-            print ('Response is ok')
-            if 'answers' not in rerank_resp.json():
-                raise ValueError('No answers contained in response=%r' % rerank_resp.json())
-            else:
-                answers = rerank_resp.json()['answers']
-                return self.order_answers_by_id(answers, fl)
-        else:
-            raise rerank_resp.raise_for_status()
+        # Rank the answers
+        answers = self.ranker_backend_.rank(ranker_id, full_header.split(','), [doc.get('id') for doc in docs],
+                                            features, deadline=deadline)
+        return self.order_answers_by_id(answers, fl, deadline, rows=rows)
+
+    def custom_scores(self, query, feature_docs, deadline=None):
+        """
+            Custom feature scores of the documents of a response, as they are sent to the ranker. \
+                Negative and missing scores are written as 0
+        """
+        custom = self.scorers_.scores_matrix(query, feature_docs, deadline)
+        return np.maximum(np.nan_to_num(custom), 0.0)
 
-    def order_answers_by_id(self, answers, fl):
-        """ Retrieve the reranked answers by id"""
-        ids = map(lambda e: e['answer_id'], answers)
+    def order_answers_by_id(self, answers, fl, deadline=None, rows=None):
+        """
+            Retrieve the fields of the reranked answers by id, in the order of the answers
+
+            Args:
+                rows (int): Number of top answers whose fields are retrieved. The other answers \
+                    only have their id and confidence. Defaults to all the answers
+        """
+        ids = map(lambda e: e['answer_id'], answers[:rows])
         id_to_answer = {a['answer_id']:a for a in answers}
         id_to_index = {id: i for i, id in enumerate(ids)}
         fq = ' '.join(['id:%s' % (str(id)) for id in ids])
-        params = {'q': fq, 'fl':fl, 'wt':'json'}
-        resps = self.service_select(params=params)
+        params = {'q': fq, 'fl': self.field_list(fl.split(','), ['id']), 'rows': len(ids), 'wt':'json'}
+        resps = self.service_select(params=params, deadline=deadline)
         modified_docs = list()
         for doc in resps['response']['docs']:
             answer = id_to_answer.get(doc['id'])
-            order = id_to_index.get(doc['id'])
             modified_doc = copy.copy(doc)
             modified_doc['confidence'] = answer['confidence']
-            modified_docs.insert(order, modified_doc)
+            modified_docs.append(modified_doc)
+        modified_docs.sort(key=lambda doc: id_to_index.get(doc['id']))
+        if rows is not None and rows < len(answers):
+            modified_docs.extend({'id': a['answer_id'], 'confidence': a['confidence']} for a in answers[rows:])
+            resps['response']['numFound'] = len(answers)
         resps['response']['docs'] = modified_docs
         return resps
 
-    def fcselect_default(self, **kwargs):
+    def fcselect_default(self, deadline=None, **kwargs):
+        """ Answers of the default ranker. Identical requests are shared through the query cache """
+        kwargs = QueryCache.normalize(kwargs)
+        key = self.query_cache_.key('fcselect_default', kwargs)
+        return self.query_cache_.call(key, lambda: self._fcselect_default(deadline, **kwargs), deadline)
 
+    def _fcselect_default(self, deadline, **kwargs):
         q           = self.get_query_value(kwargs, 'q')
         search_rows = self.get_query_value(kwargs, 'rows', self.default_search_rows_)
         fl          = self.get_query_value(kwargs, 'fl', self.default_fl_)
         ranker_id   = self.get_query_value(kwargs,'ranker_id')
         fcselect_params = {'q': q, 'fl': fl, 'ranker_id': ranker_id, 'wt': 'json'}
 
-        fcselect_json = self.service_fcselect(fcselect_params)
+        fcselect_json = self.service_fcselect(fcselect_params, deadline=deadline)
         return fcselect_json
 
-    def service_fcselect(self, params, timeout=10):
+    def service_fcselect(self, params, timeout=10, deadline=None):
         url = '%s/v1/solr_clusters/%s/solr/%s/fcselect' % (self.service_url_,
             self.cluster_id_, self.collection_name_)
-        resp = requests.post(url, data=params, auth=(self.service_username_, self.service_password_), timeout=timeout)
+        if deadline is not None:
+            timeout = deadline.timeout(timeout)
+        resp = self.upstream_.post(url, name='fcselect', data=params, auth=(self.service_username_,
+                                   self.service_password_), timeout=timeout)
         if resp.ok:
             return resp.json()
         else:
             raise resp.raise_for_status()
 
-    def service_select(self, params, timeout=10):
+    def service_select(self, params, timeout=10, deadline=None):
         url = '%s/v1/solr_clusters/%s/solr/%s/select' % (self.service_url_,
             self.cluster_id_, self.collection_name_)
-        resp = requests.get(url, params=params, auth=(self.service_username_, self.service_password_), timeout=timeout)
+        if deadline is not None:
+            timeout = deadline.timeout(timeout)
+        resp = self.upstream_.get(url, name='select', params=params, auth=(self.service_username_,
+                                  self.service_password_), timeout=timeout)
         if resp.ok:
             return resp.json()
         else:
@@ -293,25 +408,13 @@ class FcSelect(object):
             args:
                 doc (dict): This is the object that is returned in the response \
                     by the /fcselect API
+                fl (str or list): Fields the scorers read, see Scorers.get_required_fields, and the id
         """
+        if isinstance(fl, basestring):
+            fl = fl.split(',')
         modified_doc = dict()
-        for fn in set(fl.split(',')) - {'featureVector'}:
+        for fn in set(fl) - {'featureVector'}:
             fv = doc.get(fn)
             modified_doc[fn] = fv if type(fv) is not list else fv[0]
         return modified_doc
-
-    def write_to_answer_csv(self, file_path, headers, scores):
-        """
-            Write to an answer CSV
-
-            Args:
-                file_path (str): Path to the output file
-                headers (list): Headers to write
-                scores (list): List of feature scores
-        """
-        with open(file_path, 'wt') as outfile:
-            writer = csv.writer(outfile, delimiter=',', quoting=csv.QUOTE_NONE)
-            writer.writerow(headers)
-            for (doc_id, feature_scores) in scores:
-                writer.writerow([doc_id] + feature_scores)
 #endclass FcSelect
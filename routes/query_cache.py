@@ -0,0 +1,151 @@
+#!/usr/bin/env python
+#
+# Copyright 2016 IBM Corp. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# -*- coding: utf-8 -*-
+
+import time
+from threading import Lock
+from concurrent import futures
+from retrieve_and_rank_scorer.cache import LRUCache
+from retrieve_and_rank_scorer.deadline import DeadlineExceeded
+from retrieve_and_rank_scorer.utils import normalize_query
+
+
+class QueryCache(object):
+    """
+        Responses of the ranker endpoints, keyed on the canonical form of the query \
+            (retrieve_and_rank_scorer.utils.normalize_query) and the other query params
+
+        Identical concurrent queries share one execution: the first one runs it, and the others wait \
+            for its response. With a cache size, responses are also kept for the following queries. \
+            Failed executions are not cached. Cached responses are shared, callers must not modify them
+    """
+
+    def __init__(self, max_size=0, ttl=None):
+        """
+            Args:
+                max_size (int): Number of responses that are kept. 0 only shares the concurrent executions
+                ttl (float): Seconds a response is kept. Defaults to no expiry
+        """
+        self.cache_ = LRUCache(max_size) if max_size > 0 else None
+        self.ttl_ = ttl
+        self.lock_ = Lock()
+        self.in_flight_ = dict()
+        self.counts_ = {'hits': 0, 'shared': 0, 'misses': 0}
+
+    @staticmethod
+    def key(endpoint, params, version=None):
+        """
+            Key of a request
+
+            Args:
+                endpoint (str): Name of the endpoint
+                params (dict): Query params of the request. The query (q) is normalized
+                version: Version of the scorer pipeline, so that responses are not reused after a reload
+        """
+        items = list()
+        for (name, value) in QueryCache.normalize(params).iteritems():
+            if isinstance(value, list) and len(value) == 1:
+                value = value[0]
+            items.append((name, repr(value)))
+        return (endpoint, version, tuple(sorted(items)))
+
+    @staticmethod
+    def normalize(params):
+        """
+            Copy of the query params with the canonical form of the query. Requests are sent with these \
+                params, so that the response only depends on the key
+
+            Args:
+                params (dict): Query params of the request
+        """
+        params = dict(params)
+        if isinstance(params.get('q'), list):
+            params['q'] = [normalize_query(q) for q in params['q']]
+        elif 'q' in params:
+            params['q'] = normalize_query(params['q'])
+        return params
+
+    def call(self, key, func, deadline=None):
+        """
+            Response of the request with that key, from the cache, from the execution of an identical \
+                request in progress, or from func()
+
+            Args:
+                key (tuple): See QueryCache.key
+                func (callable): Computes the response
+                deadline (retrieve_and_rank_scorer.deadline.Deadline): Optional deadline of the request. \
+                    Bounds the time spent waiting for an identical request
+            Raises:
+                retrieve_and_rank_scorer.deadline.DeadlineExceeded: If the identical request does not \
+                    answer before the deadline
+        """
+        with self.lock_:
+            response = self._cached(key)
+            if response is not None:
+                self.counts_['hits'] += 1
+                return response
+            f = self.in_flight_.get(key)
+            leader = f is None
+            if leader:
+                f = self.in_flight_[key] = futures.Future()
+                self.counts_['misses'] += 1
+            else:
+                self.counts_['shared'] += 1
+
+        if not leader:
+            try:
+                return f.result(timeout=None if deadline is None else deadline.timeout())
+            except futures.TimeoutError:
+                raise DeadlineExceeded('Request deadline exceeded while waiting for an identical request')
+
+        try:
+            response = func()
+        except Exception as e:
+            with self.lock_:
+                del self.in_flight_[key]
+            f.set_exception(e)
+            raise
+        with self.lock_:
+            del self.in_flight_[key]
+            if self.cache_ is not None:
+                self.cache_.put(key, (time.time(), response))
+        f.set_result(response)
+        return response
+
+    def metrics(self):
+        " Cache hits, requests that shared the execution of an identical request, and executions "
+        with self.lock_:
+            metrics = dict(self.counts_)
+        metrics['size'] = len(self.cache_) if self.cache_ is not None else 0
+        return metrics
+
+    def clear(self):
+        if self.cache_ is not None:
+            self.cache_.clear()
+
+    def _cached(self, key):
+        " Cached response of the key, or None if it is missing or expired "
+        if self.cache_ is None:
+            return None
+        entry = self.cache_.get(key)
+        if entry is None:
+            return None
+        (stored_at, response) = entry
+        if self.ttl_ is not None and time.time() - stored_at > self.ttl_:
+            return None
+        return response
+#endclass QueryCache
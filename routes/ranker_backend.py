@@ -0,0 +1,245 @@
+#!/usr/bin/env python
+#
+# Copyright 2016 IBM Corp. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# -*- coding: utf-8 -*-
+
+import time
+import Queue
+from StringIO import StringIO
+import numpy as np
+from threading import Thread
+from concurrent import futures
+from retrieve_and_rank_scorer.ranker import LinearRanker
+from retrieve_and_rank_scorer.deadline import DeadlineExceeded
+from routes.upstream import UpstreamClient
+
+
+class RankerBackend(object):
+    """
+        Ranks the feature vectors of the candidate answers of a query. Used by FcSelect.rerank
+
+        Backends that set batchable to True rank the answers of several queries faster with rank_batch \
+            than with one call to rank per query
+    """
+    batchable = False
+
+    def rank(self, ranker_id, headers, answer_ids, features, deadline=None):
+        """
+            Rank candidate answers
+
+            Args:
+                ranker_id (str): Id of the ranker
+                headers (list): Header of the answer CSV. The first header is the id column, \
+                    the others are the names of the features
+                answer_ids (list): Id of each candidate answer
+                features (retrieve_and_rank_scorer.feature_matrix.FeatureMatrix): Feature vectors \
+                    of the candidate answers, one row per answer id
+                deadline (retrieve_and_rank_scorer.deadline.Deadline): Optional deadline of the request
+            Returns:
+                answers (list): Dictionaries with the keys answer_id and confidence, best answer first
+        """
+        raise NotImplementedError('rank has to be implemented by a subclass')
+
+    def rank_batch(self, ranker_id, headers, batch):
+        """
+            Rank the candidate answers of several queries
+
+            Args:
+                ranker_id (str), headers (list): See rank. Shared by all the queries
+                batch (list): (answer_ids, features) of each query
+            Returns:
+                answers (list): Result of rank for each query
+        """
+        return [self.rank(ranker_id, headers, answer_ids, features) for (answer_ids, features) in batch]
+#endclass RankerBackend
+
+
+class RemoteRankerBackend(RankerBackend):
+    """
+        Sends the feature vectors as an answer CSV to the /v1/rankers/{id}/rank API. The CSV is built \
+            in memory, so that concurrent requests never share a file
+    """
+
+    def __init__(self, service_url, service_username, service_password, answer_directory, timeout=10,
+                 upstream=None):
+        """
+            Args:
+                service_url, service_username, service_password (str): Credentials of the service
+                answer_directory (str): Directory of the answer CSV files written by write_to_answer_csv
+                timeout (float): Timeout of the rank call
+                upstream (routes.upstream.UpstreamClient): HTTP client. Defaults to a client without hedging
+        """
+        self.timeout_ = timeout
+        self.upstream_ = upstream if upstream is not None else UpstreamClient()
+        self.service_url_ = service_url
+        self.service_username_ = service_username
+        self.service_password_ = service_password
+        self.answer_directory_ = answer_directory
+
+    def rank(self, ranker_id, headers, answer_ids, features, deadline=None):
+        timeout = self.timeout_ if deadline is None else deadline.timeout(self.timeout_)
+        # A string rather than a file, so that the request can be sent twice if it is hedged
+        answer_data = self.answer_csv(headers, answer_ids, features)
+        rerank_resp = self.upstream_.post('%s/v1/rankers/%s/rank' % (self.service_url_, ranker_id), \
+            name='rank', auth=(self.service_username_, self.service_password_), \
+            headers={'Accept':'application/json'}, \
+            files={'answer_data': ('answer.csv', answer_data)}, timeout=timeout)
+        if rerank_resp.ok:
+            print ('Response is ok')
+            if 'answers' not in rerank_resp.json():
+                raise ValueError('No answers contained in response=%r' % rerank_resp.json())
+            return rerank_resp.json()['answers']
+        else:
+            raise rerank_resp.raise_for_status()
+
+    def answer_csv(self, headers, answer_ids, features):
+        """
+            Content of an answer CSV
+
+            Args:
+                headers (list): Headers to write
+                answer_ids (list): Id of each answer
+                features (FeatureMatrix): Feature scores of each answer
+        """
+        outfile = StringIO()
+        outfile.write(','.join(headers) + '\n')
+        for (doc_id, row) in zip(answer_ids, features.format_rows(delimiter=',')):
+            outfile.write('%s,%s\n' % (doc_id, row))
+        return outfile.getvalue()
+
+    def write_to_answer_csv(self, file_path, headers, answer_ids, features):
+        """ Write an answer CSV to a file. See answer_csv """
+        with open(file_path, 'wt') as outfile:
+            outfile.write(self.answer_csv(headers, answer_ids, features))
+#endclass RemoteRankerBackend
+
+
+class LocalRankerBackend(RankerBackend):
+    """
+        Scores the feature vectors in-process with a model trained by bin/python/simulate.py \
+            (retrieve_and_rank_scorer.ranker.LinearRanker). The ranker id is ignored
+    """
+    batchable = True
+
+    def __init__(self, model_path):
+        """
+            Args:
+                model_path (str): Path to the .npz model written by LinearRanker.save
+        """
+        self.ranker_ = LinearRanker.load(model_path)
+
+    def rank(self, ranker_id, headers, answer_ids, features, deadline=None):
+        if not answer_ids:
+            return list()
+        return self.answers(answer_ids, self.ranker_.score(self.model_features(headers, features)))
+
+    def rank_batch(self, ranker_id, headers, batch):
+        """ Score the feature vectors of all the queries with one call to the model """
+        matrices = [self.model_features(headers, features) for (answer_ids, features) in batch if answer_ids]
+        if not matrices:
+            return [list() for item in batch]
+        scores = self.ranker_.score(np.vstack(matrices))
+        results, offset = list(), 0
+        for (answer_ids, features) in batch:
+            results.append(self.answers(answer_ids, scores[offset:offset + len(answer_ids)]) if answer_ids else list())
+            offset += len(answer_ids)
+        return results
+
+    def model_features(self, headers, features):
+        """ Columns of the features in the order of the features of the model """
+        feature_headers = [h.strip() for h in headers[1:]]
+        matrix = features.values
+        if set(self.ranker_.headers).issubset(feature_headers):
+            matrix = matrix[:, [feature_headers.index(h) for h in self.ranker_.headers]]
+        elif matrix.shape[1] != len(self.ranker_.headers):
+            raise ValueError('Features %r do not match the features of the model %r' % (feature_headers,
+                                                                                     self.ranker_.headers))
+        return matrix
+
+    def answers(self, answer_ids, scores):
+        """ Answers of a query sorted by score, with the softmax of the scores of the query as confidence """
+        confidences = np.exp(scores - scores.max())
+        confidences /= confidences.sum()
+        order = np.argsort(-scores, kind='mergesort')
+        return [{'answer_id': answer_ids[i], 'score': float(scores[i]), 'confidence': float(confidences[i])}
+                for i in order]
+#endclass LocalRankerBackend
+
+
+class BatchingRankerBackend(RankerBackend):
+    """
+        Groups the rank calls of concurrent requests. Calls that arrive within window seconds of the \
+            first call of a batch are ranked together with rank_batch of the wrapped backend, by ranker id \
+            and headers. Backends that are not batchable are called directly
+    """
+
+    def __init__(self, backend, window=0.005, max_batch=32):
+        """
+            Args:
+                backend (RankerBackend): Backend that ranks the batches
+                window (float): Seconds a batch waits for more calls after its first call
+                max_batch (int): Maximum number of calls in a batch
+        """
+        self.backend_ = backend
+        self.window_ = window
+        self.max_batch_ = max_batch
+        self.queue_ = Queue.Queue()
+        self.thread_ = None
+        if backend.batchable:
+            self.thread_ = Thread(target=self._collect, name='RankerBatching')
+            self.thread_.daemon = True
+            self.thread_.start()
+
+    def rank(self, ranker_id, headers, answer_ids, features, deadline=None):
+        if self.thread_ is None:
+            return self.backend_.rank(ranker_id, headers, answer_ids, features, deadline=deadline)
+        f = futures.Future()
+        self.queue_.put((ranker_id, tuple(headers), answer_ids, features, f))
+        try:
+            return f.result(timeout=None if deadline is None else deadline.timeout())
+        except futures.TimeoutError:
+            raise DeadlineExceeded('Request deadline exceeded while waiting for the ranker')
+
+    def _collect(self):
+        " Collect the calls of each batch and rank them "
+        while True:
+            batch = [self.queue_.get()]
+            end = time.time() + self.window_
+            while len(batch) < self.max_batch_:
+                remaining = end - time.time()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self.queue_.get(timeout=remaining))
+                except Queue.Empty:
+                    break
+            self._rank(batch)
+
+    def _rank(self, batch):
+        " Rank a batch, one rank_batch call per ranker id and headers, and hand each result to its caller "
+        groups = dict()
+        for item in batch:
+            groups.setdefault(item[:2], list()).append(item)
+        for ((ranker_id, headers), items) in groups.iteritems():
+            try:
+                results = self.backend_.rank_batch(ranker_id, list(headers),
+                                                   [(answer_ids, features) for (_, _, answer_ids, features, f) in items])
+                for (item, result) in zip(items, results):
+                    item[-1].set_result(result)
+            except Exception as e:
+                for item in items:
+                    item[-1].set_exception(e)
+#endclass BatchingRankerBackend
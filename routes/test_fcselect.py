@@ -0,0 +1,141 @@
+#!/usr/bin/env python
+#
+# Copyright 2016 IBM Corp. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import os
+import json
+import shutil
+import tempfile
+import time
+import unittest
+from threading import Thread, Event
+import numpy as np
+from retrieve_and_rank_scorer import utils
+from retrieve_and_rank_scorer.scorers import Scorers
+from retrieve_and_rank_scorer.feature_store import FeatureStore
+from retrieve_and_rank_scorer.document_features import DocumentFeatures
+from routes.fcselect import FcSelect
+from routes.ranker_backend import RankerBackend
+
+
+class RecordingRankerBackend(RankerBackend):
+    " Keeps the features it is sent, and ranks the answers in the order of the response "
+
+    def __init__(self):
+        self.features = None
+
+    def rank(self, ranker_id, headers, answer_ids, features, deadline=None):
+        self.features = features.values
+        return [{'answer_id': answer_id, 'confidence': 0.5} for answer_id in answer_ids]
+#endclass RecordingRankerBackend
+
+
+class OfflineFcSelect(FcSelect):
+    " FcSelect answering the service calls with fixed documents, which lack the fields of the scorers "
+
+    def service_fcselect(self, params, timeout=10, deadline=None):
+        docs = [{'id': doc_id, 'featureVector': '0.1', 'title': 't'} for doc_id in ['1', '2']]
+        return {'RSInput': 'qid,f0,gt\n', 'response': {'docs': docs}}
+
+    def service_select(self, params, timeout=10, deadline=None):
+        ids = [term.split(':')[1] for term in params['q'].split()]
+        return {'response': {'docs': [{'id': doc_id, 'title': 't'} for doc_id in ids]}}
+#endclass OfflineFcSelect
+
+
+class BlockingFcSelect(OfflineFcSelect):
+    " OfflineFcSelect whose fcselect calls are counted and wait for release to be set "
+
+    def __init__(self, *args, **kwargs):
+        super(BlockingFcSelect, self).__init__(*args, **kwargs)
+        self.calls = 0
+        self.release = Event()
+
+    def service_fcselect(self, params, timeout=10, deadline=None):
+        self.calls += 1
+        self.release.wait(5)
+        return super(BlockingFcSelect, self).service_fcselect(params, timeout, deadline)
+#endclass BlockingFcSelect
+
+
+class TestFcSelect(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        upvote = {'init_args': {'name': 'UpVoteScorer', 'short_name': 'uv', 'description': ''},
+                  'type': 'document', 'module': 'document_upvote_scorer', 'class': 'UpVoteScorer'}
+        popularity = {'init_args': {'name': 'PopularityScorer', 'short_name': 'pop', 'description': ''},
+                      'type': 'document', 'module': 'document_rating_scorer', 'class': 'PopularityScorer'}
+        feature_file = os.path.join(self.directory, 'features.json')
+        with open(feature_file, 'wt') as outfile:
+            json.dump({'scorers': [upvote, popularity]}, outfile)
+
+        # uv is precomputed, pop is in the feature store
+        document_features = os.path.join(self.directory, 'document_features.npz')
+        DocumentFeatures.save(document_features, ['1', '2'], ['uv'], [utils.scorer_version(upvote)], [[0.9], [0.8]])
+        feature_store = os.path.join(self.directory, 'features.db')
+        store = FeatureStore(feature_store, {'pop': utils.scorer_version(popularity)})
+        store.put_many('', '1', {'pop': 0.3})
+        store.put_many('', '2', {'pop': 0.6})
+        store.close()
+
+        self.scorers = Scorers(feature_file, feature_store_path=feature_store,
+                               document_features_path=document_features)
+        self.backend = RecordingRankerBackend()
+        self.fcselect = OfflineFcSelect(self.scorers, 'url', 'user', 'password', 'cluster', 'collection',
+                                        self.directory, ranker_backend=self.backend)
+
+    def tearDown(self):
+        self.scorers.close()
+        shutil.rmtree(self.directory)
+
+    def test_rerank_uses_precomputed_and_stored_features(self):
+        self.fcselect.fcselect(ranker_id='ranker', q='what is a visa', fl='title')
+        np.testing.assert_allclose(self.backend.features[:, 1:], [[0.9, 0.3], [0.8, 0.6]], rtol=1e-6)
+
+    def test_rerank_returns_all_answers(self):
+        resp = self.fcselect.fcselect(ranker_id='ranker', q='what is a visa', fl='title')
+        self.assertEqual([doc['title'] for doc in resp['response']['docs']], ['t', 't'])
+        resp = self.fcselect.fcselect(ranker_id='ranker', q='what is a visa', fl='title', rows='1')
+        self.assertEqual(resp['response']['docs'], [{'id': '1', 'title': 't', 'confidence': 0.5},
+                                                    {'id': '2', 'confidence': 0.5}])
+
+    def test_fcselect_uses_precomputed_and_stored_features(self):
+        resp = self.fcselect.fcselect(q='what is a visa', fl='title', gt='{}')
+        vectors = [[float(v) for v in doc['featureVector'].split()] for doc in resp['response']['docs']]
+        np.testing.assert_allclose([vector[1:] for vector in vectors], [[0.9, 0.3], [0.8, 0.6]], rtol=1e-6)
+
+    def test_identical_concurrent_queries_share_one_call(self):
+        fcselect = BlockingFcSelect(self.scorers, 'url', 'user', 'password', 'cluster', 'collection',
+                                    self.directory)
+        responses = list()
+        threads = [Thread(target=lambda q=q: responses.append(fcselect.fcselect_default(q=q, ranker_id='r')))
+                   for q in ['What is a visa?', 'what is a  VISA']]
+        threads[0].start()
+        while fcselect.calls == 0:
+            time.sleep(0.001)
+        threads[1].start()
+        while fcselect.query_cache_.metrics()['shared'] == 0:
+            time.sleep(0.001)
+        fcselect.release.set()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(fcselect.calls, 1)
+        self.assertEqual(len(responses), 2)
+        self.assertIs(responses[0], responses[1])
+
+if __name__ == '__main__':
+    unittest.main()
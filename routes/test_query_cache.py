@@ -0,0 +1,97 @@
+#!/usr/bin/env python
+#
+# Copyright 2016 IBM Corp. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import time
+import unittest
+from threading import Thread, Event
+from routes.query_cache import QueryCache
+
+
+class TestQueryCache(unittest.TestCase):
+
+    def release_later(self, started, release):
+        " Set release shortly after started is set, so that the other calls find the execution in flight "
+        def run():
+            started.wait(5)
+            time.sleep(0.05)
+            release.set()
+        Thread(target=run).start()
+
+    def call_concurrently(self, cache, key, func, count):
+        " Call cache.call from count threads at the same time. Returns the results, or the exceptions raised "
+        results = [None] * count
+
+        def run(i):
+            try:
+                results[i] = cache.call(key, func)
+            except Exception as e:
+                results[i] = e
+        threads = [Thread(target=run, args=(i,)) for i in range(count)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(5)
+        return results
+
+    def test_key_uses_canonical_query(self):
+        self.assertEqual(QueryCache.key('fcselect', {'q': 'What is a patent?', 'rows': '10'}),
+                         QueryCache.key('fcselect', {'q': [' what is  a patent'], 'rows': '10'}))
+        self.assertNotEqual(QueryCache.key('fcselect', {'q': 'c++'}), QueryCache.key('fcselect', {'q': 'c#'}))
+        self.assertNotEqual(QueryCache.key('fcselect', {'q': 'a'}, 1), QueryCache.key('fcselect', {'q': 'a'}, 2))
+        self.assertEqual(QueryCache.normalize({'q': 'A?', 'fl': 'id'}), {'q': 'a', 'fl': 'id'})
+
+    def test_concurrent_calls_share_one_execution(self):
+        cache, started, release, calls = QueryCache(), Event(), Event(), list()
+
+        def func():
+            calls.append(1)
+            started.set()
+            release.wait(5)
+            return {'answer': 1}
+        self.release_later(started, release)
+        results = self.call_concurrently(cache, QueryCache.key('fcselect', {'q': 'a'}), func, 4)
+        self.assertEqual(results, [{'answer': 1}] * 4)
+        self.assertEqual(len(calls), 1)
+        metrics = cache.metrics()
+        self.assertEqual((metrics['misses'], metrics['shared'] + metrics['hits']), (1, 3))
+        # Without a cache size, the response is not kept once the execution is done
+        self.assertEqual(cache.call(QueryCache.key('fcselect', {'q': 'a'}), lambda: {'answer': 2}), {'answer': 2})
+
+    def test_followers_get_the_exception(self):
+        cache, started, release = QueryCache(max_size=10), Event(), Event()
+
+        def func():
+            started.set()
+            release.wait(5)
+            raise ValueError('service failed')
+        self.release_later(started, release)
+        results = self.call_concurrently(cache, 'key', func, 3)
+        self.assertTrue(all(isinstance(result, ValueError) for result in results))
+        # Failures are not cached
+        self.assertEqual(cache.call('key', lambda: 'ok'), 'ok')
+        self.assertEqual(cache.call('key', lambda: 'not called'), 'ok')
+
+    def test_ttl_expiry(self):
+        cache = QueryCache(max_size=10, ttl=0.05)
+        self.assertEqual(cache.call('key', lambda: 1), 1)
+        self.assertEqual(cache.call('key', lambda: 2), 1)
+        time.sleep(0.1)
+        self.assertEqual(cache.call('key', lambda: 3), 3)
+        self.assertEqual(cache.metrics()['hits'], 1)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,84 @@
+#!/usr/bin/env python
+#
+# Copyright 2016 IBM Corp. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import unittest
+from threading import Thread, Lock
+import numpy as np
+from retrieve_and_rank_scorer.feature_matrix import FeatureMatrix
+from routes.ranker_backend import RankerBackend, BatchingRankerBackend
+
+
+class RecordingBatchBackend(RankerBackend):
+    " Batchable backend that records its batches, and answers each query with its answer ids and first feature "
+    batchable = True
+
+    def __init__(self, error=None):
+        self.batches = list()
+        self.lock = Lock()
+        self.error = error
+
+    def rank_batch(self, ranker_id, headers, batch):
+        with self.lock:
+            self.batches.append((ranker_id, headers, len(batch)))
+        if self.error is not None:
+            raise self.error
+        return [[{'answer_id': answer_id, 'confidence': float(row[0])}
+                 for (answer_id, row) in zip(answer_ids, features.values)] for (answer_ids, features) in batch]
+#endclass RecordingBatchBackend
+
+
+class TestBatchingRankerBackend(unittest.TestCase):
+
+    def rank_concurrently(self, backend, queries):
+        " Rank each (ranker_id, answer_ids) from its own thread. Returns the results, or the exceptions raised "
+        results = [None] * len(queries)
+
+        def run(i, ranker_id, answer_ids):
+            features = FeatureMatrix(np.full((len(answer_ids), 1), i, dtype=np.float32))
+            try:
+                results[i] = backend.rank(ranker_id, ['id', 'f0'], answer_ids, features)
+            except Exception as e:
+                results[i] = e
+        threads = [Thread(target=run, args=(i,) + query) for (i, query) in enumerate(queries)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(5)
+        return results
+
+    def test_concurrent_calls_are_batched(self):
+        backend = RecordingBatchBackend()
+        batching = BatchingRankerBackend(backend, window=0.2)
+        results = self.rank_concurrently(batching, [('r', ['a', 'b']), ('r', ['c']), ('r', [])])
+        self.assertEqual(backend.batches, [('r', ['id', 'f0'], 3)])
+        self.assertEqual(results, [[{'answer_id': 'a', 'confidence': 0.0}, {'answer_id': 'b', 'confidence': 0.0}],
+                                   [{'answer_id': 'c', 'confidence': 1.0}], []])
+
+    def test_batches_by_ranker(self):
+        backend = RecordingBatchBackend()
+        batching = BatchingRankerBackend(backend, window=0.2)
+        results = self.rank_concurrently(batching, [('r1', ['a']), ('r2', ['b']), ('r1', ['c'])])
+        self.assertEqual(sorted(backend.batches), [('r1', ['id', 'f0'], 2), ('r2', ['id', 'f0'], 1)])
+        self.assertEqual([[a['answer_id'] for a in answers] for answers in results], [['a'], ['b'], ['c']])
+
+    def test_errors_reach_every_caller(self):
+        batching = BatchingRankerBackend(RecordingBatchBackend(error=ValueError('ranker failed')), window=0.2)
+        results = self.rank_concurrently(batching, [('r', ['a']), ('r', ['b'])])
+        self.assertTrue(all(isinstance(result, ValueError) for result in results))
+
+if __name__ == '__main__':
+    unittest.main()
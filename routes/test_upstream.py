@@ -0,0 +1,92 @@
+#!/usr/bin/env python
+#
+# Copyright 2016 IBM Corp. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import time
+import unittest
+from collections import deque
+from threading import Lock
+from routes.upstream import UpstreamClient
+
+
+class ScriptedSession(object):
+    " Answers each request with the next (delay, response) of the script. Responses that are exceptions are raised "
+
+    def __init__(self, script):
+        self.script = deque(script)
+        self.lock = Lock()
+        self.requests = list()
+
+    def request(self, method, url, **kwargs):
+        with self.lock:
+            (delay, response) = self.script.popleft()
+            self.requests.append((method, url, kwargs))
+        time.sleep(delay)
+        if isinstance(response, Exception):
+            raise response
+        return response
+#endclass ScriptedSession
+
+
+class TestUpstreamClient(unittest.TestCase):
+
+    def client(self, script, latencies=(0.01,) * 4, **kwargs):
+        " Client hedging at the median, with the latencies already recorded for the endpoint 'ep' "
+        client = UpstreamClient(**dict({'hedge_percentile': 50, 'hedge_max_rate': 1.0, 'min_samples': 4}, **kwargs))
+        client.session_ = ScriptedSession(script)
+        client.latencies_['ep'] = deque(latencies)
+        return client
+
+    def test_hedge_delay(self):
+        self.assertIsNone(UpstreamClient().hedge_delay('ep'))
+        self.assertIsNone(self.client([], latencies=[0.1] * 3).hedge_delay('ep'))
+        self.assertAlmostEqual(self.client([], latencies=[0.1, 0.2, 0.3, 0.4, 0.5]).hedge_delay('ep'), 0.3)
+
+    def test_hedge_rate_is_capped(self):
+        client = self.client([], hedge_max_rate=0.5)
+        self.assertEqual([client._take_hedge() for _ in range(4)], [False, True, False, True])
+        self.assertEqual(client.metrics()['hedges'], 2)
+
+    def test_fast_response_is_not_hedged(self):
+        client = self.client([(0.0, 'first')], latencies=[0.5] * 4)
+        self.assertEqual(client.get('url', name='ep'), 'first')
+        self.assertEqual(len(client.session_.requests), 1)
+        self.assertEqual(client.metrics()['hedges'], 0)
+
+    def test_first_success_wins(self):
+        client = self.client([(0.5, 'slow'), (0.0, 'hedge')])
+        self.assertEqual(client.get('url', name='ep', timeout=10), 'hedge')
+        self.assertEqual(len(client.session_.requests), 2)
+        # The hedge gets the time that is left of the timeout
+        self.assertLess(client.session_.requests[1][2]['timeout'], 10)
+        metrics = client.metrics()
+        self.assertEqual((metrics['requests'], metrics['hedges'], metrics['hedge_wins']), (1, 1, 1))
+
+    def test_failed_attempt_waits_for_the_other(self):
+        client = self.client([(0.05, ValueError('first failed')), (0.2, 'hedge')])
+        self.assertEqual(client.get('url', name='ep'), 'hedge')
+
+    def test_error_when_both_attempts_fail(self):
+        client = self.client([(0.05, ValueError('first failed')), (0.1, ValueError('hedge failed'))])
+        self.assertRaises(ValueError, client.get, 'url', name='ep')
+
+    def test_no_hedge_over_the_rate(self):
+        client = self.client([(0.05, 'slow')], hedge_max_rate=0.0)
+        self.assertEqual(client.get('url', name='ep'), 'slow')
+        self.assertEqual(len(client.session_.requests), 1)
+
+if __name__ == '__main__':
+    unittest.main()
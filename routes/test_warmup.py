@@ -0,0 +1,98 @@
+#!/usr/bin/env python
+#
+# Copyright 2016 IBM Corp. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from threading import Lock, Event
+from routes.warmup import Warmup, load_queries, PENDING, READY
+
+
+class FakeFcSelect(object):
+    " Records the uncached fcselect calls, fails the queries in failing and waits for release "
+
+    def __init__(self, failing=()):
+        self.failing = set(failing)
+        self.queries = list()
+        self.lock = Lock()
+        self.release = Event()
+
+    def fcselect(self, deadline=None, **kwargs):
+        raise AssertionError('The warm-up must not go through the query cache')
+
+    def fcselect_uncached(self, deadline=None, **kwargs):
+        self.release.wait(5)
+        with self.lock:
+            self.queries.append(kwargs)
+        if kwargs['q'] in self.failing:
+            raise ValueError('failed %s' % kwargs['q'])
+        return {}
+#endclass FakeFcSelect
+
+
+class TestWarmup(unittest.TestCase):
+
+    def wait_ready(self, warmup):
+        for _ in range(100):
+            if warmup.ready:
+                return
+            time.sleep(0.01)
+        self.fail('Warm-up is not ready: %r' % warmup.status())
+
+    def test_ready_after_replay(self):
+        fcselect = FakeFcSelect(failing=['b'])
+        warmup = Warmup(fcselect, ['a', 'b', 'c'], params={'ranker_id': 'r'})
+        self.assertEqual(warmup.status()['state'], PENDING)
+        warmup.start()
+        self.assertFalse(warmup.ready)
+        fcselect.release.set()
+        self.wait_ready(warmup)
+        status = warmup.status()
+        self.assertEqual((status['state'], status['total'], status['completed'], status['failed'], status['replays']),
+                         (READY, 3, 2, 1, 1))
+        self.assertEqual(sorted(q['q'] for q in fcselect.queries), ['a', 'b', 'c'])
+        self.assertTrue(all(q['ranker_id'] == 'r' for q in fcselect.queries))
+
+    def test_keep_warm_replays(self):
+        fcselect = FakeFcSelect()
+        fcselect.release.set()
+        warmup = Warmup(fcselect, ['a'], keep_warm_interval=0.01).start()
+        self.wait_ready(warmup)
+        time.sleep(0.1)
+        warmup.stop()
+        self.assertGreater(warmup.status()['replays'], 1)
+        # Keep-warm replays do not change the counts of the warm-up
+        self.assertEqual(warmup.status()['completed'], 1)
+
+    def test_without_queries_is_ready(self):
+        self.assertTrue(Warmup(FakeFcSelect(), []).start().ready)
+
+    def test_load_queries(self):
+        directory = tempfile.mkdtemp()
+        try:
+            path = os.path.join(directory, 'answerGT.csv')
+            with open(path, 'wt') as outfile:
+                outfile.write('how fast,1,2\n\nwhat color,3\nhow fast,4\n  ,5\nwhere,6\n')
+            self.assertEqual(load_queries(path), ['how fast', 'what color', 'where'])
+            self.assertEqual(load_queries(path, limit=2), ['how fast', 'what color'])
+        finally:
+            shutil.rmtree(directory)
+
+if __name__ == '__main__':
+    unittest.main()
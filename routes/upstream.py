@@ -0,0 +1,153 @@
+#!/usr/bin/env python
+#
+# Copyright 2016 IBM Corp. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# -*- coding: utf-8 -*-
+
+import time
+from collections import deque
+from threading import Lock
+import numpy as np
+import requests
+from concurrent import futures
+
+
+class UpstreamClient(object):
+    """
+        HTTP client for the Retrieve and Rank service, shared by FcSelect and the remote ranker backend
+
+        Connections are reused through a requests.Session. With a hedge percentile, a request that \
+            has not answered after that percentile of the recent latencies of its endpoint is sent \
+            a second time, and the first response wins. Hedges are capped to a fraction of the \
+            recent requests, so that a slow service does not get twice the load
+    """
+
+    def __init__(self, hedge_percentile=None, hedge_max_rate=0.05, min_samples=20, window=1000, max_workers=32):
+        """
+            Args:
+                hedge_percentile (float): Percentile (0-100) of the recent latencies of an endpoint after \
+                    which a request is hedged. None disables hedging
+                hedge_max_rate (float): Maximum fraction of the recent requests that are hedged
+                min_samples (int): Number of latencies of an endpoint needed before its requests are hedged
+                window (int): Number of recent requests (and latencies per endpoint) that are kept
+                max_workers (int): Number of threads running hedged requests
+        """
+        self.session_ = requests.Session()
+        self.hedge_percentile_ = hedge_percentile
+        self.hedge_max_rate_ = hedge_max_rate
+        self.min_samples_ = min_samples
+        self.window_ = window
+        self.lock_ = Lock()
+        self.latencies_ = dict()
+        self.hedged_ = deque(maxlen=window)
+        self.counts_ = {'requests': 0, 'hedges': 0, 'hedge_wins': 0}
+        self.executor_ = None
+        if hedge_percentile is not None:
+            self.executor_ = futures.ThreadPoolExecutor(max_workers)
+
+    def get(self, url, name=None, **kwargs):
+        return self.request('GET', url, name=name, **kwargs)
+
+    def post(self, url, name=None, **kwargs):
+        return self.request('POST', url, name=name, **kwargs)
+
+    def request(self, method, url, name=None, **kwargs):
+        """
+            Send a request, hedged if hedging is enabled and the endpoint has enough latency samples
+
+            Args:
+                method (str): HTTP method
+                url (str): URL of the request
+                name (str): Name of the endpoint the latencies are tracked under. Defaults to the url
+                kwargs (dict): Arguments of requests.Session.request. Request bodies must be strings, \
+                    not files, as they may be sent twice
+            Returns:
+                response (requests.Response): The first response
+        """
+        name = name or url
+        with self.lock_:
+            self.counts_['requests'] += 1
+        delay = self.hedge_delay(name)
+        if delay is None:
+            if self.hedge_percentile_ is not None:
+                self._record_hedge(False)
+            return self._send(name, method, url, **kwargs)
+
+        first = self.executor_.submit(self._send, name, method, url, **kwargs)
+        try:
+            resp = first.result(timeout=delay)
+            self._record_hedge(False)
+            return resp
+        except futures.TimeoutError:
+            pass
+        if not self._take_hedge():
+            return first.result()
+        if kwargs.get('timeout') is not None:
+            kwargs['timeout'] = max(0.001, kwargs['timeout'] - delay)
+        second = self.executor_.submit(self._send, name, method, url, **kwargs)
+
+        # First successful response wins. The other one is left to finish in the background
+        pending, error = [first, second], None
+        while pending:
+            done, not_done = futures.wait(pending, return_when=futures.FIRST_COMPLETED)
+            for f in done:
+                if f.exception() is None:
+                    if f is second:
+                        with self.lock_:
+                            self.counts_['hedge_wins'] += 1
+                    return f.result()
+                error = f.exception()
+            pending = list(not_done)
+        raise error
+
+    def hedge_delay(self, name):
+        " Seconds after which a request to the endpoint is hedged, or None if it is not hedged "
+        if self.hedge_percentile_ is None:
+            return None
+        with self.lock_:
+            samples = self.latencies_.get(name)
+            if samples is None or len(samples) < self.min_samples_:
+                return None
+            samples = list(samples)
+        return float(np.percentile(samples, self.hedge_percentile_))
+
+    def metrics(self):
+        " Request and hedge counters, and the current hedge delay of each endpoint "
+        metrics = dict(self.counts_)
+        metrics['hedge_delays'] = {name: self.hedge_delay(name) for name in self.latencies_.keys()}
+        return metrics
+
+    def _take_hedge(self):
+        " Whether a hedge can be sent without going over the maximum hedge rate "
+        with self.lock_:
+            allowed = sum(self.hedged_) + 1 <= self.hedge_max_rate_ * (len(self.hedged_) + 1)
+        self._record_hedge(allowed)
+        return allowed
+
+    def _record_hedge(self, hedged):
+        with self.lock_:
+            self.hedged_.append(1 if hedged else 0)
+            if hedged:
+                self.counts_['hedges'] += 1
+
+    def _send(self, name, method, url, **kwargs):
+        start = time.time()
+        resp = self.session_.request(method, url, **kwargs)
+        with self.lock_:
+            if name not in self.latencies_:
+                self.latencies_[name] = deque(maxlen=self.window_)
+            self.latencies_[name].append(time.time() - start)
+        return resp
+#endclass UpstreamClient
@@ -0,0 +1,152 @@
+#!/usr/bin/env python
+#
+# Copyright 2016 IBM Corp. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# -*- coding: utf-8 -*-
+
+import csv
+import time
+import logging
+from threading import Lock, Thread, Event
+from concurrent import futures
+
+logger = logging.getLogger(__name__)
+
+# States of a warm-up
+PENDING, WARMING, READY = 'pending', 'warming', 'ready'
+
+
+def load_queries(path, limit=None):
+    """
+        Queries to replay during the warm-up. The first column of each row is the query, so both a \
+            ground truth file (data/groundtruth/answerGT.csv) and a file with one query per line work
+
+        Args:
+            path (str): Path to the file
+            limit (int): Maximum number of queries. Defaults to all the queries of the file
+        Returns:
+            queries (list): Distinct queries, in the order of the file
+    """
+    queries, seen = list(), set()
+    with open(path, 'rb') as csvfile:
+        for row in csv.reader(csvfile):
+            if not row or not row[0].strip() or row[0].strip() in seen:
+                continue
+            seen.add(row[0].strip())
+            queries.append(row[0].strip())
+            if limit is not None and len(queries) >= limit:
+                break
+    return queries
+
+
+class Warmup(object):
+    """
+        Replays a list of queries through FcSelect when a worker starts, so that the spaCy models, the \
+            scorer caches and the pooled connections to the service are ready before the worker \
+            reports ready. With a keep-warm interval, the queries are replayed again periodically \
+            so that idle workers keep their connections and caches
+    """
+
+    def __init__(self, fcselect, queries, params=None, max_workers=4, keep_warm_interval=None):
+        """
+            Args:
+                fcselect (routes.fcselect.FcSelect): FcSelect the queries are sent to
+                queries (list): Queries to replay, see load_queries
+                params (dict): Other query params of each request, e.g. ranker_id and fl
+                max_workers (int): Number of queries replayed at the same time
+                keep_warm_interval (float): Seconds between two replays after the worker is ready. \
+                    None disables keep-warm
+        """
+        self.fcselect_ = fcselect
+        self.queries_ = list(queries)
+        self.params_ = dict(params or {})
+        self.max_workers_ = max_workers
+        self.keep_warm_interval_ = keep_warm_interval
+        self.lock_ = Lock()
+        self.stopped_ = Event()
+        self.thread_ = None
+        self.state_ = PENDING if self.queries_ else READY
+        self.counts_ = {'total': len(self.queries_), 'completed': 0, 'failed': 0}
+        self.replays_ = 0
+        self.started_at_ = None
+        self.duration_ = None
+
+    @property
+    def ready(self):
+        return self.state_ == READY
+
+    def start(self):
+        " Run the warm-up, and the keep-warm replays, in a background thread "
+        if self.thread_ is not None or not self.queries_:
+            return self
+        self.thread_ = Thread(target=self._run, name='Warmup')
+        self.thread_.daemon = True
+        self.thread_.start()
+        return self
+
+    def stop(self):
+        " Stop the keep-warm replays "
+        self.stopped_.set()
+
+    def status(self):
+        " State and progress of the warm-up, reported by the readiness endpoint "
+        with self.lock_:
+            status = dict(self.counts_)
+            status.update(state=self.state_, replays=self.replays_, duration=self.duration_)
+        return status
+
+    def replay(self):
+        """
+            Send every query once. Failed queries are logged and counted, they do not stop the warm-up
+
+            Returns:
+                failed (int): Number of queries that failed
+        """
+        executor = futures.ThreadPoolExecutor(self.max_workers_)
+        try:
+            results = [executor.submit(self._query, q) for q in self.queries_]
+            return sum(1 for f in futures.as_completed(results) if not f.result())
+        finally:
+            executor.shutdown(wait=False)
+
+    def _run(self):
+        with self.lock_:
+            self.state_ = WARMING
+            self.started_at_ = time.time()
+        self.replay()
+        with self.lock_:
+            self.state_ = READY
+            self.duration_ = time.time() - self.started_at_
+            self.replays_ += 1
+        logger.info('Warm-up done: %r' % self.status())
+        while self.keep_warm_interval_ and not self.stopped_.wait(self.keep_warm_interval_):
+            self.replay()
+            with self.lock_:
+                self.replays_ += 1
+
+    def _query(self, query):
+        " Send one query. Returns whether it succeeded "
+        try:
+            # Cached responses would skip the scorers and the connections that the replay warms up
+            self.fcselect_.fcselect_uncached(q=query, **self.params_)
+            ok = True
+        except Exception as e:
+            logger.warning('Warm-up query %r failed: %r' % (query, e))
+            ok = False
+        with self.lock_:
+            if self.state_ == WARMING:
+                self.counts_['completed' if ok else 'failed'] += 1
+        return ok
+#endclass Warmup
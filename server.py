@@ -23,14 +23,19 @@
 import os
 
 from watson_developer_cloud import RetrieveAndRankV1
-from retrieve_and_rank_scorer.scorers import Scorers
+from retrieve_and_rank_scorer.pipeline import ScorerPipeline
 from routes.fcselect import FcSelect
+from routes.ranker_backend import LocalRankerBackend, BatchingRankerBackend
+from routes.upstream import UpstreamClient
+from routes.query_cache import QueryCache
+from routes.warmup import Warmup, load_queries
+from retrieve_and_rank_scorer.deadline import Deadline, DeadlineExceeded
 from requests.exceptions import HTTPError
 from dotenv import load_dotenv, find_dotenv
 import logging
 import cf_deployment_tracker
 from logging.handlers import TimedRotatingFileHandler
-from flask import Flask, render_template, request, jsonify
+from flask import Flask, Response, render_template, request, jsonify
 
 app = Flask(__name__)
 
@@ -42,6 +47,11 @@ except Exception:
 # Emit Bluemix deployment event
 cf_deployment_tracker.track()
 
+def request_deadline():
+    """Deadline of the current request, if REQUEST_BUDGET is set"""
+    budget = getattr(app, 'request_budget', None)
+    return Deadline(budget) if budget else None
+
 # Application routes
 
 @app.route('/', methods=['GET'])
@@ -64,10 +74,10 @@ def ranker_select():
     resp = ""
     if custom_ranker == 'TRUE':
         app.logger.info('default_ranker request with args=%r' % params)
-        resp = app.scorers.fcselect_default(**params)
+        resp = app.scorers.fcselect_default(deadline=request_deadline(), **params)
     else:
         app.logger.info('custom_ranker request with args=%r' % params)
-        resp = app.scorers.fcselect(**params)
+        resp = app.scorers.fcselect(deadline=request_deadline(), **params)
     return jsonify(resp)
 
 @app.route('/api/ranker', methods=['GET'])
@@ -78,7 +88,7 @@ def default_ranker():
               'fl': os.getenv('DEFAULT_FL'), 'fq':''}
 
     app.logger.info('default_ranker request with args=%r' % params)
-    resp = app.scorers.fcselect_default(**params)
+    resp = app.scorers.fcselect_default(deadline=request_deadline(), **params)
     return jsonify(resp)
 
 @app.route('/api/custom_ranker', methods=['GET'])
@@ -88,7 +98,7 @@ def custom_ranker():
               'q': request.args.get('q'),
               'fl': os.getenv('DEFAULT_FL'), 'fq': ''}
     app.logger.info('custom_ranker request with args=%r' % params)
-    resp = app.scorers.fcselect(**params)
+    resp = app.scorers.fcselect(deadline=request_deadline(), **params)
     return jsonify(resp)
 
 @app.route('/api/train_ranker', methods=['GET'])
@@ -96,8 +106,24 @@ def train_ranker():
     """Requests to train a ranker"""
     app.logger.info('train_ranker request with args=%r' % request.args)
     resp = app.scorers.fcselect(**request.args)
+    if request.args.get('rsInputFormat') == 'binary' and isinstance(resp, str):
+        return Response(resp, mimetype='application/octet-stream')
     return jsonify(resp)
 
+@app.route('/api/metrics', methods=['GET'])
+def metrics():
+    """Circuit breaker state, counters and latency of each custom scorer, hedging and query cache counters"""
+    return jsonify(scorers=app.scorers.scorers_.breaker_metrics(), upstream=app.scorers.upstream_.metrics(),
+                   query_cache=app.scorers.query_cache_.metrics())
+
+@app.route('/api/ready', methods=['GET'])
+def ready():
+    """Readiness of the worker. 503 until the warm-up queries have been replayed"""
+    warmup = getattr(app, 'warmup', None)
+    if warmup is None:
+        return jsonify(state='ready')
+    return jsonify(warmup.status()), 200 if warmup.ready else 503
+
 
 @app.errorhandler(Exception)
 def handle_error(e):
@@ -107,6 +133,9 @@ def handle_error(e):
     if isinstance(e, HTTPError):
         code = e.code
         error = str(e.message)
+    elif isinstance(e, DeadlineExceeded):
+        code = 504
+        error = str(e.message)
 
     return jsonify(error=error, code=code), code
 
@@ -139,11 +168,50 @@ if __name__ == "__main__":
     cluster_id = os.getenv('SOLR_CLUSTER_ID')
     collection_name = os.getenv('SOLR_COLLECTION_NAME')
     feature_json_file = os.getenv('FEATURE_FILE')
+    feature_store_path = os.getenv('FEATURE_STORE')
+    document_features_path = os.getenv('DOCUMENT_FEATURES')
     answer_directory = os.getenv('ANSWER_DIRECTORY')
-    # custom scorer
-    custom_scorers = Scorers(feature_json_file)
+    ranker_backend_name = os.getenv('RANKER_BACKEND', 'remote')
+    ranker_model_file = os.getenv('RANKER_MODEL_FILE')
+    hedge_percentile = os.getenv('HEDGE_PERCENTILE')
+    hedge_max_rate = float(os.getenv('HEDGE_MAX_RATE', '0.05'))
+    ranker_batch_window = float(os.getenv('RANKER_BATCH_WINDOW', '0'))
+    query_cache_size = int(os.getenv('QUERY_CACHE_SIZE', '0'))
+    query_cache_ttl = float(os.getenv('QUERY_CACHE_TTL', '0'))
+    feature_file_poll_interval = float(os.getenv('FEATURE_FILE_POLL_INTERVAL', '0'))
+    warmup_queries_file = os.getenv('WARMUP_QUERIES')
+    warmup_limit = int(os.getenv('WARMUP_LIMIT', '100'))
+    keep_warm_interval = float(os.getenv('KEEP_WARM_INTERVAL', '0'))
+    # time budget of each ranker request, in seconds. No deadline if unset
+    app.request_budget = float(os.getenv('REQUEST_BUDGET', '0'))
+    # custom scorer. Rebuilt when the feature file changes if FEATURE_FILE_POLL_INTERVAL is set
+    custom_scorers = ScorerPipeline(feature_json_file, poll_interval=feature_file_poll_interval,
+                                    feature_store_path=feature_store_path,
+                                    document_features_path=document_features_path)
+    # ranker backend for the custom ranker. The remote rank API is used by default
+    if ranker_backend_name == 'local':
+        ranker_backend = LocalRankerBackend(ranker_model_file)
+    elif ranker_backend_name == 'remote':
+        ranker_backend = None
+    else:
+        raise ValueError('RANKER_BACKEND=%r must be "remote" or "local"' % ranker_backend_name)
+    # concurrent rank calls are grouped into one call if RANKER_BATCH_WINDOW is set (local backend only)
+    if ranker_batch_window > 0 and ranker_backend is not None:
+        ranker_backend = BatchingRankerBackend(ranker_backend, window=ranker_batch_window)
+    # client of the service calls. Slow requests are hedged if HEDGE_PERCENTILE is set
+    upstream = UpstreamClient(hedge_percentile=float(hedge_percentile) if hedge_percentile else None,
+                              hedge_max_rate=hedge_max_rate)
+    # responses keyed on the normalized query. Identical concurrent queries always share one execution
+    query_cache = QueryCache(max_size=query_cache_size, ttl=query_cache_ttl or None)
     app.scorers = FcSelect(custom_scorers, url, username, password, cluster_id,
-                           collection_name, answer_directory)
+                           collection_name, answer_directory, ranker_backend=ranker_backend, upstream=upstream,
+                           query_cache=query_cache)
+
+    # replay the top queries before reporting ready on /api/ready, if WARMUP_QUERIES is set
+    if warmup_queries_file:
+        app.warmup = Warmup(app.scorers, load_queries(warmup_queries_file, limit=warmup_limit),
+                            params={'ranker_id': os.getenv('RANKER_ID'), 'fl': os.getenv('DEFAULT_FL'), 'fq': ''},
+                            keep_warm_interval=keep_warm_interval or None).start()
 
     # Retrieve and Rank
     retrieve_and_rank = RetrieveAndRankV1(url=url, username=username, password=password)
@@ -151,5 +219,6 @@ if __name__ == "__main__":
 
     # Start the server
     print('Starting with SHOW_DEFAULT_RANKER set to %s on port: %d on host : %s' % (SHOW_DEFAULT_RANKER, PORT_NUMBER, HOST_NAME))
-    app.run(host=HOST_NAME, port=PORT_NUMBER, debug=False)
+    # one thread per request, so that concurrent requests can be batched and deduplicated
+    app.run(host=HOST_NAME, port=PORT_NUMBER, debug=False, threaded=True)
     print ('Listening on %s:%d' % (HOST_NAME, PORT_NUMBER))